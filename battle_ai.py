@@ -0,0 +1,215 @@
+# battle_ai.py
+
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import execute_turn
+from battle_solver import Enumerator
+from battle_state import BattleState
+
+# Values are from the searching side's point of view: 1 is a win, -1 a loss, and a leaf that is not over is
+# scored by the HP fraction lead, scaled to stay strictly between the two.
+WIN = 1.0
+LOSS = -1.0
+HP_WEIGHT = 0.5
+
+# Turns a decision may play (one per outcome of a chance node) when it runs on a node budget, about what the
+# default time budget allows
+NODE_BUDGET = 2000
+
+# The mean of calculate_damage's random factor (85 to 100 percent), which every damage roll is played at
+AVERAGE_ROLL = 0.925
+
+class _OutOfBudget(Exception):
+    pass
+
+class _ChanceContext(Enumerator):
+    """
+    Walks every hit or miss, crit, status proc, status duration and speed tie of a turn like the solver's
+    Enumerator, but plays damage rolls and other continuous draws at their average, which keeps a turn to a few
+    dozen outcomes instead of hundreds.
+    """
+    def roll_damage(self, base_damage: int, crit_ratio: float, stab: float, type_effectiveness: float) -> int:
+        crit_multiplier = 1.5 if self.chance(crit_ratio) else 1.0
+        return int(base_damage * crit_multiplier * AVERAGE_ROLL * stab * type_effectiveness)
+
+    def uniform(self, a: float, b: float) -> float:
+        return (a + b) / 2
+
+def evaluate(pokemon: Pokemon, opponent: Pokemon) -> float:
+    """
+    Scores a battle state for `pokemon`.
+
+    Args:
+        pokemon (Pokemon): The side the score is for.
+        opponent (Pokemon): The other side.
+
+    Returns:
+        float: WIN or LOSS when the battle is over (0.0 when both fainted), the HP fraction lead scaled by HP_WEIGHT otherwise.
+    """
+    hp = pokemon.battle_stats['hp']
+    opponent_hp = opponent.battle_stats['hp']
+    if hp <= 0 or opponent_hp <= 0:
+        if hp > 0:
+            return WIN
+        if opponent_hp > 0:
+            return LOSS
+        return 0.0
+    return HP_WEIGHT * (hp / pokemon.max_stats['hp'] - opponent_hp / opponent.max_stats['hp'])
+
+class ExpectiminimaxAI:
+    """
+    Picks moves by searching a few turns ahead over both sides' moves and the engine's chance events.
+
+    Both sides pick at the same time, so every turn is searched as a max over our moves of the min over the
+    opponent's replies (the opponent is assumed to answer our move as well as it can). Chance nodes are expanded
+    exactly: the turn is played through execute_turn once per outcome of its draws (hits and misses, crits,
+    status procs and durations, speed ties), walked with the solver's Enumerator, and the values of the
+    resulting positions are weighted by their odds. Damage rolls are the one draw not expanded, they are played
+    at their average (AVERAGE_ROLL). Positions are rewound with BattleState.snapshot/restore, values are cached
+    in a transposition table keyed by BattleState.key, and the depth grows one turn at a time until the budget
+    runs out. When not even one turn could be searched for every move, the best of the moves searched is picked.
+
+    The time budget depends on the machine and its load, so the same position can get different moves from one
+    run to the next. For reproducible runs, e.g. seeded matchups whose results are stored, use a node budget
+    instead (time_budget=None, max_nodes=NODE_BUDGET): the search then only depends on the position.
+
+    Can be passed as a policy to simulate_battle and simulate_matchup.
+
+    Args:
+        max_depth (int, optional): The deepest search, in turns. Defaults to 3.
+        time_budget (float | None, optional): Seconds allowed per decision, the deepest finished search is used.
+            None for no time limit. Defaults to 0.05.
+        max_nodes (int | None, optional): Turns played per decision, the deepest finished search is used. None
+            for no node limit. Defaults to None.
+    """
+    def __init__(self, max_depth: int = 3, time_budget: float | None = 0.05, max_nodes: int | None = None):
+        if max_depth < 1:
+            raise ValueError("Search depth must be at least 1")
+        if max_nodes is not None and max_nodes < 1:
+            raise ValueError("Node budget must be at least 1")
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.max_nodes = max_nodes
+        self._ctx = _ChanceContext()
+        self._table: Dict[Tuple[Any, ...], float] = {}
+        self._state: Optional[BattleState] = None
+        self._deadline: Optional[float] = None
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def __call__(self, pokemon: Pokemon, opponent: Pokemon, rng: Optional[random.Random] = None) -> Move:
+        return self.choose(pokemon, opponent)
+
+    def choose(self, pokemon: Pokemon, opponent: Pokemon) -> Move:
+        """
+        Picks a move for `pokemon`. Both Pokémon are left exactly as they were.
+
+        Args:
+            pokemon (Pokemon): The side to pick for.
+            opponent (Pokemon): The other side.
+
+        Returns:
+            Move: The move with the best searched value.
+
+        Raises:
+            ValueError: If the Pokémon has no moves.
+        """
+        if not pokemon.moves:
+            raise ValueError(f"{pokemon.name} has no moves")
+        if len(pokemon.moves) == 1 or not opponent.moves:
+            return pokemon.moves[0]
+
+        self._deadline = time.perf_counter() + self.time_budget if self.time_budget is not None else None
+        self._table = {}
+        self.nodes = 0
+        self.depth_reached = 0
+        self._state = BattleState(pokemon, opponent)
+        saved = self._state.snapshot()
+        order = list(pokemon.moves)
+        best = order[0]
+        scores: Dict[str, float] = {}
+        try:
+            for depth in range(1, self.max_depth + 1):
+                scores = {}
+                self._root(pokemon, opponent, order, depth, scores)
+                # the next iteration looks at the best moves first, which makes its cutoffs come early
+                order.sort(key=lambda move: scores[move.name], reverse=True)
+                best = order[0]
+                self.depth_reached = depth
+        except _OutOfBudget:
+            if self.depth_reached == 0 and scores:
+                # the first turn was not searched for every move, the best of those that were is still a pick
+                best = max(order, key=lambda move: scores.get(move.name, LOSS - 1.0))
+        finally:
+            self._state.restore(saved)
+        return best
+
+    def _root(self, pokemon: Pokemon, opponent: Pokemon, order: List[Move], depth: int, scores: Dict[str, float]) -> None:
+        # a move whose replies already hold it below the best one stops there, its score is then only a bound
+        best = LOSS - 1.0
+        for move in order:
+            worst = WIN + 1.0
+            for reply in opponent.moves:
+                worst = min(worst, self._expected(pokemon, opponent, move, reply, depth))
+                if worst <= best:
+                    break
+            scores[move.name] = worst
+            best = max(best, worst)
+
+    def _value(self, pokemon: Pokemon, opponent: Pokemon, depth: int) -> float:
+        if depth == 0 or pokemon.battle_stats['hp'] <= 0 or opponent.battle_stats['hp'] <= 0:
+            return evaluate(pokemon, opponent)
+        key = (self._state.key(), depth)
+        value = self._table.get(key)
+        if value is not None:
+            return value
+
+        best = LOSS - 1.0
+        for move in pokemon.moves:
+            worst = WIN + 1.0
+            for reply in opponent.moves:
+                worst = min(worst, self._expected(pokemon, opponent, move, reply, depth))
+                if worst <= best:
+                    break # this reply already makes the move no better than one we have
+            best = max(best, worst)
+        self._table[key] = best
+        return best
+
+    def _expected(self, pokemon: Pokemon, opponent: Pokemon, move: Move, reply: Move, depth: int) -> float:
+        # The chance node of a pair of moves: the turn is played once per outcome of its draws, and outcomes that
+        # reach the same position are searched once with their odds added up
+        saved = self._state.snapshot()
+        ctx = self._ctx
+        ctx.script = []
+        total = 0.0
+        positions: Dict[Tuple[Any, ...], List[Any]] = {}
+        while True:
+            if self.max_nodes is not None and self.nodes >= self.max_nodes:
+                raise _OutOfBudget()
+            if self._deadline is not None and time.perf_counter() > self._deadline:
+                raise _OutOfBudget()
+            self._state.restore(saved)
+            ctx.start()
+            pokemon.selected_move = move
+            opponent.selected_move = reply
+            execute_turn(pokemon, opponent, 0, ctx)
+            self.nodes += 1
+            probability = ctx.probability()
+            if depth == 1 or pokemon.battle_stats['hp'] <= 0 or opponent.battle_stats['hp'] <= 0:
+                total += probability * evaluate(pokemon, opponent)
+            else:
+                key = self._state.key()
+                position = positions.get(key)
+                if position is None:
+                    positions[key] = [probability, self._state.snapshot()]
+                else:
+                    position[0] += probability
+            if not ctx.advance():
+                break
+        for probability, snapshot in positions.values():
+            self._state.restore(snapshot)
+            total += probability * self._value(pokemon, opponent, depth - 1)
+        self._state.restore(saved)
+        return total
@@ -0,0 +1,120 @@
+# battle_cli.py
+
+import argparse
+import csv
+import json
+import sys
+from typing import IO, Any, Dict, List, Optional
+from pokemon_loader import load_pokemon_list
+from battle_engine import MAX_TURNS, random_policy, stream_matchup, summarize_counts
+from battle_context import derive_seed
+from battle_ai import NODE_BUDGET, ExpectiminimaxAI
+from result_cache import DEFAULT_MAX_BYTES, ResultCache
+
+# Non-interactive entry point, for batch schedulers: `python -m battle_engine simulate ...` runs a matchup and
+# writes its results as JSON lines or CSV while the battles finish, so nothing is held in memory.
+
+# Built with the run's seed: a seeded run searches on a node budget rather than the clock, so it gives the same
+# battles on any machine and its stored results can be topped up
+POLICIES = {
+    'random': lambda seed: random_policy,
+    'ai': lambda seed: ExpectiminimaxAI() if seed is None else ExpectiminimaxAI(time_budget=None, max_nodes=NODE_BUDGET),
+}
+
+BATTLE_FIELDS = ['index', 'a', 'b', 'winner', 'turns', 'seed']
+SUMMARY_FIELDS = ['a', 'b', 'battles', 'wins_a', 'wins_b', 'draws', 'turns', 'win_rate_a', 'win_rate_b', 'draw_rate', 'avg_turns']
+
+class _RecordWriter:
+    """
+    Writes records as JSON lines or CSV rows, the CSV header going first.
+    """
+    def __init__(self, file: IO[str], format: str, fields: List[str]):
+        self.file = file
+        self.fields = fields
+        self._csv = csv.DictWriter(file, fields) if format == 'csv' else None
+        if self._csv is not None:
+            self._csv.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+
+def simulate(args: argparse.Namespace, output: IO[str]) -> int:
+    roster = {pokemon.name: pokemon for pokemon in load_pokemon_list(args.data, args.seed)}
+    for name in (args.a, args.b):
+        if name not in roster:
+            print(f"Unknown Pokémon: {name}", file=sys.stderr)
+            return 2
+    policy = POLICIES[args.policy](args.seed)
+
+    if args.cache:
+        # only the battles the cache is missing are played, the output is the final totals
+        with ResultCache(args.cache, args.data, int(args.cache_size * (1 << 20))) as cache:
+            summary = cache.matchup(roster[args.a], roster[args.b], args.n, args.workers, policy, args.max_turns, args.seed,
+                                    policy_name=args.policy)
+        _RecordWriter(output, args.format, SUMMARY_FIELDS).write({'a': args.a, 'b': args.b, **summary})
+        return 0
+
+    battles = stream_matchup(roster[args.a], roster[args.b], args.n, args.workers, policy, args.max_turns, args.seed, args.chunk)
+
+    if args.per_battle:
+        writer = _RecordWriter(output, args.format, BATTLE_FIELDS)
+        for count, (index, winner, turns) in enumerate(battles, 1):
+            writer.write({
+                'index': index, 'a': args.a, 'b': args.b, 'winner': winner, 'turns': turns,
+                'seed': derive_seed(args.seed, index) if args.seed is not None else None,
+            })
+            if count % args.chunk == 0:
+                output.flush()
+        output.flush()
+        return 0
+
+    # running totals every `report_every` battles, the last line holds the final result
+    writer = _RecordWriter(output, args.format, SUMMARY_FIELDS)
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    for _, winner, turns in battles:
+        counts['battles'] += 1
+        counts['turns'] += turns
+        counts[('draws', 'wins_a', 'wins_b')[winner]] += 1
+        if counts['battles'] % args.report_every == 0 or counts['battles'] == args.n:
+            writer.write({'a': args.a, 'b': args.b, **summarize_counts(counts)})
+            output.flush()
+    if counts['battles'] == 0:
+        writer.write({'a': args.a, 'b': args.b, **summarize_counts(counts)})
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m battle_engine', description="Run battles without prompting.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sim = commands.add_parser('simulate', help="simulate a matchup and stream the results")
+    sim.add_argument('--data', default='pokemon.xlsx', help="the workbook to load the Pokémon from")
+    sim.add_argument('--a', required=True, help="the first Pokémon")
+    sim.add_argument('--b', required=True, help="the second Pokémon")
+    sim.add_argument('--n', type=int, default=1000, help="number of battles (default: 1000)")
+    sim.add_argument('--workers', type=int, default=None, help="worker processes (default: every CPU)")
+    sim.add_argument('--seed', type=int, default=None, help="seeds the stats and every battle")
+    sim.add_argument('--policy', choices=sorted(POLICIES), default='random', help="how both sides pick moves (default: random)")
+    sim.add_argument('--max-turns', type=int, default=MAX_TURNS, help=f"turn cap of a battle (default: {MAX_TURNS})")
+    sim.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help="output format (default: jsonl)")
+    sim.add_argument('--per-battle', action='store_true', help="one record per battle instead of running totals")
+    sim.add_argument('--report-every', type=int, default=10000, help="battles between running totals (default: 10000)")
+    sim.add_argument('--chunk', type=int, default=1000, help="battles per task sent to a worker (default: 1000)")
+    sim.add_argument('--output', default='-', help="file to write to, - for stdout (default: -)")
+    sim.add_argument('--cache', default=None, help="result cache file, only battles it is missing are simulated")
+    sim.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                     help=f"size of the result cache in MB (default: {DEFAULT_MAX_BYTES >> 20})")
+    args = parser.parse_args(argv)
+    if args.n < 0 or args.chunk < 1 or args.report_every < 1:
+        parser.error("--n cannot be negative, --chunk and --report-every must be at least 1")
+    if args.cache and args.per_battle:
+        parser.error("--cache stores totals only and cannot be used with --per-battle")
+
+    if args.output == '-':
+        return simulate(args, sys.stdout)
+    with open(args.output, 'w', newline='') as output:
+        return simulate(args, output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# battle_context.py
+
+import hashlib
+import random
+from typing import Any, List, Sequence
+from battle_events import EventSink, NULL_SINK
+
+# Shared by every context created without a seed, so unseeded battles do not pay for seeding a generator
+DEFAULT_RNG = random.Random()
+
+# Index passed to derive_seed for the generator move pickers draw from. Keeping their draws off the battle's own
+# generator means the engine's draws depend only on the seed and the moves picked, which is what a replay stores.
+POLICY_STREAM = -1
+
+class BattleContext:
+    """
+    Per-battle state threaded through the engine: the random generator every draw goes through and the sink
+    every event goes to. Two battles run with contexts built from the same seed play out identically.
+
+    Args:
+        seed (int | None, optional): Seed for a generator owned by this battle, None shares DEFAULT_RNG. Defaults to None.
+        sink (EventSink | None, optional): Where events go, None drops them. Defaults to None.
+        rng (random.Random | None, optional): Use this generator instead of seeding one. Defaults to None.
+    """
+    def __init__(self, seed: int | None = None, sink: EventSink | None = None, rng: random.Random | None = None):
+        self.seed = seed
+        if rng is not None:
+            self.rng = rng
+        else:
+            self.rng = random.Random(seed) if seed is not None else DEFAULT_RNG
+        self.sink = sink if sink is not None else NULL_SINK
+
+    # Every random draw of the engine goes through one of these
+    def chance(self, probability: float) -> bool:
+        return self.rng.random() <= probability
+
+    def randint(self, a: int, b: int) -> int:
+        return self.rng.randint(a, b)
+
+    def roll_at_most(self, a: int, b: int, threshold: float) -> bool:
+        # Same draw as randint, for callers that only compare it, so the odds of the comparison can be read off
+        return self.rng.randint(a, b) <= threshold
+
+    def roll_damage(self, base_damage: int, crit_ratio: float, stab: float, type_effectiveness: float) -> int:
+        # The crit and damage roll of calculate_damage, drawn together so the odds of each damage can be read off
+        crit_multiplier = 1.5 if self.chance(crit_ratio) else 1.0
+        random_factor = self.randint(85, 100) / 100
+        return int(base_damage * crit_multiplier * random_factor * stab * type_effectiveness)
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return self.rng.choice(seq)
+
+    def choices(self, population: Sequence[Any], weights: List[float]) -> Any:
+        return self.rng.choices(population, weights)[0]
+
+    def uniform(self, a: float, b: float) -> float:
+        return self.rng.uniform(a, b)
+
+def derive_seed(seed: int, index: int) -> int:
+    """
+    Derives the seed of one battle of a larger job, so any battle can be rerun on its own.
+
+    Args:
+        seed (int): The seed of the whole job.
+        index (int): The index of the battle within the job.
+
+    Returns:
+        int: A 64-bit seed, unrelated to the seeds of neighbouring indices.
+    """
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
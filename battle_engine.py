@@ -1,55 +1,84 @@
 # battle_engine.py
 
+import os
 import random
-from typing import Dict, List, Tuple
-from pokemon_models import Pokemon, Move
-from pokemon_loader import load_pokemon_list
-
-def execute_turn(pokemon1: Pokemon, pokemon2: Pokemon, turn_count: int) -> tuple[str, int]:
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from pokemon_models import (
+    Pokemon, Move, FLINCH, SLEEP, RECHARGE, CONFUSE, PARALYZE, FREEZE, BADLY_POISON, BURN, POISON, SEED, TRAP,
+)
+from type_chart import TYPE_IDS, TYPE_EFFECTIVENESS
+from battle_context import BattleContext, DEFAULT_RNG, POLICY_STREAM, derive_seed
+from battle_events import (
+    TextSink, TURN, MOVE_USED, NO_MOVE, MISS, CRASH, DAMAGE, MULTI_HIT, COUNTER,
+    COUNTER_FAILED, HALF_HP, LEVEL_DAMAGE, RANDOM_LEVEL_DAMAGE, IMMUNE, FAINT, RECOIL, HEAL, ABSORB,
+    STATUS_APPLIED, STAGE_CHANGED, STAGE_RESET, STATUS_BLOCKED, CONFUSION_HURT, THAWED, STATUS_DAMAGE,
+)
+
+if TYPE_CHECKING:
+    from replay import ReplayWriter
+
+# Used by move_hit and calculate_damage when they are called outside of a battle
+DEFAULT_CONTEXT = BattleContext()
+
+# Set by battle_profiler while profiling: the timed wrapper execute_move calls in place of each effect handler.
+# Programs keep the handlers themselves, so modules reading them (damage_calc, vector_engine) are not affected
+PROFILED_HANDLERS: Optional[Dict[Callable[..., None], Callable[..., None]]] = None
+
+def execute_turn(pokemon1: Pokemon, pokemon2: Pokemon, turn_count: int, ctx: BattleContext | None = None) -> tuple[str, int]:
+    # Without a context the turn is logged as text and returned, otherwise the events go to the context's sink and the log is empty
+    context = ctx if ctx is not None else BattleContext(sink=TextSink())
     turn_count += 1
-    log = f"Turn {turn_count}:\n"
+    context.sink.emit(TURN, turn_count)
     
     # Checking if any of the move is None at this point
     if pokemon1.selected_move is None or pokemon2.selected_move is None:
         raise ValueError("Selected move cannot be None")
     
-    # storing moves
-    move1 = pokemon1.selected_move
-    move2 = pokemon2.selected_move
+    first, second = move_order(pokemon1, pokemon2, context)
+    execute_move(first, second, True, context)
+    # Execute second Pokémon's move if it still has HP left
+    if first.battle_stats['hp'] > 0 and second.battle_stats['hp'] > 0:
+        execute_move(second, first, False, context)
+
+    # dealing with condition after all pokemon move
+    apply_end_turn(pokemon1, pokemon2, context)
+    apply_end_turn(pokemon2, pokemon1, context)
+
+    return context.sink.text() if ctx is None else "", turn_count
 
-    # Storing priority if exist or set to 0
-    priority1 = int(move1.find_related_value('effect', 'priority', 'amount') or 0)
-    priority2 = int(move2.find_related_value('effect', 'priority', 'amount') or 0)
+def move_order(pokemon1: Pokemon, pokemon2: Pokemon, ctx: BattleContext) -> Tuple[Pokemon, Pokemon]:
+    """
+    Decides which of two Pokémon moves first with their selected moves: the higher priority, then the higher
+    speed, then a coin flip drawn from the context.
 
-    # print(pokemon1.name, pokemon1.battle_stats, pokemon1.stat_stages, pokemon1.statuses)
-    # print(pokemon2.name, pokemon2.battle_stats, pokemon2.stat_stages, pokemon2.statuses)
+    Args:
+        pokemon1 (Pokemon): The first Pokémon.
+        pokemon2 (Pokemon): The second Pokémon.
+        ctx (BattleContext): The battle's context, only drawn from on a speed tie.
+
+    Returns:
+        Tuple[Pokemon, Pokemon]: The Pokémon moving first and the one moving second.
+    """
+    # Priority is read from the move's 'priority' effect when it is created, 0 otherwise
+    priority1 = pokemon1.selected_move.priority
+    priority2 = pokemon2.selected_move.priority
 
     if priority1 != priority2:
         # Check for move priority
-        first, second = (pokemon1, pokemon2) if priority1 > priority2 else (pokemon2, pokemon1)
-    elif pokemon1.battle_stats['spd'] != pokemon2.battle_stats['spd']:
+        return (pokemon1, pokemon2) if priority1 > priority2 else (pokemon2, pokemon1)
+    if pokemon1.battle_stats['spd'] != pokemon2.battle_stats['spd']:
         # If priorities are the same, fall back to speed
-        first, second = (pokemon1, pokemon2) if pokemon1.battle_stats['spd'] >= pokemon2.battle_stats['spd'] else (pokemon2, pokemon1)
-    else:
-        # Tie breaker
-        first, second = random.choice([(pokemon1, pokemon2), (pokemon2, pokemon1)])
-    
-    log += execute_move(first, second, True)
-    # Execute second Pokémon's move if it still has HP left
-    if first.battle_stats['hp'] > 0 and second.battle_stats['hp'] > 0:
-        log += execute_move(second, first)
+        return (pokemon1, pokemon2) if pokemon1.battle_stats['spd'] > pokemon2.battle_stats['spd'] else (pokemon2, pokemon1)
+    # Tie breaker
+    return ctx.choice([(pokemon1, pokemon2), (pokemon2, pokemon1)])
 
-    # dealing with condition after all pokemon move
-    log += apply_end_turn(pokemon1, pokemon2)
-    log += apply_end_turn(pokemon2, pokemon1)
-
-    return log, turn_count
-
-def execute_move(attacker: Pokemon, defender: Pokemon, is_first_move: bool = False) -> str:
-    log = ""
+def execute_move(attacker: Pokemon, defender: Pokemon, is_first_move: bool = False, ctx: BattleContext | None = None) -> str:
+    context = ctx if ctx is not None else BattleContext(sink=TextSink())
 
     # Applying start of the turn effects
-    log += apply_start_move(attacker, defender)
+    apply_start_move(attacker, defender, context)
     
     move = attacker.selected_move if attacker.can_move else None
 
@@ -58,383 +87,433 @@ def execute_move(attacker: Pokemon, defender: Pokemon, is_first_move: bool = Fal
 
     # Check if the attacker has a move selected
     if move is None:
-        log += f"{attacker.name} has no move to use!\n"
-        return log
+        context.sink.emit(NO_MOVE, attacker.name)
+        return context.sink.text() if ctx is None else ""
     
-    # Define effect handlers
-    effect_handlers = {
-        'damage': handle_damage,
-        'heal': handle_heal,
-        'recoil': handle_recoil,
-        'flinch': handle_flinch,
-        'hits': handle_multi_hit,
-        'sleep': handle_sleep,
-        'stage': handle_stage,
-        'crit_ratio': handle_crit_ratio,
-        'stage_reset': handle_stage_reset,
-        'badly_poison': handle_badly_poison,
-        'random_level_damage': handle_random_level_damage,
-        'counter': handle_counter,
-        'faint': handle_faint,
-        'burn': handle_burn,
-        'absorb': handle_absorb,
-        'seed': handle_seed,
-        'recharge': handle_recharge,
-        'freeze': handle_freeze,
-        'double_hit': handle_double_hit,
-        'trap': handle_trap,
-        'poison': handle_poison,
-        'level_damage': handle_level_damage,
-        'multi_hit': handle_multi_hit,
-        'paralyze': handle_paralyze,
-        'confuse': handle_confuse,
-        'half_hp': handle_half_hp,
-    }
-
-    log += f"{attacker.name} uses {move.name}!\n"
+    context.sink.emit(MOVE_USED, attacker.name, move.name)
 
     # Check if the move hit or not
-    if move_hit(attacker, defender, move):
-        # Process move effects
-        for effect in move.effect:
-            effect_type = str(effect.get('effect'))
-            if effect_type in effect_handlers:
-                log += effect_handlers[effect_type](attacker, defender, effect, move, is_first_move)
+    if move_hit(attacker, defender, move, context):
+        # Process move effects, moves that did not go through pokemon_loader are compiled on first use
+        program = move.program if move.program is not None else compile_move(move)
+        if PROFILED_HANDLERS is not None:
+            program = [(PROFILED_HANDLERS.get(handler, handler), effect) for handler, effect in program]
+        for handler, effect in program:
+            handler(attacker, defender, effect, move, is_first_move, context)
     else:
-        log += "The move missed!\n"
-        if move.has_effect('miss_recoil'):
-            attacker.battle_stats['hp'] -= int(attacker.max_stats['hp'] * 0.5)
-            log += "{attacker.name} keeps going and crashes!\n"
-    return log
+        context.sink.emit(MISS, attacker.name, move.name)
+        if move.miss_recoil:
+            crash_damage = int(attacker.max_stats['hp'] * 0.5)
+            attacker.battle_stats['hp'] -= crash_damage
+            context.sink.emit(CRASH, attacker.name, crash_damage)
+    return context.sink.text() if ctx is None else ""
 
 # Damage type handle
-def handle_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    damage, multiplier = calculate_damage(attacker, defender, move)
+def handle_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    damage, multiplier = calculate_damage(attacker, defender, move, ctx=ctx)
     attacker.last_damage = damage
     defender.battle_stats['hp'] -= damage
-    return f"{move.name} deals {damage} HP!\n"
+    ctx.sink.emit(DAMAGE, move.name, damage)
 
-def handle_recoil(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    recoil_damage = int(attacker.last_damage * float(effect.get('percentage', 0)))
+def handle_recoil(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    recoil_damage = int(attacker.last_damage * effect['percentage'])
     attacker.battle_stats['hp'] -= recoil_damage
-    return f"{attacker.name} took {recoil_damage} HP recoil damage!\n"
+    ctx.sink.emit(RECOIL, attacker.name, recoil_damage)
 
-def handle_counter(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    immune: bool= calculate_type_effectiveness(move.type, defender.type) == 0
+def handle_counter(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    immune: bool = defender.defense_row[move.type_id] == 0
     if not immune:
         if defender.last_move is not None and defender.last_move.category == 'Physical':
             counter_damage = defender.last_damage * 2
             attacker.last_damage = counter_damage
             defender.battle_stats['hp'] -= counter_damage
-            return f"{move.name} deals {counter_damage} damage!\n"
+            ctx.sink.emit(COUNTER, move.name, counter_damage)
         else:
-            return f"{move.name} missed!\n"
-    return f"{defender.name} is immune!\n"
+            ctx.sink.emit(COUNTER_FAILED, move.name)
+    else:
+        ctx.sink.emit(IMMUNE, defender.name)
 
-def handle_multi_hit(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    hit_count = random.choices([2, 3, 4, 5], [3/8, 3/8, 1/8, 1/8])[0]
+def handle_multi_hit(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    hit_count = ctx.choices([2, 3, 4, 5], [3/8, 3/8, 1/8, 1/8])
     total_damage: int = 0
     for _ in range(hit_count):
-        damage, multiplier = calculate_damage(attacker, defender, move)
+        damage, multiplier = calculate_damage(attacker, defender, move, ctx=ctx)
         total_damage += damage
     attacker.last_damage = total_damage
     defender.battle_stats['hp'] -= total_damage
-    return f"{move.name} hits {hit_count} time{'s' if hit_count > 1 else ''}, deals {total_damage} HP!\n"
+    ctx.sink.emit(MULTI_HIT, move.name, hit_count, total_damage)
 
-def handle_double_hit(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_double_hit(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     total_damage: int = 0
     for _ in range(2):
-        damage, multiplier = calculate_damage(attacker, defender, move)
+        damage, multiplier = calculate_damage(attacker, defender, move, ctx=ctx)
         total_damage += damage
     attacker.last_damage = total_damage
     defender.battle_stats['hp'] -= total_damage
-    return f"{move.name} hits 2 times, deals {total_damage} HP!\n"
+    ctx.sink.emit(MULTI_HIT, move.name, 2, total_damage)
 
-def handle_crit_ratio(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    damage, multiplier = calculate_damage(attacker, defender, move, float(effect.get('ratio', 1/24)))
+def handle_crit_ratio(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    damage, multiplier = calculate_damage(attacker, defender, move, effect['ratio'], ctx)
     attacker.last_damage = damage
     defender.battle_stats['hp'] -= damage
-    return f"{move.name} deals {damage} HP!\n"
+    ctx.sink.emit(DAMAGE, move.name, damage)
 
-def handle_half_hp(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_half_hp(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     damage = defender.battle_stats['hp'] // 2
-    immune: bool= calculate_type_effectiveness(move.type, defender.type) == 0
+    immune: bool = defender.defense_row[move.type_id] == 0
     if not immune:
         attacker.last_damage = damage
         defender.battle_stats['hp'] -= damage
-        return f"{move.name} deals half {defender.name} HP damage!\n"
-    return f"{defender.name} is immune!\n"
+        ctx.sink.emit(HALF_HP, move.name, defender.name)
+    else:
+        ctx.sink.emit(IMMUNE, defender.name)
 
-def handle_level_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_level_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     damage = attacker.level
-    immune: bool= calculate_type_effectiveness(move.type, defender.type) == 0
+    immune: bool = defender.defense_row[move.type_id] == 0
     if not immune:
         attacker.last_damage = damage
         defender.battle_stats['hp'] -= damage
-        return f"{move.name} deals {damage}!\n"
-    return f"{defender.name} is immune!\n"
-
-def handle_random_level_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    min = float(effect.get('min', 0.0))
-    max = float(effect.get('max', 0.0))
-    damage = int(attacker.level * random.uniform(min, max))
-    immune: bool= calculate_type_effectiveness(move.type, defender.type) == 0
+        ctx.sink.emit(LEVEL_DAMAGE, move.name, damage)
+    else:
+        ctx.sink.emit(IMMUNE, defender.name)
+
+def handle_random_level_damage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    min = effect['min']
+    max = effect['max']
+    damage = int(attacker.level * ctx.uniform(min, max))
+    immune: bool = defender.defense_row[move.type_id] == 0
     if not immune:
         attacker.last_damage = damage
         defender.battle_stats['hp'] -= damage
-        return f"{move.name} deals {damage} damage!\n"
-    return f"{defender.name} is immune!\n"
+        ctx.sink.emit(RANDOM_LEVEL_DAMAGE, move.name, damage)
+    else:
+        ctx.sink.emit(IMMUNE, defender.name)
 
-def handle_faint(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    target = str(effect.get('target', ''))
-    probability = float(effect.get('probability', 0))
-    if random.random() <= probability:
+def handle_faint(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    target = effect['target']
+    probability = effect['probability']
+    if ctx.chance(probability):
         if target == 'user':
             attacker.battle_stats['hp'] = 0
-            return f"{attacker.name} fainted!\n"
+            ctx.sink.emit(FAINT, attacker.name)
         elif target == 'opp':
             defender.battle_stats['hp'] = 0
-            return f"{defender.name} fainted!\n"
-    return ""
+            ctx.sink.emit(FAINT, defender.name)
 
 # Heal type handle
-def handle_heal(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    heal_amount = int(float(effect.get('max_hp', 0.0)) * attacker.max_stats['hp'])
+def handle_heal(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    heal_amount = int(effect['max_hp'] * attacker.max_stats['hp'])
     attacker.battle_stats['hp'] = min(attacker.max_stats['hp'], attacker.battle_stats['hp'] + heal_amount)
-    return f"{attacker.name} recovered {heal_amount} HP!\n"
+    ctx.sink.emit(HEAL, attacker.name, heal_amount)
 
-def handle_absorb(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    absorb_amout = int(attacker.last_damage * float(effect.get('percentage', 0)))
+def handle_absorb(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    absorb_amout = int(attacker.last_damage * effect['percentage'])
     attacker.battle_stats['hp'] += absorb_amout
-    return f"{attacker.name} absorb {absorb_amout} HP!\n"
+    ctx.sink.emit(ABSORB, attacker.name, absorb_amout)
 
 # Status type handle
 ## Start of the turn type
-def handle_paralyze(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_paralyze(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
     immune: bool = 'Electric' in defender.type
-    if random.random() <= float(effect.get('probability', 0)) and not immune and not defender.has_non_volatile_status():
+    if ctx.chance(effect['probability']) and not immune and not defender.has_non_volatile_status():
         defender.apply_status('paralyze', 100)
         defender.update_stat_multiplier('spd', 1/2)
-        return f"{defender.name} is paralyzed!\n"
-    return ""
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'paralyze')
 
-def handle_sleep(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_sleep(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
-    if random.random() <= float(effect.get('probability', 0)) and not defender.has_non_volatile_status():
-        defender.apply_status('sleep', random.randint(1,3))
-        return f"{defender.name} fell asleep!\n"
-    return ""
+    if ctx.chance(effect['probability']) and not defender.has_non_volatile_status():
+        defender.apply_status('sleep', ctx.randint(1,3))
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'sleep')
 
-def handle_freeze(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_freeze(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
     immune: bool = 'Ice' in defender.type
-    if random.random() <= float(effect.get('probability', 0)) and not immune and not defender.has_non_volatile_status():
+    if ctx.chance(effect['probability']) and not immune and not defender.has_non_volatile_status():
         defender.apply_status('freeze', 100)
-        return f"{defender.name} is frozen solid!\n"
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'freeze')
+        return
     # pokemon have the possibility of immediately thawing after frozen
-    if random.random() <= 0.25:
+    if ctx.chance(0.25):
         defender.remove_status('freeze')
-    return ""
 
-def handle_recharge(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_recharge(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     attacker.apply_status('recharge', 1)
-    return f"{attacker.name} needs to recharge!\n"
+    ctx.sink.emit(STATUS_APPLIED, attacker.name, 'recharge')
 
-def handle_flinch(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    if random.random() <= float(effect.get('probability', 0)) and is_first_move:
+def handle_flinch(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    if ctx.chance(effect['probability']) and is_first_move:
         defender.apply_status('flinch', 1)
-        return f"{defender.name} flinched!\n"
-    return ""
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'flinch')
 
-def handle_confuse(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    if random.random() <= float(effect.get('probability', 0)):
-        defender.apply_status('confuse', random.randint(1,4))
-        return f"{defender.name} is confused!\n"
-    return ""
+def handle_confuse(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    if ctx.chance(effect['probability']):
+        defender.apply_status('confuse', ctx.randint(1,4))
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'confuse')
 
 ## End of the turn type
-def handle_badly_poison(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_badly_poison(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
-    if random.random() <= float(effect.get('probability', 0)) and not defender.has_non_volatile_status():
+    if ctx.chance(effect['probability']) and not defender.has_non_volatile_status():
         defender.apply_status('badly_poison', 1) # start at 1 to count how long has it been taking effect
-        return f"{defender.name} is badly poisoned!\n"
-    return ""
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'badly_poison')
 
-def handle_burn(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_burn(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
     immune: bool = 'Fire' in defender.type
-    if random.random() <= float(effect.get('probability', 0)) and not immune and not defender.has_non_volatile_status():
+    if ctx.chance(effect['probability']) and not immune and not defender.has_non_volatile_status():
         defender.apply_status('burn', 100)
-        return f"{defender.name} is burned!\n"
-    return ""
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'burn')
 
-def handle_poison(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_poison(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     # Non volatile status
     immune: bool = 'Steel' in defender.type or 'Poison' in defender.type
-    if random.random() <= float(effect.get('probability', 0)) and not immune and not defender.has_non_volatile_status():
+    if ctx.chance(effect['probability']) and not immune and not defender.has_non_volatile_status():
         defender.apply_status('poison', 100)
-        return f"{defender.name} is poisoned!\n"
-    return ""
+        ctx.sink.emit(STATUS_APPLIED, defender.name, 'poison')
 
-def handle_seed(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_seed(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     defender.apply_status('seed', 100)
-    return f"{defender.name} is seeded!\n"
+    ctx.sink.emit(STATUS_APPLIED, defender.name, 'seed')
 
-def handle_trap(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    defender.apply_status('trap', random.randint(4,5))
-    return f"{defender.name} is trapped!\n"
+def handle_trap(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    defender.apply_status('trap', ctx.randint(4,5))
+    ctx.sink.emit(STATUS_APPLIED, defender.name, 'trap')
 
 # Stage type handle
-def handle_stage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
-    target = str(effect.get('target', ''))
-    stat = str(effect.get('stat', ''))
-    amount = int(effect.get('amount', 0))
-    probability = float(effect.get('probability', 0))
-    if random.random() <= probability:
+def handle_stage(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
+    target = effect['target']
+    stat = effect['stat']
+    amount = effect['amount']
+    probability = effect['probability']
+    if ctx.chance(probability):
         if target == 'user':
             attacker.update_stat_stage(stat, amount)
-            return f"{attacker.name}'s {stat} stage changed by {amount}!\n"
+            ctx.sink.emit(STAGE_CHANGED, attacker.name, stat, amount)
         elif target == 'opp':
             defender.update_stat_stage(stat, amount)
-            return f"{defender.name}'s {stat} stage changed by {amount}!\n"
-    return ""
+            ctx.sink.emit(STAGE_CHANGED, defender.name, stat, amount)
 
-def handle_stage_reset(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool) -> str:
+def handle_stage_reset(attacker: Pokemon, defender: Pokemon, effect: Dict[str, str | int | float], move: Move, is_first_move: bool, ctx: BattleContext) -> None:
     attacker.reset_stat_stages()
     defender.reset_stat_stages()
-    return f"{move.name} eliminates stats stage changes!\n"
+    ctx.sink.emit(STAGE_RESET, move.name)
+
+EFFECT_HANDLERS: Dict[str, Callable[[Pokemon, Pokemon, Dict[str, str | int | float], Move, bool, BattleContext], None]] = {
+    'damage': handle_damage,
+    'heal': handle_heal,
+    'recoil': handle_recoil,
+    'flinch': handle_flinch,
+    'hits': handle_multi_hit,
+    'sleep': handle_sleep,
+    'stage': handle_stage,
+    'crit_ratio': handle_crit_ratio,
+    'stage_reset': handle_stage_reset,
+    'badly_poison': handle_badly_poison,
+    'random_level_damage': handle_random_level_damage,
+    'counter': handle_counter,
+    'faint': handle_faint,
+    'burn': handle_burn,
+    'absorb': handle_absorb,
+    'seed': handle_seed,
+    'recharge': handle_recharge,
+    'freeze': handle_freeze,
+    'double_hit': handle_double_hit,
+    'trap': handle_trap,
+    'poison': handle_poison,
+    'level_damage': handle_level_damage,
+    'multi_hit': handle_multi_hit,
+    'paralyze': handle_paralyze,
+    'confuse': handle_confuse,
+    'half_hp': handle_half_hp,
+}
+
+# Every parameter a handler reads, with its default; the default's type is the type the value is parsed to
+EFFECT_PARAMETERS: Dict[str, str | int | float] = {
+    'probability': 0.0,
+    'percentage': 0.0,
+    'ratio': 1/24,
+    'max_hp': 0.0,
+    'min': 0.0,
+    'max': 0.0,
+    'amount': 0,
+    'target': '',
+    'stat': '',
+}
+
+def compile_move(move: Move) -> Tuple[Tuple[Callable[..., None], Dict[str, str | int | float]], ...]:
+    """
+    Compiles the move's effect list into its program: the handler of every effect paired with its parameters,
+    already parsed and with every default filled in, so execute_move only has to call them in order.
+
+    Args:
+        move (Move): The move to compile, its program is stored on it.
+
+    Returns:
+        Tuple[Tuple[Callable[..., None], Dict[str, str | int | float]], ...]: The compiled program.
+    """
+    program = []
+    effects = move.effect if isinstance(move.effect, list) else [] # effect strings that failed to parse do nothing
+    for effect in effects:
+        handler = EFFECT_HANDLERS.get(str(effect.get('effect')))
+        if handler is None:
+            continue
+        parameters = dict(EFFECT_PARAMETERS)
+        for key, default in EFFECT_PARAMETERS.items():
+            if key in effect:
+                parameters[key] = type(default)(effect[key])
+        program.append((handler, parameters))
+    move.program = tuple(program)
+    return move.program
 
 # Applying effect for status that take effect on the start of move 
-def apply_start_move(pokemon: Pokemon, enemy: Pokemon) -> str:
-    # deduct every moving turn
-    def flinch_action() -> Tuple[str, bool]:
-        pokemon.deduct_status_duration("flinch")
-        return f"{pokemon.name} flinched!\n", False # False when the pokemon cannot move
-    
-    def sleep_action() -> Tuple[str, bool]:
-        pokemon.deduct_status_duration("sleep")
-        return f"{pokemon.name} is asleep!\n", False
-    
-    def recharge_action() -> Tuple[str, bool]:
-        pokemon.deduct_status_duration("recharge")
-        return f"{pokemon.name} is recharging!\n", False
-    
-    def confuse_action() -> Tuple[str, bool]:
-        pokemon.deduct_status_duration("confuse")
-        if random.random() <= 0.33:
-            pokemon.battle_stats['hp'] -= 40
-            return f"{pokemon.name} is confused and hit itself in the process!\n", False
-        else:
-            return "", True
-    
-    # unremovable
-    def paralyze_action() -> Tuple[str, bool]:
-        if random.random() <= 0.25:
-            return f"{pokemon.name} is paralyzed!\n", False
-        else:
-            return "", True
-    
-    # removable
-    def freeze_action() -> Tuple[str, bool]:
-        if random.random() <= 0.25:
-            return f"{pokemon.name} is frozen solid!\n", False
-        else:
-            statuses_to_remove.append('freeze')
-            return f"{pokemon.name} thawed!\n", True
-
-    status_actions = {
-        'flinch': flinch_action,
-        'sleep': sleep_action,
-        'recharge': recharge_action,
-        'confuse': confuse_action,
-        'paralyze': paralyze_action,
-        'freeze': freeze_action,
-    }
-
-    log = ""
-    pokemon.can_move = True  # Assume the Pokémon can move initially
-    statuses_to_remove: List[str] = []  # List to collect statuses to remove
+# Statuses resolved before a Pokémon moves. Each action returns False when the status keeps it from moving.
+# deduct every moving turn
+def _flinch_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    pokemon.deduct_status_duration("flinch")
+    ctx.sink.emit(STATUS_BLOCKED, pokemon.name, 'flinch')
+    return False
 
-    for status, duration in pokemon.statuses.items():
-        if status in status_actions and duration > 0:
-            message, pokemon.can_move = status_actions[status]()
-            log += message
-    
-    # Remove statuses after iteration
-    for status in statuses_to_remove:
-        pokemon.remove_status(status)
+def _sleep_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    pokemon.deduct_status_duration("sleep")
+    ctx.sink.emit(STATUS_BLOCKED, pokemon.name, 'sleep')
+    return False
+
+def _recharge_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    pokemon.deduct_status_duration("recharge")
+    ctx.sink.emit(STATUS_BLOCKED, pokemon.name, 'recharge')
+    return False
+
+def _confuse_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    pokemon.deduct_status_duration("confuse")
+    if ctx.chance(0.33):
+        pokemon.battle_stats['hp'] -= 40
+        ctx.sink.emit(CONFUSION_HURT, pokemon.name)
+        return False
+    return True
+
+# unremovable
+def _paralyze_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    if ctx.chance(0.25):
+        ctx.sink.emit(STATUS_BLOCKED, pokemon.name, 'paralyze')
+        return False
+    return True
+
+# removable
+def _freeze_action(pokemon: Pokemon, ctx: BattleContext) -> bool:
+    if ctx.chance(0.25):
+        ctx.sink.emit(STATUS_BLOCKED, pokemon.name, 'freeze')
+        return False
+    pokemon.remove_status('freeze')
+    ctx.sink.emit(THAWED, pokemon.name)
+    return True
+
+# Resolved in the order the statuses were applied (Pokemon.status_order), not in the order of this table
+START_MOVE_ACTIONS: Tuple[Tuple[int, Callable[[Pokemon, BattleContext], bool]], ...] = (
+    (FLINCH, _flinch_action),
+    (SLEEP, _sleep_action),
+    (RECHARGE, _recharge_action),
+    (CONFUSE, _confuse_action),
+    (PARALYZE, _paralyze_action),
+    (FREEZE, _freeze_action),
+)
+START_MOVE_MASK = sum(1 << status_id for status_id, _ in START_MOVE_ACTIONS)
+_START_MOVE_BY_ID: Dict[int, Callable[[Pokemon, BattleContext], bool]] = dict(START_MOVE_ACTIONS)
+
+def apply_start_move(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext | None = None) -> str:
+    context = ctx if ctx is not None else BattleContext(sink=TextSink())
+
+    pokemon.can_move = True  # Assume the Pokémon can move initially
+    if pokemon.status_mask & START_MOVE_MASK:
+        durations = pokemon.status_durations
+        for status_id in pokemon.status_order:
+            # the last status resolved decides whether the Pokémon moves
+            action = _START_MOVE_BY_ID.get(status_id)
+            if action is not None and durations[status_id] > 0:
+                pokemon.can_move = action(pokemon, context)
 
     # Handle expired statuses
     pokemon.remove_expired_statuses()
 
-    return log
+    return context.sink.text() if ctx is None else ""
+
+# Statuses that take effect on the end of turn
+def _badly_poison_action(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext) -> None: # deals n/16 of max hp where n is how long the effect has been running
+    n = pokemon.get_status_duration('badly_poison')
+    damage = int(pokemon.max_stats['hp'] * 0.0625 * n) 
+    pokemon.battle_stats['hp'] -= damage
+    pokemon.add_status_duration('badly_poison')
+    ctx.sink.emit(STATUS_DAMAGE, pokemon.name, 'badly_poison', damage)
+
+def _burn_action(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext) -> None:
+    damage = int(pokemon.max_stats['hp'] * 0.125) # apply damage for 1/8 of max hp
+    pokemon.battle_stats['hp'] -= damage
+    ctx.sink.emit(STATUS_DAMAGE, pokemon.name, 'burn', damage)
+
+def _poison_action(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext) -> None:
+    damage = int(pokemon.max_stats['hp'] * 0.125) 
+    pokemon.battle_stats['hp'] -= damage
+    ctx.sink.emit(STATUS_DAMAGE, pokemon.name, 'poison', damage)
+
+def _seed_action(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext) -> None:
+    damage = int(pokemon.max_stats['hp'] * 0.125) 
+    pokemon.battle_stats['hp'] -= damage # apply damage for 1/8 of max hp
+    enemy.battle_stats['hp'] += damage # and heal the the pokemon that applied seed
+    ctx.sink.emit(STATUS_DAMAGE, pokemon.name, 'seed', damage)
+
+def _trap_action(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext) -> None:
+    damage = int(pokemon.max_stats['hp'] * 0.125)
+    pokemon.battle_stats['hp'] -= damage
+    pokemon.deduct_status_duration("trap")
+    ctx.sink.emit(STATUS_DAMAGE, pokemon.name, 'trap', damage)
+
+# Resolved in the order the statuses were applied, like START_MOVE_ACTIONS
+END_TURN_ACTIONS: Tuple[Tuple[int, Callable[[Pokemon, Pokemon, BattleContext], None]], ...] = (
+    (BADLY_POISON, _badly_poison_action),
+    (BURN, _burn_action),
+    (POISON, _poison_action),
+    (SEED, _seed_action),
+    (TRAP, _trap_action),
+)
+END_TURN_MASK = sum(1 << status_id for status_id, _ in END_TURN_ACTIONS)
+_END_TURN_BY_ID: Dict[int, Callable[[Pokemon, Pokemon, BattleContext], None]] = dict(END_TURN_ACTIONS)
 
 # Applying effect for status that take effect on the end of turn
-def apply_end_turn(pokemon: Pokemon, enemy: Pokemon) -> str:
-    def badly_poison_action() -> str: # deals n/16 of max hp where n is how long the effect has been running
-        n = pokemon.get_status_duration('badly_poison')
-        damage = int(pokemon.max_stats['hp'] * 0.0625 * n) 
-        pokemon.battle_stats['hp'] -= damage
-        pokemon.add_status_duration('badly_poison')
-        return f"{pokemon.name} is badly poisoned for {damage} HP!\n"
-    
-    def burn_action() -> str:
-        damage = int(pokemon.max_stats['hp'] * 0.125) # apply damage for 1/8 of max hp
-        pokemon.battle_stats['hp'] -= damage
-        return f"{pokemon.name} is burned for {damage} HP!\n"
-    
-    def poison_action() -> str:
-        damage = int(pokemon.max_stats['hp'] * 0.125) 
-        pokemon.battle_stats['hp'] -= damage
-        return f"{pokemon.name} is poisoned for {damage} HP!\n"
-    
-    def seed_action() -> str:
-        damage = int(pokemon.max_stats['hp'] * 0.125) 
-        pokemon.battle_stats['hp'] -= damage # apply damage for 1/8 of max hp
-        enemy.battle_stats['hp'] += damage # and heal the the pokemon that applied seeda
-        return f"{pokemon.name} is drained for {damage} HP!\n"
-
-    def trap_action() -> str:
-        damage = int(pokemon.max_stats['hp'] * 0.125)
-        pokemon.battle_stats['hp'] -= damage
-        pokemon.deduct_status_duration("trap")
-        return f"{pokemon.name} is trapped and received {damage} damage!\n"
-
-    status_actions = {
-        'badly_poison': badly_poison_action,
-        'burn': burn_action,
-        'poison': poison_action,
-        'seed': seed_action,
-        'trap': trap_action,
-    }
-
-    log = ""
-
-    for status, duration in pokemon.statuses.items():
-        if status in status_actions and duration > 0:
-            message = status_actions[status]()
-            log += message
+def apply_end_turn(pokemon: Pokemon, enemy: Pokemon, ctx: BattleContext | None = None) -> str:
+    context = ctx if ctx is not None else BattleContext(sink=TextSink())
+
+    if pokemon.status_mask & END_TURN_MASK:
+        durations = pokemon.status_durations
+        for status_id in pokemon.status_order:
+            action = _END_TURN_BY_ID.get(status_id)
+            if action is not None and durations[status_id] > 0:
+                action(pokemon, enemy, context)
 
     # Handle expired statuses
     pokemon.remove_expired_statuses()
 
-    return log
+    return context.sink.text() if ctx is None else ""
     
-def move_hit(attacker: Pokemon, defender: Pokemon, move: Move) -> bool:
-    stat_stage_multiplier: List[float] =  [3/9, 3/8, 3/7, 3/6, 3/5, 3/4, 3/3, 4/3, 5/3, 6/3, 7/3, 8/3, 9/3]
+# Accuracy multiplier for each combined accuracy/evasion stage from -6 to +6, index with stage + 6
+ACCURACY_STAGE_MULTIPLIERS: Tuple[float, ...] = (3/9, 3/8, 3/7, 3/6, 3/5, 3/4, 3/3, 4/3, 5/3, 6/3, 7/3, 8/3, 9/3)
+
+def move_hit(attacker: Pokemon, defender: Pokemon, move: Move, ctx: BattleContext | None = None) -> bool:
+    ctx = ctx if ctx is not None else DEFAULT_CONTEXT
     if move.accuracy is None:
         return True
     
     # From gen III, evasion and accuracy are combined and capped from [-6,  6]
     combined_stage = max(-6, min(6, attacker.stat_stages['acc'] - defender.stat_stages['eva']))
 
-    if random.randint(0,100) <= float(move.accuracy) * stat_stage_multiplier[combined_stage + 6]:
+    if ctx.roll_at_most(0, 100, float(move.accuracy) * ACCURACY_STAGE_MULTIPLIERS[combined_stage + 6]):
         return True
     
     return False
 
-def calculate_damage(attacker: Pokemon, defender: Pokemon, move: Move, crit_ratio: float = 1/24) -> tuple[int, float]:
+def calculate_damage(attacker: Pokemon, defender: Pokemon, move: Move, crit_ratio: float = 1/24, ctx: BattleContext | None = None) -> tuple[int, float]:
+    ctx = ctx if ctx is not None else DEFAULT_CONTEXT
     level = attacker.level
 
     if move.category == "Physical":
@@ -444,41 +523,245 @@ def calculate_damage(attacker: Pokemon, defender: Pokemon, move: Move, crit_rati
         a = attacker.battle_stats['sp_atk']
         d = defender.battle_stats['sp_def']
     
-    crit_multiplier = 1.5 if random.random() <= crit_ratio else 1.0
-    random_factor = random.randint(85, 100) / 100
-
-    stab = 1.5 if move.type in attacker._type else 1.0
+    stab = 1.5 if move.type_id in attacker.type_ids else 1.0
     burn = 0.5 if attacker.has_status('burn') and move.category == "Physical" else 1.0
-    type_effectiveness = calculate_type_effectiveness(move.type, defender.type)
+    type_effectiveness = defender.defense_row[move.type_id]
     
     base_damage = int((((2 * level / 5 + 2) * (move.power if move.power is not None else 0) * (a / d)) / 50 + burn * 2))
-    damage = int(base_damage * crit_multiplier * random_factor * stab * type_effectiveness)
+    # crit and damage roll
+    damage = ctx.roll_damage(base_damage, crit_ratio, stab, type_effectiveness)
     
     return damage, type_effectiveness
 
 def calculate_type_effectiveness(move_type: str, defender_types: list[str]) -> float:
-    type_chart = {
-        "Normal": {"Rock": 0.5, "Ghost": 0, "Steel": 0.5},
-        "Fire": {"Fire": 0.5, "Water": 0.5, "Grass": 2, "Ice": 2, "Bug": 2, "Rock": 0.5, "Dragon": 0.5, "Steel": 2},
-        "Water": {"Fire": 2, "Water": 0.5, "Grass": 0.5, "Ground": 2, "Rock": 2, "Dragon": 0.5},
-        "Electric": {"Water": 2, "Electric": 0.5, "Grass": 0.5, "Ground": 0, "Flying": 2, "Dragon": 0.5},
-        "Grass": {"Fire": 0.5, "Water": 2, "Grass": 0.5, "Poison": 0.5, "Ground": 2, "Flying": 0.5, "Bug": 0.5, "Rock": 2, "Dragon": 0.5, "Steel": 0.5},
-        "Ice": {"Fire": 0.5, "Water": 0.5, "Grass": 2, "Ice": 0.5, "Ground": 2, "Flying": 2, "Dragon": 2, "Steel": 0.5},
-        "Fighting": {"Normal": 2, "Ice": 2, "Poison": 0.5, "Flying": 0.5, "Psychic": 0.5, "Bug": 0.5, "Rock": 2, "Ghost": 0, "Dark": 2, "Steel": 2, "Fairy": 0.5},
-        "Poison": {"Grass": 2, "Poison": 0.5, "Ground": 0.5, "Rock": 0.5, "Ghost": 0.5, "Steel": 0, "Fairy": 2},
-        "Ground": {"Fire": 2, "Electric": 2, "Grass": 0.5, "Poison": 2, "Flying": 0, "Bug": 0.5, "Rock": 2, "Steel": 2},
-        "Flying": {"Grass": 2, "Electric": 0.5, "Fighting": 2, "Bug": 2, "Rock": 0.5, "Steel": 0.5},
-        "Psychic": {"Fighting": 2, "Poison": 2, "Psychic": 0.5, "Dark": 0, "Steel": 0.5},
-        "Bug": {"Fire": 0.5, "Grass": 2, "Fighting": 0.5, "Poison": 0.5, "Flying": 0.5, "Ghost": 0.5, "Steel": 0.5, "Fairy": 0.5},
-        "Rock": {"Fire": 2, "Ice": 2, "Fighting": 0.5, "Ground": 0.5, "Flying": 2, "Bug": 2, "Steel": 0.5},
-        "Ghost": {"Normal": 0, "Psychic": 2, "Ghost": 2, "Dark": 0.5},
-        "Dragon": {"Dragon": 2, "Steel": 0.5, "Fairy": 0},
-        "Dark": {"Fighting": 0.5, "Psychic": 2, "Ghost": 2, "Dark": 0.5, "Fairy": 0.5},
-        "Steel": {"Fire": 0.5, "Water": 0.5, "Electric": 0.5, "Ice": 2, "Rock": 2, "Steel": 0.5, "Fairy": 2},
-        "Fairy": {"Fire": 0.5, "Fighting": 2, "Poison": 0.5, "Dragon": 2, "Dark": 2, "Steel": 0.5}
-    }
-
+    # Prefer defender.defense_row[move.type_id] in the engine, this is kept for callers that only have type names
+    if move_type not in TYPE_IDS:
+        return 1.0
+    attack = TYPE_IDS[move_type]
     type_effectiveness = 1.0
     for def_type in defender_types:
-        type_effectiveness *= type_chart.get(move_type, {}).get(def_type, 1.0)
+        if def_type in TYPE_IDS:
+            type_effectiveness *= TYPE_EFFECTIVENESS[attack][TYPE_IDS[def_type]]
     return type_effectiveness
+
+
+# Headless simulation
+MAX_TURNS = 1000 # same turn cap as the interactive loop in main.py, reaching it counts as a draw
+
+def random_policy(pokemon: Pokemon, opponent: Pokemon, rng: random.Random) -> Move:
+    return rng.choice(pokemon.moves)
+
+def simulate_battle(pokemon1: Pokemon, pokemon2: Pokemon, policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy,
+                    max_turns: int = MAX_TURNS, seed: int | None = None, recorder: Optional['ReplayWriter'] = None) -> tuple[int, int]:
+    """
+    Runs a full battle between fresh copies of two Pokémon without prompting for moves.
+
+    Args:
+        pokemon1 (Pokemon): The first Pokémon, left untouched.
+        pokemon2 (Pokemon): The second Pokémon, left untouched.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Picks a move for a Pokémon given its opponent and a generator of its own. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which the battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the battle, the same seed replays the same battle. Defaults to None.
+        recorder (ReplayWriter | None, optional): Records the battle as a replay, a seed is drawn when none is given. Defaults to None.
+
+    Returns:
+        tuple[int, int]: The winner (1 or 2, 0 for a draw) and the number of turns played.
+    """
+    pokemon1 = pokemon1.clone()
+    pokemon2 = pokemon2.clone()
+    if recorder is not None and seed is None:
+        seed = DEFAULT_RNG.getrandbits(64)
+    ctx = BattleContext(seed)
+    # move picks draw from their own generator, so the battle's draws only depend on the seed and the picks
+    policy_rng = random.Random(derive_seed(seed, POLICY_STREAM)) if seed is not None else ctx.rng
+    if recorder is not None:
+        recorder.begin(seed, pokemon1, pokemon2, ctx)
+    turn_count = 0
+
+    while pokemon1.battle_stats['hp'] > 0 and pokemon2.battle_stats['hp'] > 0 and turn_count < max_turns:
+        pokemon1.selected_move = policy(pokemon1, pokemon2, policy_rng)
+        pokemon2.selected_move = policy(pokemon2, pokemon1, policy_rng)
+        if recorder is not None:
+            recorder.turn(pokemon1, pokemon2)
+        _, turn_count = execute_turn(pokemon1, pokemon2, turn_count, ctx)
+
+    # Both Pokémon can faint on the same turn (recoil, seed, self-destruct), reaching the turn cap is a draw too
+    winner = 0
+    if pokemon1.battle_stats['hp'] > 0 and pokemon2.battle_stats['hp'] <= 0:
+        winner = 1
+    elif pokemon2.battle_stats['hp'] > 0 and pokemon1.battle_stats['hp'] <= 0:
+        winner = 2
+    if recorder is not None:
+        recorder.end(winner, turn_count, pokemon1, pokemon2)
+    return winner, turn_count
+
+def run_battles(pokemon1: Pokemon, pokemon2: Pokemon, n_battles: int, policy: Callable[[Pokemon, Pokemon, random.Random], Move],
+                max_turns: int, seed: int | None = None, first_index: int = 0) -> Dict[str, int]:
+    """
+    Plays one chunk of simulate_matchup's battles in this process, the task its workers run.
+
+    Args:
+        pokemon1 (Pokemon): The first Pokémon, copied for every battle.
+        pokemon2 (Pokemon): The second Pokémon, copied for every battle.
+        n_battles (int): The number of battles in the chunk.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move]): Move picker.
+        max_turns (int): Turn cap after which a battle is a draw.
+        seed (int | None, optional): Seed of the whole matchup, battle i is played with derive_seed(seed, i). Defaults to None.
+        first_index (int, optional): Number of the chunk's first battle. Defaults to 0.
+
+    Returns:
+        Dict[str, int]: The chunk's 'battles', 'wins_a', 'wins_b', 'draws' and 'turns' counts, see summarize_counts.
+    """
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    for index in range(first_index, first_index + n_battles):
+        battle_seed = derive_seed(seed, index) if seed is not None else None
+        winner, turns = simulate_battle(pokemon1, pokemon2, policy, max_turns, battle_seed)
+        counts['battles'] += 1
+        counts['turns'] += turns
+        if winner == 1:
+            counts['wins_a'] += 1
+        elif winner == 2:
+            counts['wins_b'] += 1
+        else:
+            counts['draws'] += 1
+    return counts
+
+def split_battles(n_battles: int, n_chunks: int) -> List[int]:
+    """
+    Splits a number of battles into chunks of nearly equal size, the tasks of a process pool.
+
+    Args:
+        n_battles (int): The number of battles.
+        n_chunks (int): How many chunks are wanted, fewer are made when there are fewer battles.
+
+    Returns:
+        List[int]: The size of every chunk, the larger ones first.
+    """
+    n_chunks = max(1, min(n_chunks, n_battles))
+    size, extra = divmod(n_battles, n_chunks)
+    return [size + (1 if i < extra else 0) for i in range(n_chunks)]
+
+def summarize_counts(counts: Dict[str, int]) -> Dict[str, float]:
+    """
+    Turns raw battle counts into win rates and the average turn count.
+
+    Args:
+        counts (Dict[str, int]): Counts with 'battles', 'wins_a', 'wins_b', 'draws' and 'turns' keys.
+
+    Returns:
+        Dict[str, float]: The counts together with 'win_rate_a', 'win_rate_b', 'draw_rate' and 'avg_turns'.
+    """
+    battles = counts['battles']
+    summary: Dict[str, float] = dict(counts)
+    summary['win_rate_a'] = counts['wins_a'] / battles if battles else 0.0
+    summary['win_rate_b'] = counts['wins_b'] / battles if battles else 0.0
+    summary['draw_rate'] = counts['draws'] / battles if battles else 0.0
+    summary['avg_turns'] = counts['turns'] / battles if battles else 0.0
+    return summary
+
+def simulate_matchup(species_a: Pokemon, species_b: Pokemon, n_battles: int, workers: int | None = None,
+                     policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, max_turns: int = MAX_TURNS,
+                     seed: int | None = None, first_index: int = 0) -> Dict[str, float]:
+    """
+    Simulates many battles of the same matchup, spreading them over a process pool.
+
+    With a seed, battle i is played with the seed derive_seed(seed, i), so the result does not depend on the
+    number of workers and any single battle can be rerun with simulate_battle. The battles are numbered from
+    `first_index`, so a run can be extended with the next battles of the same seed.
+
+    Args:
+        species_a (Pokemon): The first Pokémon, copied for every battle.
+        species_b (Pokemon): The second Pokémon, copied for every battle.
+        n_battles (int): The number of battles to run.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker, must be a module-level function so it can be pickled. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the whole matchup. Defaults to None.
+        first_index (int, optional): Number of the first battle. Defaults to 0.
+
+    Returns:
+        Dict[str, float]: Battle, win, draw and turn counts plus win rates and the average turn count (see summarize_counts).
+    """
+    if n_battles < 0:
+        raise ValueError("Number of battles cannot be negative")
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or n_battles <= 1:
+        return summarize_counts(run_battles(species_a, species_b, n_battles, policy, max_turns, seed, first_index))
+
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    # a few chunks per worker keeps the pool busy when some battles run much longer than others
+    chunks = split_battles(n_battles, workers * 4)
+    first_indices = [first_index + sum(chunks[:i]) for i in range(len(chunks))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_battles, species_a, species_b, chunk, policy, max_turns, seed, chunk_first_index)
+                   for chunk, chunk_first_index in zip(chunks, first_indices)]
+        for future in futures:
+            for key, value in future.result().items():
+                counts[key] += value
+    return summarize_counts(counts)
+
+def _battle_results(pokemon1: Pokemon, pokemon2: Pokemon, n_battles: int, policy: Callable[[Pokemon, Pokemon, random.Random], Move],
+                    max_turns: int, seed: int | None, first_index: int) -> List[Tuple[int, int, int]]:
+    results = []
+    for index in range(first_index, first_index + n_battles):
+        battle_seed = derive_seed(seed, index) if seed is not None else None
+        winner, turns = simulate_battle(pokemon1, pokemon2, policy, max_turns, battle_seed)
+        results.append((index, winner, turns))
+    return results
+
+def stream_matchup(species_a: Pokemon, species_b: Pokemon, n_battles: int, workers: int | None = None,
+                   policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, max_turns: int = MAX_TURNS,
+                   seed: int | None = None, chunk_size: int = 1000) -> Iterator[Tuple[int, int, int]]:
+    """
+    Simulates many battles of the same matchup like simulate_matchup, but yields every battle's result as soon as
+    its chunk finishes instead of only the totals. At most two chunks per worker are queued at a time, so memory
+    does not grow with the number of battles.
+
+    Args:
+        species_a (Pokemon): The first Pokémon, copied for every battle.
+        species_b (Pokemon): The second Pokémon, copied for every battle.
+        n_battles (int): The number of battles to run.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker, must be picklable. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the whole matchup, battle i is played with derive_seed(seed, i). Defaults to None.
+        chunk_size (int, optional): Battles per task sent to a worker. Defaults to 1000.
+
+    Yields:
+        Tuple[int, int, int]: The battle's index, the winner (1 or 2, 0 for a draw) and the number of turns, in the
+            order the chunks finish.
+    """
+    if n_battles < 0:
+        raise ValueError("Number of battles cannot be negative")
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1")
+    workers = workers or os.cpu_count() or 1
+    chunks = ((first_index, min(chunk_size, n_battles - first_index)) for first_index in range(0, n_battles, chunk_size))
+
+    if workers <= 1:
+        for first_index, size in chunks:
+            yield from _battle_results(species_a, species_b, size, policy, max_turns, seed, first_index)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Set[Future] = set()
+        try:
+            while True:
+                for first_index, size in chunks:
+                    pending.add(executor.submit(_battle_results, species_a, species_b, size, policy, max_turns, seed, first_index))
+                    if len(pending) >= workers * 2:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            # the caller may stop early, chunks that have not started are dropped
+            for future in pending:
+                future.cancel()
+
+if __name__ == "__main__":
+    from battle_cli import main
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# battle_events.py
+
+import json
+from typing import Any, Dict, IO, List, Tuple
+
+# Event codes, emitted by battle_engine with the raw values of the event (names, move names, amounts).
+# Nothing is formatted until a sink asks for text.
+TURN = 0                  # turn
+MOVE_USED = 1             # pokemon, move
+NO_MOVE = 2               # pokemon
+MISS = 3                  # pokemon, move
+CRASH = 4                 # pokemon, damage
+DAMAGE = 5                # move, damage
+MULTI_HIT = 6             # move, hits, damage
+COUNTER = 7               # move, damage
+COUNTER_FAILED = 8        # move
+HALF_HP = 9               # move, defender
+LEVEL_DAMAGE = 10         # move, damage
+RANDOM_LEVEL_DAMAGE = 11  # move, damage
+IMMUNE = 12               # pokemon
+FAINT = 13                # pokemon
+RECOIL = 14               # pokemon, damage
+HEAL = 15                 # pokemon, amount
+ABSORB = 16               # pokemon, amount
+STATUS_APPLIED = 17       # pokemon, status
+STAGE_CHANGED = 18        # pokemon, stat, amount
+STAGE_RESET = 19          # move
+STATUS_BLOCKED = 20       # pokemon, status (the status kept the Pokémon from moving)
+CONFUSION_HURT = 21       # pokemon
+THAWED = 22               # pokemon
+STATUS_DAMAGE = 23        # pokemon, status, damage
+SWITCH = 24               # pokemon, pokemon (the one leaving the field, then the one coming in; team battles only)
+
+EVENT_NAMES: Dict[int, str] = {
+    TURN: 'turn', MOVE_USED: 'move_used', NO_MOVE: 'no_move', MISS: 'miss', CRASH: 'crash',
+    DAMAGE: 'damage', MULTI_HIT: 'multi_hit', COUNTER: 'counter', COUNTER_FAILED: 'counter_failed',
+    HALF_HP: 'half_hp', LEVEL_DAMAGE: 'level_damage', RANDOM_LEVEL_DAMAGE: 'random_level_damage',
+    IMMUNE: 'immune', FAINT: 'faint', RECOIL: 'recoil', HEAL: 'heal', ABSORB: 'absorb',
+    STATUS_APPLIED: 'status_applied', STAGE_CHANGED: 'stage_changed', STAGE_RESET: 'stage_reset',
+    STATUS_BLOCKED: 'status_blocked', CONFUSION_HURT: 'confusion_hurt', THAWED: 'thawed',
+    STATUS_DAMAGE: 'status_damage', SWITCH: 'switch',
+}
+
+_TEMPLATES: Dict[int, str] = {
+    TURN: "Turn {0}:\n",
+    MOVE_USED: "{0} uses {1}!\n",
+    NO_MOVE: "{0} has no move to use!\n",
+    MISS: "The move missed!\n",
+    CRASH: "{0} keeps going and crashes!\n",
+    DAMAGE: "{0} deals {1} HP!\n",
+    COUNTER: "{0} deals {1} damage!\n",
+    COUNTER_FAILED: "{0} missed!\n",
+    HALF_HP: "{0} deals half {1} HP damage!\n",
+    LEVEL_DAMAGE: "{0} deals {1}!\n",
+    RANDOM_LEVEL_DAMAGE: "{0} deals {1} damage!\n",
+    IMMUNE: "{0} is immune!\n",
+    FAINT: "{0} fainted!\n",
+    RECOIL: "{0} took {1} HP recoil damage!\n",
+    HEAL: "{0} recovered {1} HP!\n",
+    ABSORB: "{0} absorb {1} HP!\n",
+    STAGE_CHANGED: "{0}'s {1} stage changed by {2}!\n",
+    STAGE_RESET: "{0} eliminates stats stage changes!\n",
+    CONFUSION_HURT: "{0} is confused and hit itself in the process!\n",
+    THAWED: "{0} thawed!\n",
+    SWITCH: "{0} is switched out for {1}!\n",
+}
+
+_STATUS_APPLIED_TEMPLATES: Dict[str, str] = {
+    'paralyze': "{0} is paralyzed!\n",
+    'sleep': "{0} fell asleep!\n",
+    'freeze': "{0} is frozen solid!\n",
+    'recharge': "{0} needs to recharge!\n",
+    'flinch': "{0} flinched!\n",
+    'confuse': "{0} is confused!\n",
+    'badly_poison': "{0} is badly poisoned!\n",
+    'burn': "{0} is burned!\n",
+    'poison': "{0} is poisoned!\n",
+    'seed': "{0} is seeded!\n",
+    'trap': "{0} is trapped!\n",
+}
+
+_STATUS_BLOCKED_TEMPLATES: Dict[str, str] = {
+    'flinch': "{0} flinched!\n",
+    'sleep': "{0} is asleep!\n",
+    'recharge': "{0} is recharging!\n",
+    'paralyze': "{0} is paralyzed!\n",
+    'freeze': "{0} is frozen solid!\n",
+}
+
+_STATUS_DAMAGE_TEMPLATES: Dict[str, str] = {
+    'badly_poison': "{0} is badly poisoned for {2} HP!\n",
+    'burn': "{0} is burned for {2} HP!\n",
+    'poison': "{0} is poisoned for {2} HP!\n",
+    'seed': "{0} is drained for {2} HP!\n",
+    'trap': "{0} is trapped and received {2} damage!\n",
+}
+
+def render_event(event: int, args: Tuple[Any, ...]) -> str:
+    """
+    Renders an event as the line the engine used to log.
+
+    Args:
+        event (int): The event code.
+        args (Tuple[Any, ...]): The values emitted with the event.
+
+    Returns:
+        str: The rendered line, including its newline.
+    """
+    if event == MULTI_HIT:
+        move, hits, damage = args
+        return f"{move} hits {hits} time{'s' if hits > 1 else ''}, deals {damage} HP!\n"
+    if event == STATUS_APPLIED:
+        return _STATUS_APPLIED_TEMPLATES[args[1]].format(*args)
+    if event == STATUS_BLOCKED:
+        return _STATUS_BLOCKED_TEMPLATES[args[1]].format(*args)
+    if event == STATUS_DAMAGE:
+        return _STATUS_DAMAGE_TEMPLATES[args[1]].format(*args)
+    return _TEMPLATES[event].format(*args)
+
+class EventSink:
+    """
+    Receives the events of a battle. Subclasses decide what to keep; this base class drops everything.
+    """
+    def emit(self, event: int, *args: Any) -> None:
+        pass
+
+class NullSink(EventSink):
+    """
+    Drops every event, for bulk simulation where nobody reads the log.
+    """
+
+class TextSink(EventSink):
+    """
+    Keeps the events in memory and renders them as the engine's usual text log on demand.
+    """
+    def __init__(self):
+        self.events: List[Tuple[int, Tuple[Any, ...]]] = []
+
+    def emit(self, event: int, *args: Any) -> None:
+        self.events.append((event, args))
+
+    def text(self) -> str:
+        return "".join(render_event(event, args) for event, args in self.events)
+
+    def clear(self) -> None:
+        self.events.clear()
+
+class StreamSink(EventSink):
+    """
+    Writes every event to a file as soon as it is emitted, so memory stays bounded however long the battle runs.
+
+    Args:
+        file (IO[str]): The text file to write to.
+        format (str, optional): 'text' for the usual log lines, 'jsonl' for one JSON object per event. Defaults to 'text'.
+    """
+    def __init__(self, file: IO[str], format: str = 'text'):
+        if format not in ('text', 'jsonl'):
+            raise ValueError("Format must be either 'text' or 'jsonl'")
+        self.file = file
+        self.format = format
+
+    def emit(self, event: int, *args: Any) -> None:
+        if self.format == 'text':
+            self.file.write(render_event(event, args))
+        else:
+            self.file.write(json.dumps({'event': EVENT_NAMES[event], 'args': args}) + '\n')
+
+NULL_SINK = NullSink()
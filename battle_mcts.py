@@ -0,0 +1,236 @@
+# battle_mcts.py
+
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import execute_turn, random_policy
+from battle_context import BattleContext, derive_seed
+from battle_ai import evaluate
+from battle_state import BattleState
+
+class _Node:
+    """
+    A node of an open-loop search tree: it stands for the sequence of move pairs that leads to it, not for one
+    battle state, since the same moves can end in different states. Both sides keep their own statistics per
+    move (decoupled UCT), values are from the first side's point of view.
+    """
+    __slots__ = ('visits', 'counts1', 'values1', 'counts2', 'values2', 'children')
+
+    def __init__(self, n_moves1: int, n_moves2: int):
+        self.visits = 0
+        self.counts1 = [0] * n_moves1
+        self.values1 = [0.0] * n_moves1
+        self.counts2 = [0] * n_moves2
+        self.values2 = [0.0] * n_moves2
+        self.children: Dict[Tuple[int, int], '_Node'] = {}
+
+def _select(counts: List[int], values: List[float], visits: int, exploration: float) -> int:
+    best_index, best_score = 0, -float('inf')
+    log_visits = math.log(visits) if visits > 1 else 0.0
+    for index, count in enumerate(counts):
+        if count == 0:
+            return index
+        score = values[index] / count + exploration * (log_visits / count) ** 0.5
+        if score > best_score:
+            best_index, best_score = index, score
+    return best_index
+
+def _rollout(pokemon: Pokemon, opponent: Pokemon, ctx: BattleContext, max_turns: int,
+             policy: Callable[[Pokemon, Pokemon, random.Random], Move]) -> float:
+    for _ in range(max_turns):
+        if pokemon.battle_stats['hp'] <= 0 or opponent.battle_stats['hp'] <= 0:
+            break
+        pokemon.selected_move = policy(pokemon, opponent, ctx.rng)
+        opponent.selected_move = policy(opponent, pokemon, ctx.rng)
+        execute_turn(pokemon, opponent, 0, ctx)
+    return evaluate(pokemon, opponent)
+
+def _playout(root: _Node, pokemon: Pokemon, opponent: Pokemon, ctx: BattleContext, exploration: float,
+             rollout_turns: int, rollout_policy: Callable[[Pokemon, Pokemon, random.Random], Move]) -> None:
+    path: List[Tuple[_Node, int, int]] = []
+    node = root
+    while True:
+        if pokemon.battle_stats['hp'] <= 0 or opponent.battle_stats['hp'] <= 0:
+            value = evaluate(pokemon, opponent)
+            break
+        i = _select(node.counts1, node.values1, node.visits, exploration)
+        j = _select(node.counts2, node.values2, node.visits, exploration)
+        path.append((node, i, j))
+        pokemon.selected_move = pokemon.moves[i]
+        opponent.selected_move = opponent.moves[j]
+        execute_turn(pokemon, opponent, 0, ctx)
+        child = node.children.get((i, j))
+        if child is None:
+            node.children[(i, j)] = _Node(len(pokemon.moves), len(opponent.moves))
+            value = _rollout(pokemon, opponent, ctx, rollout_turns, rollout_policy)
+            break
+        node = child
+
+    for node, i, j in path:
+        node.visits += 1
+        node.counts1[i] += 1
+        node.values1[i] += value
+        node.counts2[j] += 1
+        node.values2[j] -= value
+
+def _search(pokemon: Pokemon, opponent: Pokemon, root: Optional[_Node], playouts: int, seed: int, exploration: float,
+            rollout_turns: int, rollout_policy: Callable[[Pokemon, Pokemon, random.Random], Move]) -> _Node:
+    # Runs in the worker processes as well, so it only touches its own copies of the Pokémon
+    if root is None:
+        root = _Node(len(pokemon.moves), len(opponent.moves))
+    ctx = BattleContext(seed)
+    state = BattleState(pokemon, opponent)
+    saved = state.snapshot()
+    for _ in range(playouts):
+        _playout(root, pokemon, opponent, ctx, exploration, rollout_turns, rollout_policy)
+        state.restore(saved)
+    return root
+
+class MCTSPlayer:
+    """
+    Picks moves with Monte Carlo Tree Search: every playout walks down an open-loop tree of move pairs, picking
+    each side's move by UCB1 on that side's own statistics, plays the turns through execute_turn, and finishes
+    the battle with a rollout of up to `rollout_turns` turns.
+
+    With several workers the playouts are split over a process pool, each worker growing its own tree from the
+    same position (root parallelization), and the move with the most root visits summed over the trees is
+    played. Between consecutive turns of the same battle the subtree of the move pair that was actually played
+    is kept, so the statistics gathered for it are not thrown away.
+
+    Can be passed as a policy to simulate_battle. Call close() (or use it as a context manager) to stop the pool.
+
+    Args:
+        playouts (int, optional): Playouts per decision, over all workers. Defaults to 1000.
+        workers (int, optional): Worker processes, 1 searches in this process. Defaults to 1.
+        exploration (float, optional): UCB1 exploration constant, values are in [-1, 1]. Defaults to 1.0.
+        rollout_turns (int, optional): Turn cap of a rollout, after which the position is evaluated. Defaults to 20.
+        rollout_policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker for rollouts, must be
+            a module-level function when workers > 1. Defaults to random_policy.
+        seed (int | None, optional): Seed of the search, None draws one from the generator the policy is called with. Defaults to None.
+        reuse (bool, optional): Keep the subtree of the move pair played between turns. Defaults to True.
+    """
+    def __init__(self, playouts: int = 1000, workers: int = 1, exploration: float = 1.0, rollout_turns: int = 20,
+                 rollout_policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy,
+                 seed: int | None = None, reuse: bool = True):
+        if playouts < 1:
+            raise ValueError("At least one playout is needed")
+        self.playouts = playouts
+        self.workers = max(1, workers)
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.rollout_policy = rollout_policy
+        self.seed = seed
+        self.reuse = reuse
+        self.stats: Dict[str, float] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._decisions = 0
+        # the trees (one per worker) of every side being played, by id of its Pokémon
+        self._trees: Dict[int, List[_Node]] = {}
+
+    def __call__(self, pokemon: Pokemon, opponent: Pokemon, rng: Optional[random.Random] = None) -> Move:
+        return self.choose(pokemon, opponent, rng)
+
+    def __enter__(self) -> 'MCTSPlayer':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state['_executor'] = None # a pool cannot be pickled, the copy starts its own when needed
+        return state
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _reused_trees(self, pokemon: Pokemon, opponent: Pokemon) -> List[Optional[_Node]]:
+        # The move pair played last turn: ours is still the selected move (picking a new one is what we are
+        # here for), the opponent's is its last move, unknown when a status kept it from moving
+        fresh: List[Optional[_Node]] = [None] * self.workers
+        previous = self._trees.pop(id(pokemon), None)
+        if not self.reuse or previous is None or len(previous) != self.workers:
+            return fresh
+        if pokemon.selected_move not in pokemon.moves or opponent.last_move not in opponent.moves:
+            return fresh
+        key = (pokemon.moves.index(pokemon.selected_move), opponent.moves.index(opponent.last_move))
+        return [root.children.get(key) for root in previous]
+
+    def choose(self, pokemon: Pokemon, opponent: Pokemon, rng: Optional[random.Random] = None) -> Move:
+        """
+        Picks a move for `pokemon`. Both Pokémon are left exactly as they were.
+
+        Args:
+            pokemon (Pokemon): The side to pick for.
+            opponent (Pokemon): The other side.
+            rng (Optional[random.Random], optional): Seeds the search when the player has no seed. Defaults to None.
+
+        Returns:
+            Move: The move with the most root visits.
+
+        Raises:
+            ValueError: If the Pokémon has no moves.
+        """
+        if not pokemon.moves:
+            raise ValueError(f"{pokemon.name} has no moves")
+        if not opponent.moves:
+            return pokemon.moves[0]
+
+        base_seed = self.seed if self.seed is not None else (rng or random).getrandbits(64)
+        seeds = [derive_seed(base_seed, self._decisions * self.workers + k) for k in range(self.workers)]
+        self._decisions += 1
+        roots = self._reused_trees(pokemon, opponent)
+        reused = sum(root.visits for root in roots if root is not None)
+        shares = [self.playouts // self.workers + (1 if k < self.playouts % self.workers else 0) for k in range(self.workers)]
+        args = (self.exploration, self.rollout_turns, self.rollout_policy)
+
+        start = time.perf_counter()
+        if self.workers == 1:
+            searched = [_search(pokemon, opponent, roots[0], shares[0], seeds[0], *args)]
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [self._executor.submit(_search, pokemon, opponent, root, share, seed, *args)
+                       for root, share, seed in zip(roots, shares, seeds)]
+            searched = [future.result() for future in futures]
+        seconds = time.perf_counter() - start
+
+        visits = [sum(root.counts1[i] for root in searched) for i in range(len(pokemon.moves))]
+        move_index = max(range(len(visits)), key=visits.__getitem__)
+        self._trees[id(pokemon)] = searched
+        if len(self._trees) > 2:
+            # a player serves at most both sides of one battle, older entries belong to finished battles
+            del self._trees[next(iter(self._trees))]
+
+        self.stats = {
+            'rollouts': self.playouts,
+            'seconds': seconds,
+            'rollouts_per_second': self.playouts / seconds if seconds > 0 else 0.0,
+            'reused_visits': reused,
+            'workers': self.workers,
+        }
+        return pokemon.moves[move_index]
+
+def rollouts_per_second(pokemon: Pokemon, opponent: Pokemon, playouts: int = 2000, workers: int | None = None) -> float:
+    """
+    Measures search throughput on this machine, to size hardware for a given playout budget.
+
+    Args:
+        pokemon (Pokemon): The side to search for.
+        opponent (Pokemon): The other side.
+        playouts (int, optional): Playouts to time. Defaults to 2000.
+        workers (int | None, optional): Worker processes, None uses every CPU. Defaults to None.
+
+    Returns:
+        float: Playouts per second, measured after the pool has started.
+    """
+    with MCTSPlayer(playouts=playouts, workers=workers or os.cpu_count() or 1, seed=0, reuse=False) as player:
+        player.choose(pokemon, opponent) # warm up the pool
+        player.choose(pokemon, opponent)
+        return player.stats['rollouts_per_second']
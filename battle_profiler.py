@@ -0,0 +1,281 @@
+# battle_profiler.py
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+import battle_engine
+from pokemon_models import Pokemon, Move
+from pokemon_loader import load_pokemon_list
+
+# Opt-in instrumentation of the engine's hot paths. enable() swaps the functions below for timed wrappers and
+# hands execute_move a wrapper for every effect handler (battle_engine.PROFILED_HANDLERS), disable() puts the
+# originals back. Moves and their compiled programs are left alone, so code comparing handlers, like damage_calc
+# and vector_engine, sees the same handlers with profiling on. Calls are recorded per call stack, which gives both per-function totals and the
+# self time of every stack for flame graphs.
+#
+# Only calls that look the function up in battle_engine are seen: everything the engine calls itself, and
+# simulate_battle / simulate_matchup, but not a module that imported execute_turn by name before enable().
+
+PROFILED_FUNCTIONS: Tuple[str, ...] = (
+    'execute_turn', 'execute_move', 'apply_start_move', 'apply_end_turn', 'move_hit', 'calculate_damage',
+)
+
+class _Frame:
+    __slots__ = ('calls', 'nanoseconds', 'children')
+
+    def __init__(self):
+        self.calls = 0
+        self.nanoseconds = 0
+        self.children: Dict[str, '_Frame'] = {}
+
+class Profile:
+    """
+    Call counts and cumulative time of the profiled functions, per call stack. Profiles can be pickled, so
+    workers can send theirs back to be merged.
+    """
+    def __init__(self):
+        self.root = _Frame()
+        self._current = self.root
+
+    def merge(self, other: 'Profile') -> 'Profile':
+        """
+        Adds the counts of another profile to this one, e.g. one from a worker process.
+
+        Args:
+            other (Profile): The profile to add.
+
+        Returns:
+            Profile: This profile.
+        """
+        def add(into: _Frame, frame: _Frame) -> None:
+            into.calls += frame.calls
+            into.nanoseconds += frame.nanoseconds
+            for name, child in frame.children.items():
+                add(into.children.setdefault(name, _Frame()), child)
+        add(self.root, other.root)
+        return self
+
+    def stacks(self) -> Iterator[Tuple[Tuple[str, ...], int, int, int]]:
+        """
+        Walks every call stack that was recorded.
+
+        Yields:
+            Tuple[Tuple[str, ...], int, int, int]: The stack (outermost first), its calls, its total nanoseconds and
+                its self nanoseconds (not spent in a profiled callee).
+        """
+        pending: List[Tuple[Tuple[str, ...], _Frame]] = [((name,), frame) for name, frame in self.root.children.items()]
+        while pending:
+            stack, frame = pending.pop()
+            children = sum(child.nanoseconds for child in frame.children.values())
+            yield stack, frame.calls, frame.nanoseconds, max(0, frame.nanoseconds - children)
+            pending.extend((stack + (name,), child) for name, child in frame.children.items())
+
+    def functions(self) -> Dict[str, Dict[str, int]]:
+        """
+        Totals per function over all the stacks it was called from.
+
+        Returns:
+            Dict[str, Dict[str, int]]: calls, nanoseconds (counted once when the function is in the stack more than
+                once) and self_nanoseconds of every function, slowest first.
+        """
+        totals: Dict[str, Dict[str, int]] = {}
+        for stack, calls, nanoseconds, self_nanoseconds in self.stacks():
+            entry = totals.setdefault(stack[-1], {'calls': 0, 'nanoseconds': 0, 'self_nanoseconds': 0})
+            entry['calls'] += calls
+            entry['self_nanoseconds'] += self_nanoseconds
+            if stack[-1] not in stack[:-1]:
+                entry['nanoseconds'] += nanoseconds
+        return dict(sorted(totals.items(), key=lambda item: item[1]['nanoseconds'], reverse=True))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'functions': self.functions(),
+            'stacks': [{'stack': ';'.join(stack), 'calls': calls, 'nanoseconds': nanoseconds, 'self_nanoseconds': own}
+                       for stack, calls, nanoseconds, own in sorted(self.stacks())],
+        }
+
+    def dump_json(self, file: IO[str]) -> None:
+        json.dump(self.to_dict(), file, indent=2)
+        file.write('\n')
+
+    def dump_collapsed(self, file: IO[str]) -> None:
+        """
+        Writes the self time of every stack in the collapsed format flame graph tools read ('a;b;c 1234' per
+        line, in nanoseconds).
+
+        Args:
+            file (IO[str]): The text file to write to.
+        """
+        for stack, _, _, own in sorted(self.stacks()):
+            if own > 0:
+                file.write(f"{';'.join(stack)} {own}\n")
+
+_originals: Dict[str, Any] = {}
+_active: Optional[Profile] = None
+
+def _timed(name: str, function: Callable[..., Any], profile: Profile) -> Callable[..., Any]:
+    clock = time.perf_counter_ns
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        parent = profile._current
+        frame = parent.children.get(name)
+        if frame is None:
+            frame = parent.children[name] = _Frame()
+        profile._current = frame
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            frame.nanoseconds += clock() - start
+            frame.calls += 1
+            profile._current = parent
+    wrapper.__wrapped__ = function
+    return wrapper
+
+def enable(profile: Optional[Profile] = None) -> Profile:
+    """
+    Starts recording into `profile`. Effect handlers are timed where execute_move calls them, so every move is
+    covered whenever it was compiled.
+
+    Args:
+        profile (Optional[Profile], optional): Where to record, a new profile when None. Defaults to None.
+
+    Returns:
+        Profile: The profile being recorded into.
+
+    Raises:
+        ValueError: If profiling is already on.
+    """
+    global _active
+    if _active is not None:
+        raise ValueError("Profiling is already enabled")
+    profile = profile if profile is not None else Profile()
+
+    for name in PROFILED_FUNCTIONS:
+        _originals[name] = getattr(battle_engine, name)
+        setattr(battle_engine, name, _timed(name, _originals[name], profile))
+    battle_engine.PROFILED_HANDLERS = {handler: _timed(handler.__name__, handler, profile)
+                                       for handler in set(battle_engine.EFFECT_HANDLERS.values())}
+    _active = profile
+    return profile
+
+def disable() -> Optional[Profile]:
+    """
+    Stops recording and puts the engine's own functions back.
+
+    Returns:
+        Optional[Profile]: The profile that was being recorded, None when profiling was off.
+    """
+    global _active
+    if _active is None:
+        return None
+    for name, function in _originals.items():
+        setattr(battle_engine, name, function)
+    _originals.clear()
+    battle_engine.PROFILED_HANDLERS = None
+    profile, _active = _active, None
+    return profile
+
+@contextmanager
+def profiling(profile: Optional[Profile] = None) -> Iterator[Profile]:
+    """
+    Records everything run inside the with block.
+
+    Args:
+        profile (Optional[Profile], optional): Where to record, a new profile when None. Defaults to None.
+
+    Yields:
+        Profile: The profile being recorded into.
+    """
+    profile = enable(profile)
+    try:
+        yield profile
+    finally:
+        disable()
+
+def run_profiled(function: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, Profile]:
+    """
+    Calls a function with profiling on, e.g. as the task of a worker process, whose profile is then sent back
+    with the result to be merged.
+
+    Args:
+        function (Callable[..., Any]): The function to call, with the remaining arguments.
+
+    Returns:
+        Tuple[Any, Profile]: What the function returned and the profile of the call.
+    """
+    with profiling() as profile:
+        result = function(*args, **kwargs)
+    return result, profile
+
+def profile_matchup(species_a: Pokemon, species_b: Pokemon, n_battles: int, workers: int | None = None,
+                    policy: Callable[[Pokemon, Pokemon, random.Random], Move] = battle_engine.random_policy,
+                    max_turns: int = battle_engine.MAX_TURNS, seed: int | None = None) -> Tuple[Dict[str, float], Profile]:
+    """
+    Runs simulate_matchup's battles with profiling on in every worker and merges the workers' profiles.
+
+    Args:
+        species_a (Pokemon): The first Pokémon, copied for every battle.
+        species_b (Pokemon): The second Pokémon, copied for every battle.
+        n_battles (int): The number of battles to run.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker, must be picklable. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the whole matchup. Defaults to None.
+
+    Returns:
+        Tuple[Dict[str, float], Profile]: The summary simulate_matchup would return and the merged profile.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = battle_engine.split_battles(n_battles, workers)
+    first_indices = [sum(chunks[:i]) for i in range(len(chunks))]
+    tasks = [(battle_engine.run_battles, species_a, species_b, chunk, policy, max_turns, seed, first_index)
+             for chunk, first_index in zip(chunks, first_indices)]
+
+    if workers <= 1:
+        results = [run_profiled(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_profiled, *zip(*tasks)))
+
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    profile = Profile()
+    for chunk_counts, chunk_profile in results:
+        for key, value in chunk_counts.items():
+            counts[key] += value
+        profile.merge(chunk_profile)
+    return battle_engine.summarize_counts(counts), profile
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile the engine on a matchup.")
+    parser.add_argument('--data', default='pokemon.xlsx', help="the workbook to load the Pokémon from")
+    parser.add_argument('--a', required=True, help="the first Pokémon")
+    parser.add_argument('--b', required=True, help="the second Pokémon")
+    parser.add_argument('--n', type=int, default=1000, help="number of battles (default: 1000)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: every CPU)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', default=None, help="write the profile as JSON to this file")
+    parser.add_argument('--collapsed', default=None, help="write collapsed stacks for flame graphs to this file")
+    args = parser.parse_args(argv)
+
+    roster = {pokemon.name: pokemon for pokemon in load_pokemon_list(args.data, args.seed)}
+    summary, profile = profile_matchup(roster[args.a], roster[args.b], args.n, args.workers, seed=args.seed)
+    print(f"{summary['battles']} battles, {summary['turns']} turns")
+    print(f"{'function':<28}{'calls':>12}{'total ms':>12}{'self ms':>12}")
+    for name, entry in profile.functions().items():
+        print(f"{name:<28}{entry['calls']:>12}{entry['nanoseconds'] / 1e6:>12.1f}{entry['self_nanoseconds'] / 1e6:>12.1f}")
+    if args.json:
+        with open(args.json, 'w') as file:
+            profile.dump_json(file)
+    if args.collapsed:
+        with open(args.collapsed, 'w') as file:
+            profile.dump_collapsed(file)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+# battle_server.py
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import cycle
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pokemon_models import Pokemon, Move
+from pokemon_loader import load_pokemon_list
+from battle_engine import MAX_TURNS, execute_turn, random_policy
+from battle_context import BattleContext
+from battle_events import TextSink
+from battle_ai import ExpectiminimaxAI
+
+# Hosts many battles at once in one asyncio event loop. Every side of a battle is played by a move provider,
+# which is awaited for its move each turn: a player on a socket, a bot, or a fixed script. Turns themselves are
+# cheap and run in the loop, slow bot decisions can be sent to an executor so they do not hold up other battles.
+
+class MoveProvider:
+    """
+    Plays one side of a battle hosted by run_battle. Subclasses implement choose, and notify if they show the battle to someone.
+    """
+    async def choose(self, pokemon: Pokemon, opponent: Pokemon) -> Move:
+        """
+        Picks the move of `pokemon` for the coming turn.
+
+        Args:
+            pokemon (Pokemon): The side this provider plays.
+            opponent (Pokemon): The other side.
+
+        Returns:
+            Move: One of the Pokémon's moves.
+        """
+        raise NotImplementedError
+
+    async def notify(self, text: str) -> None:
+        """
+        Receives the battle log as it happens, one turn at a time.
+
+        Args:
+            text (str): Log lines, each ending with a newline.
+        """
+
+class ScriptedProvider(MoveProvider):
+    """
+    Plays a fixed sequence of moves, by name, starting over when it runs out.
+
+    Args:
+        moves (Iterable[str]): Names of the moves to play.
+    """
+    def __init__(self, moves: Iterable[str]):
+        self._moves = cycle(list(moves))
+
+    async def choose(self, pokemon: Pokemon, opponent: Pokemon) -> Move:
+        name = next(self._moves)
+        for move in pokemon.moves:
+            if move.name == name:
+                return move
+        raise ValueError(f"{pokemon.name} does not know {name}")
+
+def _decide(policy: Callable[[Pokemon, Pokemon, random.Random], Move], pokemon: Pokemon, opponent: Pokemon, seed: int) -> int:
+    # Runs in the executor, on copies of the Pokémon, so it answers with the index of the move
+    move = policy(pokemon, opponent, random.Random(seed))
+    return pokemon.moves.index(move)
+
+class PolicyProvider(MoveProvider):
+    """
+    Plays with a policy, the same kind of move picker simulate_battle takes (random_policy, ExpectiminimaxAI, ...).
+
+    Args:
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): The move picker. Defaults to random_policy.
+        seed (int | None, optional): Seed of the generator the policy draws from. Defaults to None.
+        executor (Executor | None, optional): Runs the policy on copies of the Pokémon instead of in the event loop,
+            for policies that take long to decide. With a process pool the policy must be picklable, and the pool
+            should use the 'spawn' start method: forked workers inherit the open connections. Defaults to None.
+    """
+    def __init__(self, policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, seed: int | None = None,
+                 executor: Executor | None = None):
+        self.policy = policy
+        self.rng = random.Random(seed)
+        self.executor = executor
+
+    async def choose(self, pokemon: Pokemon, opponent: Pokemon) -> Move:
+        if self.executor is None:
+            return self.policy(pokemon, opponent, self.rng)
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(self.executor, _decide, self.policy, pokemon.clone(), opponent.clone(),
+                                           self.rng.getrandbits(64))
+        return pokemon.moves[index]
+
+class StreamProvider(MoveProvider):
+    """
+    Lets a player pick moves over a text stream, e.g. a TCP connection: the moves are listed, and the player
+    answers with a move's number or name on a line of its own. The battle log is written to the stream as well.
+
+    Args:
+        reader (asyncio.StreamReader): Where the player's lines come from.
+        writer (asyncio.StreamWriter): Where prompts and the log go.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, text: str) -> None:
+        self.writer.write(text.encode())
+        await self.writer.drain()
+
+    def connected(self) -> bool:
+        # a peer that disconnected leaves the writer open until we close it, but its end of stream is read in
+        # the background, so the reader reaches EOF once everything it sent has been read
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    async def read_line(self) -> str:
+        """
+        Reads the player's next line.
+
+        Returns:
+            str: The line, stripped.
+
+        Raises:
+            ConnectionError: If the player disconnected.
+        """
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("The player disconnected")
+        return line.decode(errors='replace').strip()
+
+    async def choose(self, pokemon: Pokemon, opponent: Pokemon) -> Move:
+        listed = ", ".join(f"{i}. {move.name}" for i, move in enumerate(pokemon.moves, 1))
+        while True:
+            await self.send(f"Choose a move for {pokemon.name}: {listed}\n")
+            answer = await self.read_line()
+            if answer.isdigit() and 1 <= int(answer) <= len(pokemon.moves):
+                return pokemon.moves[int(answer) - 1]
+            for move in pokemon.moves:
+                if move.name.lower() == answer.lower():
+                    return move
+            await self.send(f"Unknown move: {answer}\n")
+
+    async def notify(self, text: str) -> None:
+        await self.send(text)
+
+async def run_battle(pokemon1: Pokemon, pokemon2: Pokemon, provider1: MoveProvider, provider2: MoveProvider,
+                     seed: int | None = None, max_turns: int = MAX_TURNS) -> Tuple[int, int]:
+    """
+    Plays a battle between fresh copies of two Pokémon, awaiting both providers for their moves every turn.
+    Plays out like simulate_battle otherwise: the same seed and moves give the same battle.
+
+    Args:
+        pokemon1 (Pokemon): The first Pokémon, left untouched.
+        pokemon2 (Pokemon): The second Pokémon, left untouched.
+        provider1 (MoveProvider): Plays the first Pokémon.
+        provider2 (MoveProvider): Plays the second Pokémon.
+        seed (int | None, optional): Seed of the battle. Defaults to None.
+        max_turns (int, optional): Turn cap after which the battle is a draw. Defaults to MAX_TURNS.
+
+    Returns:
+        Tuple[int, int]: The winner (1 or 2, 0 for a draw) and the number of turns played.
+    """
+    pokemon1 = pokemon1.clone()
+    pokemon2 = pokemon2.clone()
+    sink = TextSink()
+    ctx = BattleContext(seed, sink=sink)
+    turn_count = 0
+
+    while pokemon1.battle_stats['hp'] > 0 and pokemon2.battle_stats['hp'] > 0 and turn_count < max_turns:
+        # both sides pick at the same time, neither waits on the other
+        choices = [asyncio.ensure_future(provider1.choose(pokemon1, pokemon2)),
+                   asyncio.ensure_future(provider2.choose(pokemon2, pokemon1))]
+        try:
+            pokemon1.selected_move, pokemon2.selected_move = await asyncio.gather(*choices)
+        except BaseException:
+            for choice in choices:
+                choice.cancel() # e.g. one player left, stop waiting on the other
+            raise
+        _, turn_count = execute_turn(pokemon1, pokemon2, turn_count, ctx)
+        log = sink.text()
+        sink.clear()
+        await asyncio.gather(provider1.notify(log), provider2.notify(log))
+
+    winner = 0
+    if pokemon1.battle_stats['hp'] > 0 and pokemon2.battle_stats['hp'] <= 0:
+        winner = 1
+    elif pokemon2.battle_stats['hp'] > 0 and pokemon1.battle_stats['hp'] <= 0:
+        winner = 2
+    return winner, turn_count
+
+class BattleServer:
+    """
+    Hosts battles over a line-based TCP protocol, any number at once in one event loop.
+
+    A client picks its Pokémon with 'play <name>', to be matched with the next client doing the same, or
+    'bot <name>', to battle a bot right away. Moves are then asked for every turn (see StreamProvider), the log is
+    sent as it happens, and the connection is closed when the battle ends. A player who disconnects loses.
+
+    Args:
+        roster (Dict[str, Pokemon]): The Pokémon that can be picked, by name.
+        bot_policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): How bots play. Defaults to random_policy.
+        executor (Executor | None, optional): Runs bot decisions, None runs them in the event loop. Defaults to None.
+        max_turns (int, optional): Turn cap of every battle. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the server's generator, which picks the bots' Pokémon and seeds their
+            policies. Defaults to None.
+    """
+    def __init__(self, roster: Dict[str, Pokemon], bot_policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy,
+                 executor: Executor | None = None, max_turns: int = MAX_TURNS, seed: int | None = None):
+        self.roster = roster
+        self.bot_policy = bot_policy
+        self.executor = executor
+        self.max_turns = max_turns
+        self.rng = random.Random(seed)
+        self.active = 0
+        self.finished = 0
+        self._names = {name.lower(): name for name in roster}
+        self._waiting: Optional[Tuple[Pokemon, StreamProvider, asyncio.Future]] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> asyncio.AbstractServer:
+        """
+        Starts accepting clients.
+
+        Args:
+            host (str, optional): Address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on, 0 picks a free one. Defaults to 8765.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        player = StreamProvider(reader, writer)
+        try:
+            await player.send("Welcome! Send 'play <Pokémon>' to battle the next player or 'bot <Pokémon>' to battle a bot.\n")
+            mode, pokemon = await self._pick(player)
+            if self._waiting is not None and not self._waiting[1].connected():
+                # the waiting player left before anyone came, let its connection finish
+                if not self._waiting[2].done():
+                    self._waiting[2].set_result(None)
+                self._waiting = None
+            if mode == 'bot':
+                opponent = self.roster[self.rng.choice(list(self.roster))]
+                bot = PolicyProvider(self.bot_policy, seed=self.rng.getrandbits(64), executor=self.executor)
+                await self._battle(pokemon, opponent, player, bot)
+            elif self._waiting is not None:
+                opponent, other, done = self._waiting
+                self._waiting = None
+                try:
+                    await self._battle(opponent, pokemon, other, player)
+                finally:
+                    if not done.done(): # cancelled when the server shuts down
+                        done.set_result(None)
+            else:
+                done = asyncio.get_running_loop().create_future()
+                self._waiting = (pokemon, player, done)
+                await player.send("Waiting for an opponent...\n")
+                await done # the opponent's connection runs the battle
+        except ConnectionError:
+            pass
+        finally:
+            if self._waiting is not None and self._waiting[1] is player:
+                self._waiting = None
+            writer.close()
+
+    async def _pick(self, player: StreamProvider) -> Tuple[str, Pokemon]:
+        while True:
+            mode, _, name = (await player.read_line()).partition(' ')
+            mode = mode.lower()
+            if mode in ('play', 'bot') and name.strip().lower() in self._names:
+                return mode, self.roster[self._names[name.strip().lower()]]
+            if mode in ('play', 'bot'):
+                await player.send(f"Unknown Pokémon: {name.strip()}\n")
+            else:
+                await player.send("Send 'play <Pokémon>' or 'bot <Pokémon>'.\n")
+
+    async def _battle(self, pokemon1: Pokemon, pokemon2: Pokemon, provider1: MoveProvider, provider2: MoveProvider) -> None:
+        providers = (provider1, provider2)
+        names = (pokemon1.name, pokemon2.name)
+        self.active += 1
+        try:
+            await asyncio.gather(*(provider.notify(f"Battle between {names[0]} and {names[1]} begins!\n\n") for provider in providers))
+            winner, _ = await run_battle(pokemon1, pokemon2, provider1, provider2, max_turns=self.max_turns)
+            result = f"{names[winner - 1]} wins the battle!\n" if winner else "The battle is a draw!\n"
+        except ConnectionError:
+            # whoever is still connected wins by forfeit
+            result = "Your opponent left, you win the battle!\n"
+        finally:
+            self.active -= 1
+            self.finished += 1
+        for provider in providers:
+            try:
+                await provider.notify(result)
+            except ConnectionError:
+                pass
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Host battles over TCP.")
+    parser.add_argument('--data', default='pokemon.xlsx', help="the workbook to load the Pokémon from")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--bot', choices=['random', 'ai'], default='random', help="how bots play (default: random)")
+    parser.add_argument('--workers', type=int, default=0, help="processes for bot decisions, 0 decides in the event loop")
+    parser.add_argument('--seed', type=int, default=None, help="seeds the bots' Pokémon and moves")
+    args = parser.parse_args(argv)
+
+    roster = {pokemon.name: pokemon for pokemon in load_pokemon_list(args.data)}
+    bot_policy = ExpectiminimaxAI() if args.bot == 'ai' else random_policy
+    # spawned rather than forked, a forked worker would keep a copy of every connection open at the time
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) if args.workers > 0 else None
+    server = BattleServer(roster, bot_policy, executor, seed=args.seed)
+
+    async def serve() -> None:
+        listener = await server.start(args.host, args.port)
+        print(f"Serving battles on {args.host}:{args.port}")
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
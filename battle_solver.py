@@ -0,0 +1,339 @@
+# battle_solver.py
+
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import (
+    MAX_TURNS, apply_end_turn, compile_move, execute_move, move_order, random_policy, handle_absorb, handle_counter, handle_crit_ratio, handle_damage,
+    handle_double_hit, handle_multi_hit, handle_recoil,
+)
+from battle_context import BattleContext
+from battle_state import BattleState
+
+# Draws of random.uniform are continuous, the solver follows this many evenly spaced values of each instead.
+# Only handle_random_level_damage draws one, every other draw of the engine is followed exactly.
+UNIFORM_POINTS = 64
+DEFAULT_EPSILON = 1e-7
+DEFAULT_MAX_STATES = 200_000
+
+class Enumerator(BattleContext):
+    """
+    A context that, instead of drawing, walks every outcome of every draw: a step of a turn is played once per
+    combination of outcomes (a leaf), each run following `script` for the draws it has already branched on and
+    taking the first outcome of any new one. The outcomes picked and their odds are kept in `trace`.
+
+    To walk a step, clear `script`, then play it from the same position after start() until advance() returns
+    False; probability() is the chance of the leaf just played. ExpectiminimaxAI expands its chance nodes with it.
+    """
+    def __init__(self):
+        super().__init__(rng=random.Random(0)) # never drawn from
+        self.script: List[int] = []
+        self.trace: List[Tuple[int, Sequence[float]]] = []
+        self._damages: Dict[Tuple[Any, ...], Tuple[Tuple[int, ...], Tuple[float, ...]]] = {}
+
+    def start(self) -> None:
+        self.trace = []
+
+    def _branch(self, weights: Sequence[float]) -> int:
+        position = len(self.trace)
+        if position < len(self.script):
+            index = self.script[position]
+        else:
+            index = next(i for i, weight in enumerate(weights) if weight > 0)
+        self.trace.append((index, weights))
+        return index
+
+    def probability(self) -> float:
+        probability = 1.0
+        for index, weights in self.trace:
+            probability *= weights[index]
+        return probability
+
+    def advance(self) -> bool:
+        # Moves the script to the next leaf, depth first: the deepest draw with an outcome left takes it
+        while self.trace:
+            index, weights = self.trace.pop()
+            for following in range(index + 1, len(weights)):
+                if weights[following] > 0:
+                    self.script = [taken for taken, _ in self.trace] + [following]
+                    return True
+        return False
+
+    def chance(self, probability: float) -> bool:
+        probability = min(1.0, max(0.0, probability))
+        return self._branch((probability, 1.0 - probability)) == 0
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self._branch((1 / (b - a + 1),) * (b - a + 1))
+
+    def roll_at_most(self, a: int, b: int, threshold: float) -> bool:
+        n = b - a + 1
+        hits = min(n, max(0, math.floor(threshold) - a + 1))
+        return self._branch((hits / n, 1.0 - hits / n)) == 0
+
+    def roll_damage(self, base_damage: int, crit_ratio: float, stab: float, type_effectiveness: float) -> int:
+        # One branch per distinct damage rather than per crit and roll, most of the 32 pairs land on the same few values
+        arguments = (base_damage, crit_ratio, stab, type_effectiveness)
+        damages = self._damages.get(arguments)
+        if damages is None:
+            crit_chance = min(1.0, max(0.0, crit_ratio))
+            odds: Dict[int, float] = {}
+            for crit_multiplier, chance in ((1.5, crit_chance), (1.0, 1.0 - crit_chance)):
+                for roll in range(85, 101):
+                    damage = int(base_damage * crit_multiplier * (roll / 100) * stab * type_effectiveness)
+                    odds[damage] = odds.get(damage, 0.0) + chance / 16
+            damages = self._damages[arguments] = (tuple(odds), tuple(odds.values()))
+        values, weights = damages
+        return values[self._branch(weights)]
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return seq[self._branch((1 / len(seq),) * len(seq))]
+
+    def choices(self, population: Sequence[Any], weights: List[float]) -> Any:
+        total = sum(weights)
+        return population[self._branch(tuple(weight / total for weight in weights))]
+
+    def uniform(self, a: float, b: float) -> float:
+        index = self._branch((1 / UNIFORM_POINTS,) * UNIFORM_POINTS)
+        return a + (b - a) * (index + 0.5) / UNIFORM_POINTS
+
+class _PolicyRandom:
+    """
+    Stands in for the generator a policy draws from, so its picks are walked like the engine's draws. Covers
+    the draws of random_policy and other policies that pick with choice, choices or randint.
+    """
+    def __init__(self, enumerator: Enumerator):
+        self._enumerator = enumerator
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return self._enumerator.choice(seq)
+
+    def choices(self, population: Sequence[Any], weights: List[float] | None = None, k: int = 1) -> List[Any]:
+        weights = list(weights) if weights is not None else [1.0] * len(population)
+        return [self._enumerator.choices(population, weights) for _ in range(k)]
+
+    def randint(self, a: int, b: int) -> int:
+        return self._enumerator.randint(a, b)
+
+    def __getattr__(self, name: str) -> Any:
+        raise ValueError(f"The solver cannot follow the policy's '{name}' draws, only choice, choices and randint")
+
+# Handlers that always set the attacker's last damage, a recoil or absorb effect after one of them never reads an
+# older value
+_SETS_LAST_DAMAGE = (handle_damage, handle_multi_hit, handle_double_hit, handle_crit_ratio)
+
+def _reads_history(moves: Sequence[Move]) -> bool:
+    # True when a move can read the last move or last damage of an earlier turn: Counter reads the opponent's,
+    # recoil and absorb read the user's when no damage handler of the same move set it first
+    for move in moves:
+        program = move.program if move.program is not None else compile_move(move)
+        fresh = False
+        for handler, _ in program:
+            if handler is handle_counter or (handler in (handle_recoil, handle_absorb) and not fresh):
+                return True
+            fresh = fresh or handler in _SETS_LAST_DAMAGE
+    return False
+
+def _position_key(pokemon: Pokemon, history: bool) -> Tuple[Any, ...]:
+    # What decides how the rest of the battle plays out for the solver: HP, stages, multipliers and statuses. The
+    # last move and damage only when a move of the matchup can read them, otherwise positions that differ only in
+    # how they were reached are merged.
+    key = (pokemon.battle_stats['hp'], tuple(pokemon.stat_stages.values()), tuple(pokemon.stat_multipliers.values()),
+           tuple(pokemon.status_durations), pokemon.status_order)
+    if history:
+        key += (pokemon.last_damage, pokemon.last_move.name if pokemon.last_move is not None else None)
+    return key
+
+def _key_winner(key: Tuple[Any, ...]) -> int:
+    # the winner of a finished battle from its position key, HP coming first in both halves
+    if key[0][0] > 0 and key[1][0] <= 0:
+        return 1
+    if key[1][0] > 0 and key[0][0] <= 0:
+        return 2
+    return 0
+
+class _OutOfBudget(Exception):
+    pass
+
+def solve_matchup(species_a: Pokemon, species_b: Pokemon, policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy,
+                  max_turns: int = MAX_TURNS, epsilon: float = DEFAULT_EPSILON, max_states: int | None = DEFAULT_MAX_STATES,
+                  time_limit: float | None = None, partial: bool = False) -> Dict[str, float]:
+    """
+    Computes the odds of a matchup exactly instead of sampling battles: the battle is a Markov chain over
+    positions (HP, stages, multipliers and statuses of both sides, plus the last move and damage when a move of
+    the matchup reads them), and the chance of being in each position is carried forward one turn at a time
+    until every battle is over or the turn cap is reached.
+
+    A turn is split into the steps execute_turn goes through: the policy's picks and the move order, the first
+    move, the second move and the end of turn. Each step is played once for every combination of outcomes of its
+    draws (hits, crits, damage rolls, status procs, speed ties, picks), which gives the engine's own odds, and
+    its outcomes are cached by position, so a position reached again by another path is not played again.
+    Positions whose chance falls below `epsilon` are dropped and reported as `pruned`.
+
+    Realistic limits: one or two damaging moves a side take tens of thousands of positions and 5 to 30 seconds
+    (Magikarp with Tackle against Pikachu with Quick Attack and Thunderbolt: about 100,000 positions, 15 seconds;
+    Snorlax with Earthquake against Machamp with Strength: about 60,000 positions, 30 seconds). Every status,
+    stage change and extra move multiplies the positions, so full movesets are out of reach; `max_states` and
+    `time_limit` stop such a solve instead of letting it run for hours, and simulate_matchup is the tool for them.
+
+    Args:
+        species_a (Pokemon): The first Pokémon, left untouched.
+        species_b (Pokemon): The second Pokémon, left untouched.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Picks a move for a Pokémon, its draws must go
+            through choice, choices or randint of the generator it is given, and it may only look at what the
+            position holds. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which the battle is a draw, as in simulate_battle. Defaults to MAX_TURNS.
+        epsilon (float, optional): Chance under which a position is dropped. Defaults to DEFAULT_EPSILON.
+        max_states (int | None, optional): Most positions to visit, None for no limit. Defaults to DEFAULT_MAX_STATES.
+        time_limit (float | None, optional): Most seconds to spend, None for no limit. Defaults to None.
+        partial (bool, optional): When a limit is reached, return what was solved so far instead of raising.
+            Defaults to False.
+
+    Returns:
+        Dict[str, float]: win_rate_a, win_rate_b, draw_rate and avg_turns (over the battles that were resolved),
+            comparable with the summary of simulate_matchup, plus the chance pruned, the chance left unresolved
+            when a limit stopped a partial solve, the number of positions visited and whether the solve completed.
+
+    Raises:
+        ValueError: If a limit is reached and `partial` is False.
+    """
+    pokemon1 = species_a.clone()
+    pokemon2 = species_b.clone()
+    state = BattleState(pokemon1, pokemon2)
+    enumerator = Enumerator()
+    policy_rng = _PolicyRandom(enumerator)
+    history = _reads_history(pokemon1.moves) or _reads_history(pokemon2.moves)
+    sides = (pokemon1, pokemon2)
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+
+    def position() -> Tuple[Any, ...]:
+        return _position_key(pokemon1, history), _position_key(pokemon2, history)
+
+    snapshots: Dict[Tuple[Any, ...], Tuple[Any, ...]] = {}
+    steps: Dict[Tuple[Any, ...], Dict[Any, float]] = {}
+
+    def outcomes(step: Tuple[Any, ...], key: Tuple[Any, ...], play: Callable[[], Any]) -> Dict[Any, float]:
+        # Plays a step from a position once per combination of outcomes of its draws and sums the odds of every
+        # resulting position (or of what `play` returns, when it returns something)
+        cached = steps.get(step)
+        if cached is not None:
+            return cached
+        if max_states is not None and len(snapshots) > max_states:
+            raise _OutOfBudget(f"Visited more than {max_states} positions")
+        if deadline is not None and time.monotonic() > deadline:
+            raise _OutOfBudget(f"Took more than {time_limit} seconds")
+        result: Dict[Any, float] = {}
+        saved = snapshots[key]
+        enumerator.script = []
+        while True:
+            state.restore(saved)
+            enumerator.start()
+            outcome = play()
+            if outcome is None:
+                outcome = position()
+                if outcome not in snapshots:
+                    snapshots[outcome] = state.snapshot()
+            result[outcome] = result.get(outcome, 0.0) + enumerator.probability()
+            if not enumerator.advance():
+                break
+        state.restore(saved)
+        steps[step] = result
+        return result
+
+    def picks() -> Tuple[int, int, int]:
+        pokemon1.selected_move = policy(pokemon1, pokemon2, policy_rng)
+        pokemon2.selected_move = policy(pokemon2, pokemon1, policy_rng)
+        first, _ = move_order(pokemon1, pokemon2, enumerator)
+        return pokemon1.moves.index(pokemon1.selected_move), pokemon2.moves.index(pokemon2.selected_move), int(first is pokemon2)
+
+    def move(key: Tuple[Any, ...], side: int, index: int, is_first_move: bool) -> Dict[Any, float]:
+        def play() -> None:
+            attacker = sides[side]
+            attacker.selected_move = attacker.moves[index]
+            execute_move(attacker, sides[1 - side], is_first_move, enumerator)
+        return outcomes(('move', key, side, index, is_first_move), key, play)
+
+    def end_turn() -> None:
+        apply_end_turn(pokemon1, pokemon2, enumerator)
+        apply_end_turn(pokemon2, pokemon1, enumerator)
+
+    def turn(key: Tuple[Any, ...]) -> Tuple[List[float], Dict[Tuple[Any, ...], float]]:
+        # The odds of every position after a turn, in execute_turn's order, and of the battles it ends. Equal
+        # positions are merged after every step, so each is carried through the rest of the turn once
+        ended = [0.0, 0.0, 0.0] # draw, win of the first side, win of the second side
+        waiting: Dict[Tuple[Any, ...], float] = {} # after the first move: (position, side moving second, its move)
+        for (index1, index2, first), chance in outcomes(('picks', key), key, picks).items():
+            indices = (index1, index2)
+            for after_first, probability in move(key, first, indices[first], True).items():
+                step = after_first, 1 - first, indices[1 - first]
+                waiting[step] = waiting.get(step, 0.0) + chance * probability
+        moved: Dict[Tuple[Any, ...], float] = {}
+        for (after_first, side, index), chance in waiting.items():
+            if after_first[0][0] > 0 and after_first[1][0] > 0:
+                for after_second, probability in move(after_first, side, index, False).items():
+                    moved[after_second] = moved.get(after_second, 0.0) + chance * probability
+            else:
+                moved[after_first] = moved.get(after_first, 0.0) + chance
+        following: Dict[Tuple[Any, ...], float] = {}
+        for after_moves, chance in moved.items():
+            for after_end, probability in outcomes(('end', after_moves), after_moves, end_turn).items():
+                if after_end[0][0] > 0 and after_end[1][0] > 0:
+                    following[after_end] = following.get(after_end, 0.0) + chance * probability
+                else:
+                    ended[_key_winner(after_end)] += chance * probability
+        return ended, following
+
+    start = position()
+    snapshots[start] = state.snapshot()
+    transitions: Dict[Tuple[Any, ...], Tuple[List[float], Dict[Tuple[Any, ...], float]]] = {}
+    current: Dict[Tuple[Any, ...], float] = {start: 1.0}
+    results = [0.0, 0.0, 0.0]
+    turns = 0.0
+    pruned = 0.0
+    complete = True
+    try:
+        for turn_number in range(1, max_turns + 1):
+            if not current:
+                break
+            reached: Dict[Tuple[Any, ...], float] = {}
+            # the turn's transitions are all found before any chance moves on, so a limit stops between turns
+            for key in current:
+                if key not in transitions:
+                    transitions[key] = turn(key)
+            for key, chance in current.items():
+                ended, following = transitions[key]
+                for winner, probability in enumerate(ended):
+                    results[winner] += chance * probability
+                    turns += turn_number * chance * probability
+                for next_key, probability in following.items():
+                    reached[next_key] = reached.get(next_key, 0.0) + chance * probability
+            current = {}
+            for key, chance in reached.items():
+                if chance < epsilon:
+                    pruned += chance
+                else:
+                    current[key] = chance
+        else:
+            # battles still going at the turn cap are draws
+            for chance in current.values():
+                results[0] += chance
+                turns += max_turns * chance
+            current = {}
+    except _OutOfBudget as error:
+        if not partial:
+            raise ValueError(f"{error} before the matchup was solved") from None
+        complete = False
+
+    resolved = sum(results)
+    return {
+        'win_rate_a': results[1],
+        'win_rate_b': results[2],
+        'draw_rate': results[0],
+        'avg_turns': turns / resolved if resolved > 0 else 0.0,
+        'pruned': pruned,
+        'unresolved': sum(current.values()),
+        'states': len(snapshots),
+        'complete': complete,
+    }
@@ -0,0 +1,71 @@
+# battle_state.py
+
+import hashlib
+from typing import Any, Optional, Tuple
+from pokemon_models import Pokemon
+from battle_context import BattleContext
+
+class BattleState:
+    """
+    The mutable state of a battle between two Pokémon, for search and what-if analysis: snapshot captures it and
+    restore rewinds both Pokémon to it in place, so a battle can be branched as often as needed without copying
+    either Pokémon (their species, moves and effect lists are never touched).
+
+    Captured per Pokémon: battle stats, stat stages and multipliers, statuses, selected and last move, last
+    damage and can_move. With a context, the state of its generator is captured too, so a restored battle also
+    replays the same luck.
+
+    Args:
+        pokemon1 (Pokemon): The first Pokémon.
+        pokemon2 (Pokemon): The second Pokémon.
+        ctx (Optional[BattleContext], optional): The battle's context, to capture its generator. Defaults to None.
+    """
+    def __init__(self, pokemon1: Pokemon, pokemon2: Pokemon, ctx: Optional[BattleContext] = None):
+        self.pokemon1 = pokemon1
+        self.pokemon2 = pokemon2
+        self.ctx = ctx
+
+    def snapshot(self) -> Tuple[Any, ...]:
+        """
+        Captures the current state.
+
+        Returns:
+            Tuple[Any, ...]: The state, to be passed to restore as is. It can be restored any number of times.
+        """
+        rng_state = self.ctx.rng.getstate() if self.ctx is not None else None
+        return self.pokemon1.snapshot(), self.pokemon2.snapshot(), rng_state
+
+    def restore(self, state: Tuple[Any, ...]) -> None:
+        """
+        Rewinds both Pokémon (and the generator, if it was captured) to a snapshot.
+
+        Args:
+            state (Tuple[Any, ...]): A state returned by snapshot.
+        """
+        self.pokemon1.restore(state[0])
+        self.pokemon2.restore(state[1])
+        if state[2] is not None and self.ctx is not None:
+            self.ctx.rng.setstate(state[2])
+
+    def key(self) -> Tuple[Any, ...]:
+        """
+        Returns a hashable key of the position, equal for positions that play out the same (see Pokemon.state_key).
+        The generator is not part of it. Cheap, but Python's hash of it changes from one process to the next.
+
+        Returns:
+            Tuple[Any, ...]: The key.
+        """
+        return self.pokemon1.state_key(), self.pokemon2.state_key()
+
+    def hash64(self) -> int:
+        """
+        Returns a 64-bit hash of the position that is stable across processes, runs and machines, e.g. to share
+        or store results by position. The key includes each species' level, stats and moves, so the same species
+        rolled with other IVs and EVs, or given other moves, in another run does not collide with this one.
+
+        Returns:
+            int: The hash, as an unsigned 64-bit integer.
+        """
+        # the repr of ints, floats, strings and None is canonical, so it doubles as a stable encoding
+        digest = hashlib.blake2b(repr(self.key()).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
@@ -0,0 +1,202 @@
+# benchmarks.py
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pokemon_models import Pokemon, Move
+from pokemon_loader import load_dataset, load_pokemon_list
+from battle_engine import calculate_damage, calculate_type_effectiveness, execute_turn, simulate_battle
+from battle_context import BattleContext
+
+# Times the engine's hot paths and compares them with a stored baseline, so a change that slows the engine down
+# fails loudly instead of shipping unnoticed. Every benchmark reports a rate (higher is better) and is the best
+# of a few repeats, which filters out most of the noise of a busy machine.
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.2 # a benchmark regresses when it is more than 20% slower than its baseline
+REPEATS = 5
+
+def _best_rate(run: Callable[[], int], repeats: int = REPEATS) -> float:
+    # run returns the number of operations it did, the best rate over the repeats is kept
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        operations = run()
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            best = max(best, operations / elapsed)
+    return best
+
+def _first_with(roster: List[Pokemon], effects: Tuple[str, ...]) -> Tuple[Pokemon, Move]:
+    for pokemon in roster:
+        for move in pokemon.moves:
+            if any(move.has_effect(effect) for effect in effects):
+                return pokemon, move
+    raise ValueError(f"No Pokémon knows a move with one of {effects}")
+
+def _turn_rate(pokemon1: Pokemon, move1: Move, pokemon2: Pokemon, move2: Move, turns: int) -> Callable[[], int]:
+    # Plays the same pair of moves over and over, starting over whenever a side faints
+    def run() -> int:
+        p1, p2 = pokemon1.clone(), pokemon2.clone()
+        saved1, saved2 = p1.snapshot(), p2.snapshot()
+        ctx = BattleContext(0)
+        for _ in range(turns):
+            p1.selected_move = move1
+            p2.selected_move = move2
+            execute_turn(p1, p2, 0, ctx)
+            if p1.battle_stats['hp'] <= 0 or p2.battle_stats['hp'] <= 0:
+                p1.restore(saved1)
+                p2.restore(saved2)
+        return turns
+    return run
+
+def run_benchmarks(file_path: str, scale: float = 1.0, only: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Runs the benchmarks.
+
+    Args:
+        file_path (str): The pokemon.xlsx workbook.
+        scale (float, optional): Multiplies the work done per benchmark, lower for a quick check. Defaults to 1.0.
+        only (Optional[List[str]], optional): Names of the benchmarks to run, None runs all of them. Defaults to None.
+
+    Returns:
+        Dict[str, float]: The rate of every benchmark, in operations per second.
+    """
+    def size(n: int) -> int:
+        return max(1, int(n * scale))
+
+    roster = load_pokemon_list(file_path, seed=0)
+    rows = load_dataset(file_path)[0]
+    attacker, damage_move = _first_with(roster, ('damage',))
+    # the defender hits back with a plain damaging move in the turn benchmarks
+    defender, tackle = _first_with([pokemon for pokemon in roster if pokemon is not attacker], ('damage',))
+    multi_hit = _first_with(roster, ('multi_hit', 'hits', 'double_hit'))
+    status = _first_with(roster, ('sleep', 'paralyze', 'poison', 'badly_poison', 'burn', 'confuse', 'seed', 'trap'))
+    boost = _first_with(roster, ('stage',))
+
+    def calculate_damage_run() -> int:
+        ctx = BattleContext(0)
+        for _ in range(size(50000)):
+            calculate_damage(attacker, defender, damage_move, ctx=ctx)
+        return size(50000)
+
+    def type_effectiveness_run() -> int:
+        for _ in range(size(50000)):
+            calculate_type_effectiveness(damage_move.type, defender.type)
+        return size(50000)
+
+    def construct_run() -> int:
+        rng = random.Random(0)
+        for i in range(size(5000)):
+            Pokemon(**rows[i % len(rows)], level=90, rng=rng)
+        return size(5000)
+
+    def clone_run() -> int:
+        for _ in range(size(50000)):
+            attacker.clone()
+        return size(50000)
+
+    def battle_run() -> int:
+        for i in range(size(500)):
+            simulate_battle(roster[i % len(roster)], roster[-1 - i % len(roster)], seed=i)
+        return size(500)
+
+    def load_run(cache: bool) -> Callable[[], int]:
+        def run() -> int:
+            load_pokemon_list(file_path, seed=0, cache=cache)
+            return 1
+        return run
+
+    benchmarks: Dict[str, Tuple[Callable[[], int], int]] = {
+        'load_pokemon_list_cold': (load_run(False), 1),
+        'load_pokemon_list_warm': (load_run(True), REPEATS),
+        'calculate_damage': (calculate_damage_run, REPEATS),
+        'calculate_type_effectiveness': (type_effectiveness_run, REPEATS),
+        'execute_turn_multi_hit': (_turn_rate(multi_hit[0], multi_hit[1], defender, tackle, size(20000)), REPEATS),
+        'execute_turn_status': (_turn_rate(status[0], status[1], defender, tackle, size(20000)), REPEATS),
+        'execute_turn_stat_boost': (_turn_rate(boost[0], boost[1], defender, tackle, size(20000)), REPEATS),
+        'pokemon_construction': (construct_run, REPEATS),
+        'pokemon_clone': (clone_run, REPEATS),
+        'full_battles': (battle_run, REPEATS),
+    }
+    results: Dict[str, float] = {}
+    for name, (run, repeats) in benchmarks.items():
+        if only is None or name in only:
+            results[name] = _best_rate(run, repeats)
+    return results
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float = DEFAULT_THRESHOLD,
+            thresholds: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    Finds the benchmarks that got slower than their baseline by more than their threshold.
+
+    Args:
+        results (Dict[str, float]): Rates of the current run.
+        baseline (Dict[str, float]): Rates of the baseline run.
+        threshold (float, optional): Allowed slowdown, as a fraction of the baseline rate. Defaults to DEFAULT_THRESHOLD.
+        thresholds (Optional[Dict[str, float]], optional): Allowed slowdown per benchmark, overriding `threshold`. Defaults to None.
+
+    Returns:
+        List[str]: One line per regression, empty when there is none.
+    """
+    thresholds = thresholds or {}
+    regressions = []
+    for name, rate in results.items():
+        if name not in baseline or baseline[name] <= 0:
+            continue
+        allowed = thresholds.get(name, threshold)
+        change = rate / baseline[name] - 1
+        if change < -allowed:
+            regressions.append(f"{name}: {rate:,.1f}/s vs {baseline[name]:,.1f}/s baseline ({change:+.1%}, allowed -{allowed:.0%})")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the engine and check it against a baseline.")
+    parser.add_argument('--data', default='pokemon.xlsx', help="the workbook to load the Pokémon from")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f"the baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument('--save', action='store_true', help="store this run as the new baseline instead of comparing")
+    parser.add_argument('--threshold', type=float, default=None, help="allowed slowdown, overrides the baseline file's")
+    parser.add_argument('--scale', type=float, default=1.0, help="work per benchmark, lower for a quick check (default: 1)")
+    parser.add_argument('--only', nargs='+', default=None, help="benchmarks to run (default: all)")
+    parser.add_argument('--output', default=None, help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.data, args.scale, args.only)
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.save:
+        saved: Dict = {'threshold': args.threshold if args.threshold is not None else DEFAULT_THRESHOLD, 'thresholds': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                saved = json.load(file) # keep the configured thresholds
+            if args.threshold is not None:
+                saved['threshold'] = args.threshold
+        saved['results'] = {**saved.get('results', {}), **results}
+        with open(args.baseline, 'w') as file:
+            json.dump(saved, file, indent=2)
+            file.write('\n')
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to create one", file=sys.stderr)
+        return 2
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    threshold = args.threshold if args.threshold is not None else baseline.get('threshold', DEFAULT_THRESHOLD)
+    regressions = compare(results, baseline['results'], threshold, baseline.get('thresholds'))
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# damage_calc.py
+
+import math
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import (
+    ACCURACY_STAGE_MULTIPLIERS, compile_move, handle_counter, handle_crit_ratio, handle_damage, handle_double_hit,
+    handle_faint, handle_half_hp, handle_level_damage, handle_multi_hit, handle_random_level_damage,
+)
+
+# Exact damage odds, worked out from the same formulas the engine samples from: calculate_damage rolls a
+# crit and one of the 16 damage rolls from 85 to 100, handle_multi_hit draws its hit count, and so on.
+# Every distribution is a dict of damage to probability.
+
+CRIT_MULTIPLIER = 1.5
+DAMAGE_ROLLS = range(85, 101) # calculate_damage draws randint(85, 100) / 100
+MULTI_HIT_COUNTS: Tuple[Tuple[int, float], ...] = ((2, 3/8), (3, 3/8), (4, 1/8), (5, 1/8)) # as drawn by handle_multi_hit
+DAMAGE_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=DAMAGE_CACHE_SIZE)
+def _damage_table(level: int, power: int, attack: int, defense: int, burn: float, stab: float,
+                  type_effectiveness: float, crit_ratio: float, hit_counts: Tuple[Tuple[int, float], ...]) -> Tuple[Tuple[int, float], ...]:
+    # Same arithmetic, in the same order, as calculate_damage, so float rounding lands on the same integers
+    base_damage = int((((2 * level / 5 + 2) * power * (attack / defense)) / 50 + burn * 2))
+    crit_chance = min(1.0, max(0.0, crit_ratio))
+    roll_chance = 1 / len(DAMAGE_ROLLS)
+    single: Dict[int, float] = {}
+    for crit_multiplier, chance in ((CRIT_MULTIPLIER, crit_chance), (1.0, 1.0 - crit_chance)):
+        if chance == 0:
+            continue
+        for roll in DAMAGE_ROLLS:
+            damage = int(base_damage * crit_multiplier * (roll / 100) * stab * type_effectiveness)
+            single[damage] = single.get(damage, 0.0) + chance * roll_chance
+
+    total: Dict[int, float] = {}
+    hits: Dict[int, float] = {0: 1.0}
+    done = 0
+    for count, weight in hit_counts:
+        while done < count:
+            hits = _convolve(hits, single)
+            done += 1
+        for damage, probability in hits.items():
+            total[damage] = total.get(damage, 0.0) + weight * probability
+    return tuple(sorted(total.items()))
+
+def _convolve(first: Dict[int, float], second: Dict[int, float]) -> Dict[int, float]:
+    result: Dict[int, float] = {}
+    for damage1, probability1 in first.items():
+        for damage2, probability2 in second.items():
+            damage = damage1 + damage2
+            result[damage] = result.get(damage, 0.0) + probability1 * probability2
+    return result
+
+def _calculated(attacker: Pokemon, defender: Pokemon, move: Move, crit_ratio: float,
+                hit_counts: Tuple[Tuple[int, float], ...]) -> Dict[int, float]:
+    if move.category == "Physical":
+        attack, defense = attacker.battle_stats['atk'], defender.battle_stats['def']
+    else:
+        attack, defense = attacker.battle_stats['sp_atk'], defender.battle_stats['sp_def']
+    burn = 0.5 if attacker.has_status('burn') and move.category == "Physical" else 1.0
+    stab = 1.5 if move.type_id in attacker.type_ids else 1.0
+    table = _damage_table(attacker.level, move.power if move.power is not None else 0, attack, defense, burn, stab,
+                          defender.defense_row[move.type_id], crit_ratio, hit_counts)
+    return dict(table)
+
+def _random_level(level: int, low: float, high: float) -> Dict[int, float]:
+    # handle_random_level_damage deals int(level * u) with u uniform in [low, high]
+    if high <= low:
+        return {int(level * low): 1.0}
+    result: Dict[int, float] = {}
+    for damage in range(math.floor(level * low), math.floor(level * high) + 1):
+        overlap = min(high, (damage + 1) / level) - max(low, damage / level)
+        if overlap > 0:
+            result[damage] = overlap / (high - low)
+    return result
+
+def _effect_distribution(attacker: Pokemon, defender: Pokemon, move: Move, handler: Callable[..., None],
+                         effect: Dict[str, str | int | float], hp: int) -> Dict[int, float] | None:
+    # hp is the defender's HP, which half HP and one-hit KO moves deal damage from
+    immune = defender.defense_row[move.type_id] == 0
+    if handler is handle_damage:
+        return _calculated(attacker, defender, move, 1/24, ((1, 1.0),))
+    if handler is handle_crit_ratio:
+        return _calculated(attacker, defender, move, effect['ratio'], ((1, 1.0),))
+    if handler is handle_multi_hit:
+        return _calculated(attacker, defender, move, 1/24, MULTI_HIT_COUNTS)
+    if handler is handle_double_hit:
+        return _calculated(attacker, defender, move, 1/24, ((2, 1.0),))
+    if handler is handle_level_damage:
+        return {0 if immune else attacker.level: 1.0}
+    if handler is handle_half_hp:
+        return {0 if immune else hp // 2: 1.0}
+    if handler is handle_random_level_damage:
+        return {0: 1.0} if immune else _random_level(attacker.level, effect['min'], effect['max'])
+    if handler is handle_counter:
+        countered = not immune and defender.last_move is not None and defender.last_move.category == 'Physical'
+        return {defender.last_damage * 2 if countered else 0: 1.0}
+    if handler is handle_faint and effect['target'] == 'opp':
+        probability = min(1.0, max(0.0, effect['probability']))
+        knock_out = max(0, hp)
+        return {knock_out: probability, 0: 1.0 - probability} if knock_out else {0: 1.0}
+    return None # the effect deals no damage to the defender
+
+def damage_distribution(attacker: Pokemon, defender: Pokemon, move: Move, hp: int | None = None) -> Dict[int, float]:
+    """
+    Returns the exact odds of every amount of damage the move deals when it hits, given the current state of
+    both Pokémon (stats, stages, burn, types, level), over crits, damage rolls and hit counts. Results of the
+    damage formula are cached by the numbers they depend on, so asking again for the same matchup is a lookup.
+
+    Args:
+        attacker (Pokemon): The Pokémon using the move.
+        defender (Pokemon): The Pokémon taking the hit.
+        move (Move): The move used.
+        hp (int | None, optional): HP the defender has left, which half HP and one-hit KO moves depend on, None
+            uses its current HP. Defaults to None.
+
+    Returns:
+        Dict[int, float]: The probability of each amount of damage, in increasing order of damage, summing to 1.
+    """
+    hp = defender.battle_stats['hp'] if hp is None else hp
+    program = move.program if move.program is not None else compile_move(move)
+    result: Dict[int, float] = {0: 1.0}
+    for handler, effect in program:
+        distribution = _effect_distribution(attacker, defender, move, handler, effect, hp)
+        if distribution is not None:
+            result = _convolve(result, distribution)
+    return dict(sorted((damage, probability) for damage, probability in result.items() if probability > 0))
+
+def hit_chance(attacker: Pokemon, defender: Pokemon, move: Move) -> float:
+    """
+    Returns the chance the move hits, as move_hit decides it.
+
+    Args:
+        attacker (Pokemon): The Pokémon using the move.
+        defender (Pokemon): The Pokémon it targets.
+        move (Move): The move used.
+
+    Returns:
+        float: The probability of a hit.
+    """
+    if move.accuracy is None:
+        return 1.0
+    combined_stage = max(-6, min(6, attacker.stat_stages['acc'] - defender.stat_stages['eva']))
+    threshold = float(move.accuracy) * ACCURACY_STAGE_MULTIPLIERS[combined_stage + 6]
+    # move_hit hits when randint(0, 100) <= threshold, 101 equally likely draws
+    return max(0, min(101, math.floor(threshold) + 1)) / 101
+
+def expected_damage(attacker: Pokemon, defender: Pokemon, move: Move, accuracy: bool = True) -> float:
+    """
+    Returns the average damage of the move.
+
+    Args:
+        attacker (Pokemon): The Pokémon using the move.
+        defender (Pokemon): The Pokémon taking the hit.
+        move (Move): The move used.
+        accuracy (bool, optional): Count misses as no damage, otherwise assume a hit. Defaults to True.
+
+    Returns:
+        float: The expected damage.
+    """
+    average = sum(damage * probability for damage, probability in damage_distribution(attacker, defender, move).items())
+    return average * hit_chance(attacker, defender, move) if accuracy else average
+
+def ko_probability(attacker: Pokemon, defender: Pokemon, move: Move, hp: int | None = None, accuracy: bool = True) -> float:
+    """
+    Returns the chance the move knocks the defender out.
+
+    Args:
+        attacker (Pokemon): The Pokémon using the move.
+        defender (Pokemon): The Pokémon taking the hit.
+        move (Move): The move used.
+        hp (int | None, optional): HP the defender has left, also for the damage of half HP and one-hit KO
+            moves, None uses its current HP. Defaults to None.
+        accuracy (bool, optional): Count the chance to miss, otherwise assume a hit. Defaults to True.
+
+    Returns:
+        float: The probability the damage reaches the defender's HP.
+    """
+    hp = defender.battle_stats['hp'] if hp is None else hp
+    knock_out = sum(probability for damage, probability in damage_distribution(attacker, defender, move, hp).items() if damage >= hp)
+    return min(1.0, knock_out) * hit_chance(attacker, defender, move) if accuracy else min(1.0, knock_out)
+
+def cache_info() -> Any:
+    """
+    Returns the hit and miss counts of the damage formula cache, as functools.lru_cache reports them.
+    """
+    return _damage_table.cache_info()
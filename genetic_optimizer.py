@@ -0,0 +1,266 @@
+# genetic_optimizer.py
+
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import MAX_TURNS, random_policy, simulate_battle
+from battle_context import derive_seed
+from team_battle import TEAM_SIZE, Action, Team, random_team_policy, simulate_team_battle
+from tournament import MOVES_PER_ENTRANT, Entrant
+
+# Searches movesets or teams with a genetic algorithm instead of trying every combination. The fitness of a
+# genome is its score (wins plus half the draws, per battle) against a fixed pool of opponents. Every genome is
+# played with the same battle seeds, so two genomes are compared on the same luck, and its result is cached, so
+# a genome that comes back in a later generation is never simulated again. A candidate is evaluated in stages
+# and dropped as soon as it clearly cannot reach the best fitness found so far.
+
+Genome = Tuple[str, ...]
+
+class MovesetSpace:
+    """
+    The movesets of one species: a genome is a sorted tuple of move names from its moves. Battles are 1v1
+    against opponent Pokémon.
+
+    Args:
+        species (Pokemon): The species whose moves are searched, e.g. from load_pokemon_list.
+        size (int, optional): Moves per moveset, fewer when the species does not know that many. Defaults to MOVES_PER_ENTRANT.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker of both sides, must be picklable. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+    """
+    def __init__(self, species: Pokemon, size: int = MOVES_PER_ENTRANT,
+                 policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, max_turns: int = MAX_TURNS):
+        self.species = species
+        self.moves: Dict[str, Move] = {move.name: move for move in species.moves}
+        if not self.moves:
+            raise ValueError(f"{species.name} has no moves")
+        self.size = min(size, len(self.moves))
+        self.policy = policy
+        self.max_turns = max_turns
+
+    def combinations(self) -> int:
+        return math.comb(len(self.moves), self.size)
+
+    def sample(self, rng: random.Random) -> Genome:
+        return tuple(sorted(rng.sample(sorted(self.moves), self.size)))
+
+    def mutate(self, genome: Genome, rng: random.Random) -> Genome:
+        # swaps one move for one the moveset does not have
+        others = [name for name in sorted(self.moves) if name not in genome]
+        if not others:
+            return genome
+        genes = list(genome)
+        genes[rng.randrange(len(genes))] = rng.choice(others)
+        return tuple(sorted(genes))
+
+    def crossover(self, parent1: Genome, parent2: Genome, rng: random.Random) -> Genome:
+        return tuple(sorted(rng.sample(sorted(set(parent1) | set(parent2)), self.size)))
+
+    def build(self, genome: Genome) -> Pokemon:
+        return Entrant(self.species, [self.moves[name] for name in genome]).pokemon
+
+    def battle(self, candidate: Pokemon, opponent: Pokemon, seed: int | None) -> int:
+        return simulate_battle(candidate, opponent, self.policy, self.max_turns, seed)[0]
+
+class TeamSpace:
+    """
+    Teams drawn from a roster: a genome is a tuple of distinct species names, the first one leading. Battles are
+    team battles against opponent teams.
+
+    Args:
+        roster (List[Pokemon]): The species to pick from, e.g. from load_pokemon_list.
+        size (int, optional): Pokémon per team. Defaults to TEAM_SIZE.
+        policy (Callable[[Team, Team, random.Random], Action], optional): Action picker of both sides, must be picklable. Defaults to random_team_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+    """
+    def __init__(self, roster: List[Pokemon], size: int = TEAM_SIZE,
+                 policy: Callable[[Team, Team, random.Random], Action] = random_team_policy, max_turns: int = MAX_TURNS):
+        self.roster: Dict[str, Pokemon] = {pokemon.name: pokemon for pokemon in roster if pokemon.moves}
+        if not 1 <= size <= min(TEAM_SIZE, len(self.roster)):
+            raise ValueError(f"Team size must be between 1 and {min(TEAM_SIZE, len(self.roster))}")
+        self.size = size
+        self.policy = policy
+        self.max_turns = max_turns
+
+    def combinations(self) -> int:
+        return math.perm(len(self.roster), self.size)
+
+    def sample(self, rng: random.Random) -> Genome:
+        return tuple(rng.sample(sorted(self.roster), self.size))
+
+    def mutate(self, genome: Genome, rng: random.Random) -> Genome:
+        # replaces a member, or changes the lead when every species is already on the team
+        genes = list(genome)
+        others = [name for name in sorted(self.roster) if name not in genome]
+        if others and (len(genes) == 1 or rng.random() < 0.75):
+            genes[rng.randrange(len(genes))] = rng.choice(others)
+        else:
+            i = rng.randrange(1, len(genes)) if len(genes) > 1 else 0
+            genes[0], genes[i] = genes[i], genes[0]
+        return tuple(genes)
+
+    def crossover(self, parent1: Genome, parent2: Genome, rng: random.Random) -> Genome:
+        # keeps the first parent's lead, the rest comes from both parents
+        rest = [name for name in dict.fromkeys(parent1[1:] + parent2) if name != parent1[0]]
+        return (parent1[0],) + tuple(rng.sample(rest, self.size - 1))
+
+    def build(self, genome: Genome) -> List[Pokemon]:
+        return [self.roster[name] for name in genome]
+
+    def battle(self, candidate: List[Pokemon], opponent: Sequence[Pokemon], seed: int | None) -> int:
+        return simulate_team_battle(candidate, opponent, self.policy, max_turns=self.max_turns, seed=seed)[0]
+
+# Search space and opponents shared by the worker processes, set once per worker by _init_worker
+_space: Any = None
+_opponents: List[Any] = []
+
+def _init_worker(space: Any, opponents: List[Any]) -> None:
+    global _space, _opponents
+    _space, _opponents = space, opponents
+
+def upper_bound(score: float, battles: int, z: float) -> float:
+    # Wilson score upper bound of the true score after `battles` battles
+    p = score / battles
+    denominator = 1 + z * z / battles
+    center = p + z * z / (2 * battles)
+    spread = z * math.sqrt(p * (1 - p) / battles + z * z / (4 * battles * battles))
+    return (center + spread) / denominator
+
+def _evaluate(genome: Genome, budget: int, stages: int, z: float, threshold: Optional[float],
+              seed: int | None) -> Tuple[float, int, bool]:
+    # plays up to `budget` battles against the opponents in turn, checking after every stage whether the genome
+    # can still reach `threshold`; returns its score, the battles played and whether it was cut short
+    candidate = _space.build(genome)
+    score = 0.0
+    played = 0
+    for stage in range(1, stages + 1):
+        checkpoint = budget * stage // stages
+        while played < checkpoint:
+            battle_seed = derive_seed(seed, played) if seed is not None else None
+            winner = _space.battle(candidate, _opponents[played % len(_opponents)], battle_seed)
+            score += 1.0 if winner == 1 else 0.5 if winner == 0 else 0.0
+            played += 1
+        if threshold is not None and played < budget and upper_bound(score, played, z) < threshold:
+            return score / played, played, True
+    return score / played, played, False
+
+def optimize(space: MovesetSpace | TeamSpace, opponents: List[Any], population_size: int = 24, generations: int = 20,
+             budget: int = 200, stages: int = 4, z: float = 2.0, elite: int = 2, mutation_rate: float = 0.3,
+             patience: int = 5, workers: int | None = None, seed: int | None = None,
+             on_generation: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Evolves genomes of `space` towards the best score against `opponents`.
+
+    Each generation keeps the `elite` best genomes and breeds the rest by tournament selection, crossover and
+    mutation. New genomes are evaluated on a process pool, over up to `budget` battles split into `stages`; after
+    each stage a genome whose Wilson upper bound (at `z` standard deviations) is below the best full evaluation so
+    far is dropped with the battles it has played. Results are cached per genome for the whole run.
+
+    Args:
+        space (MovesetSpace | TeamSpace): What is searched.
+        opponents (List[Any]): The reference pool, Pokémon for a MovesetSpace and teams (lists of Pokémon) for a TeamSpace.
+        population_size (int, optional): Genomes per generation. Defaults to 24.
+        generations (int, optional): The most generations to run. Defaults to 20.
+        budget (int, optional): Battles of a full evaluation, spread evenly over the opponents. Defaults to 200.
+        stages (int, optional): Checks for an early stop during an evaluation, 1 never stops early. Defaults to 4.
+        z (float, optional): How clear a bad candidate must be to be dropped, higher drops fewer. Defaults to 2.0.
+        elite (int, optional): Best genomes carried over to the next generation unchanged. Defaults to 2.
+        mutation_rate (float, optional): Chance a child is mutated. Defaults to 0.3.
+        patience (int, optional): Stops after this many generations without a better genome. Defaults to 5.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        seed (int | None, optional): Seeds the search and the battles. Defaults to None.
+        on_generation (Optional[Callable[[Dict[str, Any]], None]], optional): Called with every generation's entry of the history. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: 'best' (the best genome), 'fitness' (its score), 'evaluations' (genomes simulated),
+            'pruned' (of which dropped early), 'cache_hits', 'battles' (simulated in total), 'generations' and
+            'history' (per generation: best and mean fitness, evaluations).
+
+    Raises:
+        ValueError: If there are no opponents or a setting is out of range.
+    """
+    if not opponents:
+        raise ValueError("At least one opponent is needed")
+    if population_size < 2 or generations < 1 or budget < 1 or not 1 <= stages <= budget or not 0 <= elite < population_size:
+        raise ValueError("Invalid optimizer settings")
+    rng = random.Random(seed)
+    battle_seed = rng.getrandbits(64) if seed is not None else None
+    # population_size distinct genomes at most, the space may hold fewer
+    population_size = min(population_size, space.combinations())
+
+    cache: Dict[Genome, Tuple[float, int, bool]] = {}
+    stats = {'evaluations': 0, 'pruned': 0, 'cache_hits': 0, 'battles': 0}
+    best: Optional[Genome] = None
+    history: List[Dict[str, Any]] = []
+
+    def evaluate(genomes: List[Genome], executor: Optional[ProcessPoolExecutor]) -> None:
+        new = [genome for genome in dict.fromkeys(genomes) if genome not in cache]
+        stats['cache_hits'] += len(genomes) - len(new)
+        threshold = cache[best][0] if best is not None else None
+        args = (budget, stages, z, threshold, battle_seed)
+        if executor is None:
+            results = [_evaluate(genome, *args) for genome in new]
+        else:
+            results = [future.result() for future in [executor.submit(_evaluate, genome, *args) for genome in new]]
+        for genome, result in zip(new, results):
+            cache[genome] = result
+            stats['evaluations'] += 1
+            stats['pruned'] += result[2]
+            stats['battles'] += result[1]
+
+    def fitness(genome: Genome) -> float:
+        return cache[genome][0]
+
+    def select(population: List[Genome]) -> Genome:
+        return max(rng.sample(population, min(3, len(population))), key=fitness)
+
+    def run(executor: Optional[ProcessPoolExecutor]) -> int:
+        nonlocal best
+        population: List[Genome] = []
+        while len(population) < population_size:
+            genome = space.sample(rng)
+            if genome not in population:
+                population.append(genome)
+        stale = 0
+        for generation in range(1, generations + 1):
+            evaluate(population, executor)
+            # only complete evaluations can become the best, a pruned score rests on too few battles
+            complete = [genome for genome in population if not cache[genome][2]]
+            leader = max(complete, key=fitness, default=None)
+            if leader is not None and (best is None or fitness(leader) > fitness(best)):
+                best, stale = leader, 0
+            else:
+                stale += 1
+            entry = {'generation': generation, 'best_fitness': fitness(best) if best is not None else None,
+                     'mean_fitness': sum(map(fitness, population)) / len(population), 'evaluations': stats['evaluations']}
+            history.append(entry)
+            if on_generation is not None:
+                on_generation(entry)
+            if stale >= patience or generation == generations or len(cache) >= space.combinations():
+                return generation
+
+            ranked = sorted(population, key=fitness, reverse=True)
+            children = ranked[:elite]
+            for _ in range(population_size * 10):
+                if len(children) >= population_size:
+                    break
+                child = space.crossover(select(population), select(population), rng)
+                if rng.random() < mutation_rate:
+                    child = space.mutate(child, rng)
+                if child not in children:
+                    children.append(child)
+            population = children
+        return generations
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        _init_worker(space, opponents)
+        generations_run = run(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(space, opponents)) as executor:
+            generations_run = run(executor)
+
+    # the first generation is never cut short, so there always is a best
+    return {'best': best, 'fitness': cache[best][0], **stats, 'generations': generations_run, 'history': history}
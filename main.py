@@ -1,8 +1,9 @@
 # main.property
 
-import copy
+import argparse
 from pokemon_loader import load_pokemon_list
 from battle_engine import execute_turn
+from battle_ai import ExpectiminimaxAI
 
 def list_pokemon(pokemons):
     print("Available Pokémon:")
@@ -10,7 +11,7 @@ def list_pokemon(pokemons):
         print(f"{i}. {pokemon.name}")
     choice = int(input("Choose a Pokémon by number: ")) - 1
     print()
-    return copy.deepcopy(pokemons[choice])
+    return pokemons[choice].clone()
 
 def list_moves(pokemon):
     print(f"Available moves for {pokemon.name}:")
@@ -20,13 +21,25 @@ def list_moves(pokemon):
     print()
     return pokemon.moves[choice]
 
-def main():
-    pokemons = load_pokemon_list(---pokemon.xlsx location---)
+def choose_controller(pokemon):
+    answer = input(f"Let the AI play {pokemon.name}? (y/n): ").strip().lower()
+    print()
+    return ExpectiminimaxAI() if answer == 'y' else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a battle in the terminal.")
+    parser.add_argument('--data', default='pokemon.xlsx', help="the workbook to load the Pokémon from")
+    args = parser.parse_args(argv)
+    pokemons = load_pokemon_list(args.data)
 
     # List and choose Pokémon
     pokemon1 = list_pokemon(pokemons)
     pokemon2 = list_pokemon(pokemons)
 
+    # Either side can be played by the AI instead of prompting for its moves
+    ai1 = choose_controller(pokemon1)
+    ai2 = choose_controller(pokemon2)
+
     print(f"Battle between {pokemon1.name} and {pokemon2.name} begins!\n")
 
     turn_count = 0
@@ -36,8 +49,8 @@ def main():
             break
         
         # List and choose moves
-        pokemon1.selected_move = list_moves(pokemon1)
-        pokemon2.selected_move = list_moves(pokemon2)
+        pokemon1.selected_move = ai1.choose(pokemon1, pokemon2) if ai1 else list_moves(pokemon1)
+        pokemon2.selected_move = ai2.choose(pokemon2, pokemon1) if ai2 else list_moves(pokemon2)
         
         log, turn_count = execute_turn(pokemon1, pokemon2, turn_count)
         print(log)
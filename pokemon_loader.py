@@ -1,35 +1,39 @@
 # pokemon_loader.py
 
 from pokemon_models import Pokemon, Move
-from typing import List, Dict
-import pandas as pd
+from battle_engine import compile_move
+from typing import Any, List, Dict, Optional, Tuple
+import hashlib
 import json
+import os
+import pickle
+import random
 
-def load_pokemon_data(file_path: str) -> List[Pokemon]:
+# Bump whenever the layout of the cached rows changes, older cache files are then rebuilt
+CACHE_VERSION = 1
+
+def _read_species_rows(file_path: str) -> List[Dict[str, Any]]:
+    import pandas as pd # only needed when the workbook is parsed, a warm cache never imports it
     df = pd.read_excel(file_path, sheet_name='Pokemon')
-    pokemon_list = []
+    rows: List[Dict[str, Any]] = []
     for _, row in df.iterrows():
-        moves_list = row['Moves'].split(', ')
-        types = [t.strip() for t in row['Type'].split(',')] # Properly split the type for dual type Pokemon
-        pokemon = Pokemon(
-            name=row['Name'],
-            types=types,
-            hp=row['HP'],
-            attack=row['Attack'],
-            defense=row['Defense'],
-            special_attack=row['Sp. Atk'],
-            special_defense=row['Sp. Def'],
-            speed=row['Speed'],
-            moves_list=moves_list,
-            level=90
-        )
-        pokemon_list.append(pokemon)
-    return pokemon_list
+        rows.append({
+            'name': str(row['Name']),
+            'types': [t.strip() for t in row['Type'].split(',')], # Properly split the type for dual type Pokemon
+            'hp': int(row['HP']),
+            'attack': int(row['Attack']),
+            'defense': int(row['Defense']),
+            'special_attack': int(row['Sp. Atk']),
+            'special_defense': int(row['Sp. Def']),
+            'speed': int(row['Speed']),
+            'moves_list': row['Moves'].split(', '),
+        })
+    return rows
 
-def load_move_data(file_path: str) -> Dict[str, Move]:
+def _read_move_rows(file_path: str) -> List[Dict[str, Any]]:
+    import pandas as pd
     df = pd.read_excel(file_path, sheet_name='Move')
-    move_dict: Dict[str, Move] = {}
-    
+    rows: List[Dict[str, Any]] = []
     for _, row in df.iterrows():
         effect_string = row['Effect']
         try:
@@ -37,27 +41,114 @@ def load_move_data(file_path: str) -> Dict[str, Move]:
         except json.JSONDecodeError:
             effect = effect_string  # If it fails to parse, keep the original string
             print('JSONDecodeError: failed to parse effect string for move:', row['Name'])
-        
-        move = Move(
-            name=row['Name'],
-            type=row['Type'],
-            category=row['Category'],
-            power=row['Power'] if pd.notna(row['Power']) and row['Power'] != '—' else None,
-            accuracy=row['Accuracy'] if pd.notna(row['Accuracy']) and row['Accuracy'] != '—' else None,
-            pp=row['PP'],
-            effect=effect
-        )
+
+        rows.append({
+            'name': str(row['Name']),
+            'type': str(row['Type']),
+            'category': str(row['Category']),
+            'power': int(row['Power']) if pd.notna(row['Power']) and row['Power'] != '—' else None,
+            'accuracy': int(row['Accuracy']) if pd.notna(row['Accuracy']) and row['Accuracy'] != '—' else None,
+            'pp': int(row['PP']),
+            'effect': effect,
+        })
+    return rows
+
+def dataset_hash(file_path: str) -> str:
+    """
+    Hashes the contents of a workbook, so anything derived from it can tell when it changed.
+
+    Args:
+        file_path (str): The pokemon.xlsx workbook.
+
+    Returns:
+        str: The SHA-256 of the file, as hex.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_dataset(file_path: str, cache_path: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Loads the parsed species and move rows of a workbook, from a compiled cache file when it is up to date.
+
+    The cache is trusted as is while the workbook keeps its size and modification time. When those change the
+    workbook is hashed, and only parsed again (and the cache rewritten) when its contents changed too.
+
+    Args:
+        file_path (str): The pokemon.xlsx workbook.
+        cache_path (Optional[str], optional): The cache file, next to the workbook when None. Defaults to None.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: The species rows (Pokemon arguments) and the move rows (Move arguments).
+    """
+    cache_path = cache_path or file_path + '.cache'
+    stat = os.stat(file_path)
+    cached: Optional[Dict[str, Any]] = None
+    try:
+        with open(cache_path, 'rb') as file:
+            cached = pickle.load(file)
+        if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+            cached = None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        cached = None
+
+    if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+        return cached['species'], cached['moves']
+
+    sha256 = dataset_hash(file_path)
+    if cached is None or cached['sha256'] != sha256:
+        cached = {
+            'version': CACHE_VERSION, 'sha256': sha256,
+            'species': _read_species_rows(file_path), 'moves': _read_move_rows(file_path),
+        }
+    cached['size'] = stat.st_size
+    cached['mtime'] = stat.st_mtime_ns
+
+    # written to a temporary file first, so a killed process or a concurrent worker never sees half a cache
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # a read-only data directory only costs the parse on every start
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return cached['species'], cached['moves']
+
+def _build_pokemon(rows: List[Dict[str, Any]], seed: int | None) -> List[Pokemon]:
+    rng = random.Random(seed) if seed is not None else None # IVs and EVs are rolled from the seed when one is given
+    return [Pokemon(**row, level=90, rng=rng) for row in rows]
+
+def _build_moves(rows: List[Dict[str, Any]]) -> Dict[str, Move]:
+    move_dict: Dict[str, Move] = {}
+    for row in rows:
+        move = Move(**row)
+        compile_move(move)
         move_dict[move.name] = move
-    
     return move_dict
 
+def load_pokemon_data(file_path: str, seed: int | None = None, cache: bool = True) -> List[Pokemon]:
+    rows = load_dataset(file_path)[0] if cache else _read_species_rows(file_path)
+    return _build_pokemon(rows, seed)
+
+def load_move_data(file_path: str, cache: bool = True) -> Dict[str, Move]:
+    rows = load_dataset(file_path)[1] if cache else _read_move_rows(file_path)
+    return _build_moves(rows)
+
 def link_pokemon_moves(pokemon_list: List[Pokemon], move_dict: Dict[str, Move]):
     for pokemon in pokemon_list:
         moves = [move_dict.get(move_name, None) for move_name in pokemon.moves_list]
         pokemon.moves = [move for move in moves if move is not None]
 
-def load_pokemon_list(file_path: str) -> List[Pokemon]:
-    pokemon_list = load_pokemon_data(file_path)
-    move_dict = load_move_data(file_path)
-    link_pokemon_moves(pokemon_list, move_dict)
-    return pokemon_list
\ No newline at end of file
+def load_pokemon_list(file_path: str, seed: int | None = None, cache: bool = True) -> List[Pokemon]:
+    # the dataset is loaded (or its cache checked) once for both the species and the moves
+    if cache:
+        species_rows, move_rows = load_dataset(file_path)
+    else:
+        species_rows, move_rows = _read_species_rows(file_path), _read_move_rows(file_path)
+    pokemon_list = _build_pokemon(species_rows, seed)
+    link_pokemon_moves(pokemon_list, _build_moves(move_rows))
+    return pokemon_list
@@ -1,19 +1,33 @@
 # pokemon_models.py
 
 import random
-from typing import List, Dict, Optional, Union
+from types import MappingProxyType
+from typing import Any, Callable, List, Dict, Mapping, Optional, Tuple, Union
+from type_chart import type_id, defensive_row
 
 class Move:
     def __init__(self, name: str = "", type: str = "", category: str = "", power: Optional[int] = None, 
                  accuracy: Optional[int] = None, pp: int = 0, effect: Optional[List[Dict[str, int | str | float]]] = None):
         self._name = name
         self._type = type
+        self._type_id: Optional[int] = type_id(type) if type else None
         self._category = category
         self._power = power
         self._accuracy = accuracy
         self._pp = pp
         self._effect = effect if effect is not None else []
 
+        # Scalars the engine reads every turn, cached from the effect list
+        self._priority: int = 0
+        self._crit_ratio: float = 1/24
+        self._miss_recoil: bool = False
+        if isinstance(self._effect, list):
+            self._priority = int(self.find_related_value('effect', 'priority', 'amount') or 0)
+            self._crit_ratio = float(self.find_related_value('effect', 'crit_ratio', 'ratio') or 1/24)
+            self._miss_recoil = self.has_effect('miss_recoil')
+        # (handler, parameters) pairs built by battle_engine.compile_move, None until compiled
+        self._program: Optional[Tuple[Tuple[Callable[..., None], Dict[str, Any]], ...]] = None
+
     @property
     def name(self) -> str:
         return self._name
@@ -32,8 +46,13 @@ class Move:
     def type(self, value: str) -> None:
         if not value:
             raise ValueError("Type cannot be empty")
+        self._type_id = type_id(value)
         self._type = value
 
+    @property
+    def type_id(self) -> Optional[int]:
+        return self._type_id
+
     @property
     def category(self) -> str:
         return self._category
@@ -77,6 +96,28 @@ class Move:
     @property
     def effect(self) -> List[Dict[str, int | str | float]]:
         return self._effect
+
+    @property
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def crit_ratio(self) -> float:
+        return self._crit_ratio
+
+    @property
+    def miss_recoil(self) -> bool:
+        return self._miss_recoil
+
+    @property
+    def program(self) -> Optional[Tuple[Tuple[Callable[..., None], Dict[str, Any]], ...]]:
+        return self._program
+
+    @program.setter
+    def program(self, value: Tuple[Tuple[Callable[..., None], Dict[str, Any]], ...]) -> None:
+        if not isinstance(value, tuple):
+            raise ValueError("Program must be a tuple")
+        self._program = value
     
     def has_effect(self, effect_name: str) -> bool:
         """
@@ -111,86 +152,391 @@ class Move:
         return (f"Move(name='{self._name}', type='{self._type}', category='{self._category}', "
                 f"power={self._power}, accuracy={self._accuracy}, pp={self._pp}, effect={self._effect})")
 
-class Pokemon:
-    def __init__(self, name: str, types: List[str], hp: int, attack: int, defense: int,
-                 special_attack: int, special_defense: int, speed: int, moves_list: List[str], level: int):
-        # Basic Information
+STATS: List[str] = ['hp', 'atk', 'def', 'sp_atk', 'sp_def', 'spd']
+STAGE_STATS: List[str] = ['atk', 'def', 'sp_atk', 'sp_def', 'spd', 'eva', 'acc']
+MULTIPLIER_STATS: List[str] = ['atk', 'def', 'sp_atk', 'sp_def', 'spd']
+
+# Multiplier of a battle stat for each stage from -6 to +6, index with stage + 6
+STAT_STAGE_MULTIPLIERS: Tuple[float, ...] = (2/8, 2/7, 2/6, 2/5, 2/4, 2/3, 2/2, 3/2, 4/2, 5/2, 6/2, 7/2, 8/2)
+
+# Every status has a fixed slot: a Pokémon keeps one duration per slot and a bitmask of the statuses it has,
+# plus the order they were applied in, which is the order the engine resolves them in.
+FLINCH, SLEEP, RECHARGE, CONFUSE, PARALYZE, FREEZE, BADLY_POISON, BURN, POISON, SEED, TRAP = range(11)
+STATUS_NAMES: Tuple[str, ...] = ('flinch', 'sleep', 'recharge', 'confuse', 'paralyze', 'freeze',
+                                 'badly_poison', 'burn', 'poison', 'seed', 'trap')
+STATUS_IDS: Dict[str, int] = {name: status_id for status_id, name in enumerate(STATUS_NAMES)}
+NON_VOLATILE_MASK: int = (1 << PARALYZE) | (1 << SLEEP) | (1 << FREEZE) | (1 << BADLY_POISON) | (1 << BURN) | (1 << POISON)
+
+def _status_id(status_type: str) -> int:
+    status_id = STATUS_IDS.get(status_type)
+    if status_id is None:
+        raise ValueError(f"Invalid status: {status_type}")
+    return status_id
+
+class Species:
+    """
+    The part of a Pokémon that never changes during a battle: name, types, level, stats and moves. A species is
+    read-only and shared by every battle instance built from it (see Pokemon.from_species and Pokemon.clone), so
+    spinning up a battle never copies moves, effect lists or type data.
+
+    Args:
+        name (str): The name of the species.
+        types (List[str]): Its types.
+        base_stats (Dict[str, int]): Base stats, keyed like STATS.
+        moves_list (List[str]): Names of its moves.
+        level (int): Its level.
+        max_stats (Optional[Dict[str, int]], optional): Its stats, rolled from random IVs and EVs when None. Defaults to None.
+        moves (Optional[List[Move]], optional): Its linked moves. Defaults to None.
+        rng (Optional[random.Random], optional): Generator for the IVs and EVs, None uses the random module. Defaults to None.
+    """
+    __slots__ = ('_name', '_type', '_type_ids', '_defense_row', '_level', '_moves_list', '_moves', '_base_stats', '_max_stats',
+                 '_fingerprint')
+
+    def __init__(self, name: str, types: List[str], base_stats: Dict[str, int], moves_list: List[str], level: int,
+                 max_stats: Optional[Dict[str, int]] = None, moves: Optional[List[Move]] = None,
+                 rng: Optional[random.Random] = None):
         self._name = name
         self._type = types
+        self._type_ids: List[int] = [type_id(t) for t in types]
+        self._defense_row: List[float] = defensive_row(self._type_ids) # effectiveness of every attacking type against this Pokémon
         self._level = level
         self._moves_list = moves_list
+        self._moves: List[Move] = moves if moves is not None else []
+        self._base_stats = base_stats
+        self._max_stats: Dict[str, int] = max_stats if max_stats is not None else self._calculate_stats(rng)
+        self._fingerprint: Optional[Tuple[Any, ...]] = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def type(self) -> List[str]:
+        return self._type
+
+    @property
+    def type_ids(self) -> List[int]:
+        return self._type_ids
+
+    @property
+    def defense_row(self) -> List[float]:
+        return self._defense_row
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @property
+    def moves_list(self) -> List[str]:
+        return self._moves_list
+
+    @property
+    def moves(self) -> List[Move]:
+        return self._moves
+
+    @property
+    def base_stats(self) -> Dict[str, int]:
+        return self._base_stats
+
+    @property
+    def max_stats(self) -> Dict[str, int]:
+        return self._max_stats
+
+    @property
+    def fingerprint(self) -> Tuple[Any, ...]:
+        # everything of the species a battle depends on besides its name: level, stats and moves. Built once,
+        # the species being read-only
+        if self._fingerprint is None:
+            self._fingerprint = (self._level, tuple(sorted(self._max_stats.items())), tuple(move.name for move in self._moves))
+        return self._fingerprint
+
+    def replace(self, **changes: Any) -> 'Species':
+        """
+        Returns a copy of the species with some fields changed, the species itself is never modified.
+
+        Args:
+            **changes: New values for any of name, types, base_stats, moves_list, level, max_stats and moves.
+
+        Returns:
+            Species: The changed copy. The stats are kept unless max_stats is given.
+        """
+        fields: Dict[str, Any] = {
+            'name': self._name, 'types': self._type, 'base_stats': self._base_stats, 'moves_list': self._moves_list,
+            'level': self._level, 'max_stats': self._max_stats, 'moves': self._moves,
+        }
+        for key in changes:
+            if key not in fields:
+                raise ValueError(f"Invalid species field: {key}")
+        fields.update(changes)
+        return Species(**fields)
+
+    def _calculate_stats(self, rng: Optional[random.Random] = None) -> Dict[str, int]:
+        """
+        Calculates the Pokémon's stats based on base stats, IVs, and EVs.
+
+        Args:
+            rng (Optional[random.Random], optional): Generator for the IVs and EVs, None uses the random module. Defaults to None.
+
+        Returns:
+            Dict[str, int]: A dictionary containing the calculated stats.
+        """
+        evs = self._generate_random_evs(rng)
+        ivs = self._generate_random_ivs(rng)
+        stats: Dict[str, int] = {}
+        for stat, base in self._base_stats.items():
+            if stat == 'hp':
+                stats[stat] = self._calculate_hp(base, ivs[stat], evs[stat])
+            else:
+                stats[stat] = self._calculate_other_stat(base, ivs[stat], evs[stat])
+        return stats
+
+    def _calculate_hp(self, base: int, iv: int, ev: int) -> int:
+        """
+        Calculates the HP stat.
+
+        Args:
+            base (int): Base HP stat.
+            iv (int): Individual Value for HP.
+            ev (int): Effort Value for HP.
+
+        Returns:
+            int: The calculated HP stat.
+        """
+        return ((2 * base + iv + ev // 4) * self._level) // 100 + self._level + 10
+
+    def _calculate_other_stat(self, base: int, iv: int, ev: int) -> int:
+        """
+        Calculates stats other than HP.
+
+        Args:
+            base (int): Base stat value.
+            iv (int): Individual Value for the stat.
+            ev (int): Effort Value for the stat.
+
+        Returns:
+            int: The calculated stat value.
+        """
+        return int((((2 * base + iv + ev // 4) * self._level) // 100 + 5) * 1.0)
+
+    @staticmethod
+    def _generate_random_evs(rng: Optional[random.Random] = None) -> Dict[str, int]:
+        """
+        Generate the random maximum Effort Values (EVs) for all stats, adhering to modern Pokémon rules where the total EVs cannot exceed 510, with a maximum of 255 for each stat.
+
+        Args:
+            rng (Optional[random.Random], optional): Generator to draw from, None uses the random module. Defaults to None.
+
+        Returns:
+            Dict[str, int]: A dictionary containing randomly generated EVs for each stat.
+        """
+        generator: Any = rng if rng is not None else random # the random module has the same functions as random.Random
+        evs: Dict[str, int] = {stat: 0 for stat in STATS}
+        ev_total: int = 510
+        while ev_total > 0:
+            stat: str = generator.choice(list(evs.keys()))
+            increment: int = min(generator.randint(0, 255), ev_total)
+            evs[stat] += increment
+            ev_total -= increment
+        return evs
+
+    @staticmethod
+    def _generate_random_ivs(rng: Optional[random.Random] = None) -> Dict[str, int]:
+        """
+        Generates random Individual Values (IVs) for all stats.
+
+        Args:
+            rng (Optional[random.Random], optional): Generator to draw from, None uses the random module. Defaults to None.
+
+        Returns:
+            Dict[str, int]: A dictionary containing randomly generated IVs for each stat.
+        """
+        generator: Any = rng if rng is not None else random
+        return {stat: generator.randint(0, 31) for stat in STATS}
+
+    def __str__(self) -> str:
+        return f"Species(name='{self._name}', type={self._type}, level={self._level})"
+
+class Pokemon:
+    """
+    A Pokémon in battle: a shared, read-only Species plus the state that changes while it fights (HP, stat stages
+    and multipliers, statuses, picked and last move, last damage taken). Setting a species field such as the name
+    or the moves swaps in a changed copy of the species, so other Pokémon built from it are never affected.
+    """
+    __slots__ = ('_species', '_selected_move', '_last_move', '_stat_stages', '_stat_multipliers', '_battle_stats',
+                 '_status_durations', '_status_mask', '_status_order', '_last_damage', '_can_move')
+
+    def __init__(self, name: str, types: List[str], hp: int, attack: int, defense: int,
+                 special_attack: int, special_defense: int, speed: int, moves_list: List[str], level: int,
+                 rng: Optional[random.Random] = None):
+        base_stats: Dict[str, int] = {
+            'hp': hp, 'atk': attack, 'def': defense,
+            'sp_atk': special_attack, 'sp_def': special_defense, 'spd': speed
+        }
+        self._init_state(Species(name, types, base_stats, moves_list, level, rng=rng))
+
+    @classmethod
+    def from_species(cls, species: Species) -> 'Pokemon':
+        """
+        Builds a fresh battle instance of a species, at full HP and without stages or statuses.
+
+        Args:
+            species (Species): The species, shared rather than copied.
+
+        Returns:
+            Pokemon: The new Pokémon.
+        """
+        pokemon = cls.__new__(cls)
+        pokemon._init_state(species)
+        return pokemon
+
+    def _init_state(self, species: Species) -> None:
+        self._species = species
 
         # Moves
-        self._moves: List[Move] = []
         self._selected_move: Optional[Move] = None
         self._last_move: Optional[Move] = None
 
         # Stats
-        self._stat_stages: Dict[str, int] = {stat: 0 for stat in ['atk', 'def', 'sp_atk', 'sp_def', 'spd', 'eva', 'acc']}
-        self._stat_multipliers: Dict[str, float] = {stat: 1 for stat in ['atk', 'def', 'sp_atk', 'sp_def', 'spd']} # this handle multiplier for status that gives multiplier effect on stat, but not necessarily affect stat stages
-        self._base_stats: Dict[str, int] = {
-            'hp': hp, 'atk': attack, 'def': defense,
-            'sp_atk': special_attack, 'sp_def': special_defense, 'spd': speed
-        }
-        self._max_stats = self._calculate_stats()
+        self._stat_stages: Dict[str, int] = {stat: 0 for stat in STAGE_STATS}
+        self._stat_multipliers: Dict[str, float] = {stat: 1 for stat in MULTIPLIER_STATS} # this handle multiplier for status that gives multiplier effect on stat, but not necessarily affect stat stages
         self._battle_stats = self._calculate_battle_stats(True)
 
         # Battle-related
-        self._statuses: Dict[str, int] = {}
+        self._status_durations: List[int] = [0] * len(STATUS_NAMES)
+        self._status_mask: int = 0 # bit n is set while the Pokémon has status n, even once its duration ran out
+        self._status_order: Tuple[int, ...] = () # the ids of the set bits, in the order the statuses were applied
         self._last_damage: int = 0
         self._can_move: bool = True
 
+    def clone(self) -> 'Pokemon':
+        """
+        Copies the battle state of the Pokémon, sharing its species. This is what battles start from.
+
+        Returns:
+            Pokemon: An independent Pokémon in the same state.
+        """
+        pokemon = Pokemon.__new__(Pokemon)
+        pokemon._species = self._species
+        pokemon._selected_move = self._selected_move
+        pokemon._last_move = self._last_move
+        pokemon._stat_stages = self._stat_stages.copy()
+        pokemon._stat_multipliers = self._stat_multipliers.copy()
+        pokemon._battle_stats = self._battle_stats.copy()
+        pokemon._status_durations = self._status_durations.copy()
+        pokemon._status_mask = self._status_mask
+        pokemon._status_order = self._status_order
+        pokemon._last_damage = self._last_damage
+        pokemon._can_move = self._can_move
+        return pokemon
+
+    def snapshot(self) -> Tuple[Any, ...]:
+        """
+        Captures the battle state so restore can rewind the Pokémon to it. Unlike clone this keeps working on the
+        same object, which is what a search that plays and undoes thousands of turns needs.
+
+        Returns:
+            Tuple[Any, ...]: The state, to be passed back to restore as is. It can be restored any number of times.
+        """
+        return (self._species, self._selected_move, self._last_move, tuple(self._stat_stages.values()),
+                tuple(self._stat_multipliers.values()), tuple(self._battle_stats.values()), tuple(self._status_durations),
+                self._status_mask, self._status_order, self._last_damage, self._can_move)
+
+    def restore(self, state: Tuple[Any, ...]) -> None:
+        """
+        Rewinds the Pokémon to a state taken by snapshot, in place.
+
+        Args:
+            state (Tuple[Any, ...]): The state returned by snapshot.
+        """
+        (self._species, self._selected_move, self._last_move, stages, multipliers, stats, durations,
+         self._status_mask, self._status_order, self._last_damage, self._can_move) = state
+        # the dicts and the duration list are updated in place, the engine may hold references to them
+        self._stat_stages.update(zip(STAGE_STATS, stages))
+        self._stat_multipliers.update(zip(MULTIPLIER_STATS, multipliers))
+        self._battle_stats.update(zip(STATS, stats))
+        self._status_durations[:] = durations
+
+    def state_key(self) -> Tuple[Any, ...]:
+        """
+        Returns a hashable key of everything that can affect how the rest of the battle plays out, e.g. to
+        cache search results. The species is identified by its name and fingerprint (level, stats and moves), so
+        two rolls of the same species never share a key; stats other than HP follow from the stages and
+        multipliers and are left out.
+
+        Returns:
+            Tuple[Any, ...]: The key. Two Pokémon with equal keys behave identically.
+        """
+        return (self._species.name, self._species.fingerprint, self._battle_stats['hp'], tuple(self._stat_stages.values()),
+                tuple(self._stat_multipliers.values()), tuple(self._status_durations), self._status_order,
+                self._last_damage, self._last_move.name if self._last_move is not None else None)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'Pokemon':
+        # the species is read-only, so a deep copy only needs its own battle state
+        return self.clone()
+
+    @property
+    def species(self) -> Species:
+        return self._species
+
     # Basic Information
     @property
     def name(self) -> str:
-        return self._name
+        return self._species.name
     
     @name.setter
     def name(self, value: str) -> None:
         if not value:
             raise ValueError("Name cannot be empty")
-        self._name = value
+        self._species = self._species.replace(name=value)
     
     @property
     def level(self) -> int:
-        return self._level
+        return self._species.level
     
     @level.setter
     def level(self, value: int) -> None:
         if value <= 0:
             raise ValueError("Level must be positive")
-        self._level = value
+        self._species = self._species.replace(level=value)
     
     @property
     def type(self) -> List[str]:
-        return self._type
+        return self._species.type
     
     @type.setter
     def type(self, value: List[str]) -> None:
         if not value:
             raise ValueError("Type list cannot be empty")
-        self._type = value
+        self._species = self._species.replace(types=value)
+
+    @property
+    def type_ids(self) -> List[int]:
+        return self._species.type_ids
+
+    @property
+    def defense_row(self) -> List[float]:
+        return self._species.defense_row
 
     @property
     def moves_list(self) -> List[str]:
-        return self._moves_list
+        return self._species.moves_list
 
     @moves_list.setter
     def moves_list(self, value: List[str]) -> None:
         if not value:
             raise ValueError("Moves list cannot be empty")
-        self._moves_list = value
+        self._species = self._species.replace(moves_list=value)
 
     # Moves
     @property
     def moves(self) -> List[Move]:
-        return self._moves
+        return self._species.moves
     
     @moves.setter
     def moves(self, value: List[Move]) -> None:
         if not all(isinstance(move, Move) for move in value):
             raise ValueError("Invalid move in moves list")
-        self._moves = value
+        self._species = self._species.replace(moves=value)
 
     @property
     def selected_move(self) -> Optional[Move]:
@@ -215,11 +561,11 @@ class Pokemon:
     # Stats
     @property
     def base_stats(self) -> Dict[str, int]:
-        return self._base_stats
+        return self._species.base_stats
 
     @property
     def max_stats(self) -> Dict[str, int]:
-        return self._max_stats
+        return self._species.max_stats
 
     @property
     def battle_stats(self) -> Dict[str, int]:
@@ -242,7 +588,9 @@ class Pokemon:
         required_keys = {'atk', 'def', 'sp_atk', 'sp_def', 'spd', 'eva', 'acc'}
         if not all(key in self._stat_stages for key in required_keys):
             raise ValueError("Stat stages must include all required stats")
-        self.battle_stats = self._calculate_battle_stats()
+        for stat in value:
+            if stat in self._stat_multipliers:
+                self._recalculate_stat(stat)
     
     @property
     def stat_multipliers(self) -> Dict[str, float]:
@@ -254,12 +602,15 @@ class Pokemon:
         required_keys = {'atk', 'def', 'sp_atk', 'sp_def', 'spd'}
         if not all(key in self._stat_multipliers for key in required_keys):
             raise ValueError("Stat stages must include all required stats")
-        self.battle_stats = self._calculate_battle_stats()
+        for stat in value:
+            self._recalculate_stat(stat)
 
     # Battle-related
     @property
-    def statuses(self) -> Dict[str, int]:
-        return self._statuses
+    def statuses(self) -> Mapping[str, int]:
+        # A read-only snapshot built from the slots in the order the statuses were applied, so writing to it fails
+        # instead of being lost: change statuses through apply_status and friends, or assign a whole dict
+        return MappingProxyType({STATUS_NAMES[status_id]: self._status_durations[status_id] for status_id in self._status_order})
 
     @statuses.setter
     def statuses(self, value: Dict[str, int]) -> None:
@@ -267,7 +618,28 @@ class Pokemon:
             raise ValueError("Statuses must be a dictionary")
         if not all(isinstance(k, str) and isinstance(v, int) for k, v in value.items()):
             raise ValueError("Status keys must be strings and values must be integers")
-        self._statuses = value
+        status_ids = [_status_id(status_type) for status_type in value]
+        self._status_durations = [0] * len(STATUS_NAMES)
+        self._status_mask = 0
+        self._status_order = ()
+        for status_id, duration in zip(status_ids, value.values()):
+            self._status_durations[status_id] = duration
+            if not self._status_mask >> status_id & 1:
+                self._status_order += (status_id,)
+            self._status_mask |= 1 << status_id
+
+    @property
+    def status_mask(self) -> int:
+        return self._status_mask
+
+    @property
+    def status_durations(self) -> List[int]:
+        return self._status_durations
+
+    @property
+    def status_order(self) -> Tuple[int, ...]:
+        # ids of the statuses present, in the order they were applied, which is the order the engine resolves them in
+        return self._status_order
 
     @property
     def last_damage(self) -> int:
@@ -303,9 +675,10 @@ class Pokemon:
         """
         if stat not in self._stat_stages:
             raise ValueError(f"Invalid stat stage: {stat}")
-        self._stat_stages[stat] += stage_change
-        self._stat_stages[stat] = max(-6, min(self._stat_stages[stat], 6))
-        self.battle_stats = self._calculate_battle_stats()
+        self._stat_stages[stat] = max(-6, min(self._stat_stages[stat] + stage_change, 6))
+        # accuracy and evasion stages have no battle stat, move_hit reads them directly
+        if stat in self._stat_multipliers:
+            self._recalculate_stat(stat)
 
     def reset_stat_stages(self) -> None:
         """
@@ -313,7 +686,8 @@ class Pokemon:
         """
         for stat in self._stat_stages:
             self._stat_stages[stat] = 0
-        self.battle_stats = self._calculate_battle_stats()
+        for stat in self._stat_multipliers:
+            self._recalculate_stat(stat)
         
     def update_stat_multiplier(self, stat: str, factor: float) -> None:
         """
@@ -331,7 +705,7 @@ class Pokemon:
         if factor not in [0.5, 2.0]:
             raise ValueError("Factor must be either 0.5 or 2.0")
         self._stat_multipliers[stat] *= factor
-        self.battle_stats = self._calculate_battle_stats()
+        self._recalculate_stat(stat)
 
     def reset_stat_multiplier(self, stat: str) -> None:
         """
@@ -346,24 +720,27 @@ class Pokemon:
         if stat not in self._stat_multipliers:
             raise ValueError(f"Invalid stat: {stat}")
         self._stat_multipliers[stat] = 1
-        self.battle_stats = self._calculate_battle_stats()
+        self._recalculate_stat(stat)
 
-    def _calculate_stats(self) -> Dict[str, int]:
+    def override_stats(self, stats: Dict[str, int]) -> None:
         """
-        Calculates the Pokémon's stats based on base stats, IVs, and EVs.
+        Replaces the rolled stats, e.g. to rebuild the exact Pokémon a replay was recorded with, and restores full HP.
 
-        Returns:
-            Dict[str, int]: A dictionary containing the calculated stats.
+        Args:
+            stats (Dict[str, int]): The new max stats, with the same keys as max_stats.
+
+        Raises:
+            ValueError: If a stat is missing.
         """
-        evs = self._generate_random_evs()
-        ivs = self._generate_random_ivs()
-        stats: Dict[str, int] = {}
-        for stat, base in self._base_stats.items():
-            if stat == 'hp':
-                stats[stat] = self._calculate_hp(base, ivs[stat], evs[stat])
-            else:
-                stats[stat] = self._calculate_other_stat(base, ivs[stat], evs[stat])
-        return stats
+        if not all(key in stats for key in STATS):
+            raise ValueError("Stats must include all required stats")
+        self._species = self._species.replace(max_stats={stat: int(stats[stat]) for stat in STATS})
+        self.battle_stats = self._calculate_battle_stats(True)
+
+    def _recalculate_stat(self, stat: str) -> None:
+        # Only the stat whose stage or multiplier changed is recomputed, in place
+        self._battle_stats[stat] = int(self._species.max_stats[stat] * STAT_STAGE_MULTIPLIERS[self._stat_stages[stat] + 6]
+                                       * self._stat_multipliers[stat])
 
     def _calculate_battle_stats(self, initialize: bool = False) -> Dict[str, int]:
         """
@@ -375,7 +752,6 @@ class Pokemon:
         Returns:
             Dict[str, int]: A dictionary containing the calculated battle stats.
         """
-        stat_stage_multiplier: List[float] = [2/8, 2/7, 2/6, 2/5, 2/4, 2/3, 2/2, 3/2, 4/2, 5/2, 6/2, 7/2, 8/2]
         stats: Dict[str, int] = {}
         for stat, base in self.max_stats.items():
             if stat == 'hp':
@@ -384,64 +760,9 @@ class Pokemon:
                 else:
                     stats[stat] = self.battle_stats[stat]
             else:
-                stats[stat] = int(base * stat_stage_multiplier[self.stat_stages[stat] + 6] * self.stat_multipliers[stat])
+                stats[stat] = int(base * STAT_STAGE_MULTIPLIERS[self.stat_stages[stat] + 6] * self.stat_multipliers[stat])
         return stats
 
-    def _calculate_hp(self, base: int, iv: int, ev: int) -> int:
-        """
-        Calculates the HP stat.
-
-        Args:
-            base (int): Base HP stat.
-            iv (int): Individual Value for HP.
-            ev (int): Effort Value for HP.
-
-        Returns:
-            int: The calculated HP stat.
-        """
-        return ((2 * base + iv + ev // 4) * self._level) // 100 + self._level + 10
-
-    def _calculate_other_stat(self, base: int, iv: int, ev: int) -> int:
-        """
-        Calculates stats other than HP.
-
-        Args:
-            base (int): Base stat value.
-            iv (int): Individual Value for the stat.
-            ev (int): Effort Value for the stat.
-
-        Returns:
-            int: The calculated stat value.
-        """
-        return int((((2 * base + iv + ev // 4) * self._level) // 100 + 5) * 1.0)
-
-    @staticmethod
-    def _generate_random_evs() -> Dict[str, int]:
-        """
-        Generate the random maximum Effort Values (EVs) for all stats, adhering to modern Pokémon rules where the total EVs cannot exceed 510, with a maximum of 255 for each stat.
-
-        Returns:
-            Dict[str, int]: A dictionary containing randomly generated EVs for each stat.
-        """
-        evs: Dict[str, int] = {stat: 0 for stat in ['hp', 'atk', 'def', 'sp_atk', 'sp_def', 'spd']}
-        ev_total: int = 510
-        while ev_total > 0:
-            stat: str = random.choice(list(evs.keys()))
-            increment: int = min(random.randint(0, 255), ev_total)
-            evs[stat] += increment
-            ev_total -= increment
-        return evs
-
-    @staticmethod
-    def _generate_random_ivs() -> Dict[str, int]:
-        """
-        Generates random Individual Values (IVs) for all stats.
-
-        Returns:
-            Dict[str, int]: A dictionary containing randomly generated IVs for each stat.
-        """
-        return {stat: random.randint(0, 31) for stat in ['hp', 'atk', 'def', 'sp_atk', 'sp_def', 'spd']}
-
     # Status
     def apply_status(self, status_type: str, duration: int) -> None:
         """
@@ -456,7 +777,12 @@ class Pokemon:
         """
         if not isinstance(status_type, str) or not isinstance(duration, int):
             raise ValueError("Invalid status type or duration")
-        self._statuses[status_type] = duration
+        status_id = _status_id(status_type)
+        self._status_durations[status_id] = duration
+        if not self._status_mask >> status_id & 1:
+            # a status applied again keeps its place
+            self._status_order += (status_id,)
+            self._status_mask |= 1 << status_id
    
     def has_status(self, status_type: str) -> bool:
         """
@@ -468,7 +794,8 @@ class Pokemon:
         Returns:
             bool: True if the Pokémon has the specified status, False otherwise.
         """
-        return status_type in self._statuses
+        status_id = STATUS_IDS.get(status_type)
+        return status_id is not None and bool(self._status_mask >> status_id & 1)
    
     def has_non_volatile_status(self) -> bool:
         """
@@ -484,8 +811,7 @@ class Pokemon:
         Returns:
             bool: True if the Pokémon has any non-volatile status condition, False otherwise.
         """
-        non_volatile_status = ['paralyze', 'sleep', 'freeze', 'badly_poison', 'burn', 'poison']
-        return any(status in self.statuses for status in non_volatile_status)
+        return self._status_mask & NON_VOLATILE_MASK != 0
    
     def get_status_duration(self, status_type: str) -> int:
         """
@@ -497,7 +823,10 @@ class Pokemon:
         Returns:
             int: The remaining duration of the status, or 0 if the status is not present.
         """
-        return self._statuses.get(status_type, 0)
+        status_id = STATUS_IDS.get(status_type)
+        if status_id is None or not self._status_mask >> status_id & 1:
+            return 0
+        return self._status_durations[status_id]
    
     def add_status_duration(self, status_type: str, addition_amount: int = 1) -> None:
         """
@@ -507,8 +836,9 @@ class Pokemon:
             status_type (str): The status type to modify.
             addition_amount (int, optional): The amount to increase the duration by. Defaults to 1.
         """
-        if status_type in self._statuses:
-            self._statuses[status_type] += addition_amount
+        status_id = STATUS_IDS.get(status_type)
+        if status_id is not None and self._status_mask >> status_id & 1:
+            self._status_durations[status_id] += addition_amount
 
     def deduct_status_duration(self, status_type: str, deduction_amount: int = 1) -> None:
         """
@@ -518,14 +848,28 @@ class Pokemon:
             status_type (str): The status type to modify.
             deduction_amount (int, optional): The amount to decrease the duration by. Defaults to 1.
         """
-        if status_type in self._statuses:
-            self._statuses[status_type] -= deduction_amount
+        status_id = STATUS_IDS.get(status_type)
+        if status_id is not None and self._status_mask >> status_id & 1:
+            self._status_durations[status_id] -= deduction_amount
 
     def remove_expired_statuses(self) -> None:
         """
         Removes all status conditions with a duration of 0 or less.
         """
-        self._statuses = {status: duration for status, duration in self._statuses.items() if duration > 0}
+        mask = mask_before = self._status_mask
+        while mask:
+            low_bit = mask & -mask
+            status_id = low_bit.bit_length() - 1
+            if self._status_durations[status_id] <= 0:
+                self._status_mask &= ~low_bit
+                self._status_durations[status_id] = 0
+            mask ^= low_bit
+        if self._status_mask != mask_before:
+            self._drop_cleared_statuses()
+
+    def _drop_cleared_statuses(self) -> None:
+        # keeps the application order in step with the mask after bits were cleared
+        self._status_order = tuple(status_id for status_id in self._status_order if self._status_mask >> status_id & 1)
 
     def remove_status(self, status_type: str) -> None:
         """
@@ -534,9 +878,29 @@ class Pokemon:
         Args:
             status_type (str): The status type to remove.
         """
-        if status_type in self._statuses:
-            del self._statuses[status_type]
+        status_id = STATUS_IDS.get(status_type)
+        if status_id is not None and self._status_mask >> status_id & 1:
+            self._status_mask &= ~(1 << status_id)
+            self._status_durations[status_id] = 0
+            self._drop_cleared_statuses()
+
+    def switch_out(self) -> None:
+        """
+        Clears what does not stay with a Pokémon leaving the field: its stat stages, its volatile statuses
+        (flinch, recharge, confusion, seed and trap) and its last move and damage. Non-volatile statuses and
+        the stat multipliers they set are kept.
+        """
+        for status_id in range(len(STATUS_NAMES)):
+            if not NON_VOLATILE_MASK >> status_id & 1:
+                self._status_durations[status_id] = 0
+        self._status_mask &= NON_VOLATILE_MASK
+        self._drop_cleared_statuses()
+        self._selected_move = None
+        self._last_move = None
+        self._last_damage = 0
+        self._can_move = True
+        self.reset_stat_stages()
 
     def __str__(self) -> str:
-        return f"Pokemon(name='{self._name}', type={self._type}, level={self._level})"
+        return f"Pokemon(name='{self.name}', type={self.type}, level={self.level})"
 
@@ -0,0 +1,314 @@
+# replay.py
+
+import argparse
+import random
+import struct
+import sys
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from pokemon_models import Pokemon, Move
+from pokemon_loader import load_pokemon_list
+from battle_engine import MAX_TURNS, execute_turn, random_policy, simulate_battle
+from battle_context import BattleContext, derive_seed
+from battle_events import EventSink, TextSink
+
+# A replay is everything needed to play a battle again: the seed, both Pokémon and the move picked by each side
+# every turn. The engine's draws only depend on the seed and the picks, so execute_turn reproduces the battle exactly.
+#
+# Layout, little endian. Replays are self-delimiting and can be appended to the same file one after the other.
+#   header      MAGIC, version (u8), seed (u64), then per side: name length (u8), name (utf-8), max stats (6 x u16)
+#   turn        move index of side 1 (u8), move index of side 2 (u8)
+#   checkpoint  CHECKPOINT, crc32 of the generator state (u32), hp of both sides (2 x u16)
+#   end         END, winner (u8), turns (u32), hp of both sides (2 x u16)
+MAGIC = b'PKRP'
+VERSION = 1
+CHECKPOINT = 0xFE
+END = 0xFF
+NO_MOVE_INDEX = 0xFD # the Pokémon had no move to pick
+
+STATS = ['hp', 'atk', 'def', 'sp_atk', 'sp_def', 'spd']
+
+_HEADER = struct.Struct('<4sBQ')
+_SIDE_STATS = struct.Struct('<6H')
+_CHECKPOINT = struct.Struct('<IHH')
+_END = struct.Struct('<BIHH')
+
+def _rng_crc(ctx: BattleContext) -> int:
+    return zlib.crc32(repr(ctx.rng.getstate()).encode())
+
+def _move_index(pokemon: Pokemon) -> int:
+    if pokemon.selected_move is None:
+        return NO_MOVE_INDEX
+    return pokemon.moves.index(pokemon.selected_move)
+
+class ReplayWriter:
+    """
+    Writes battles to a binary file as they are played, two bytes per turn. Pass it to simulate_battle as `recorder`.
+
+    Args:
+        file (BinaryIO): The file to write to, replays are appended after whatever it already holds.
+        checkpoint_every (int, optional): Also store a fingerprint of the generator state and both HPs every this
+            many turns, so a replay that stops matching the engine is caught near the turn it diverged.
+            0 stores none. Defaults to 0.
+    """
+    def __init__(self, file: BinaryIO, checkpoint_every: int = 0):
+        if checkpoint_every < 0:
+            raise ValueError("Checkpoint interval cannot be negative")
+        self.file = file
+        self.checkpoint_every = checkpoint_every
+        self._ctx: Optional[BattleContext] = None
+        self._turns = 0
+
+    def begin(self, seed: int, pokemon1: Pokemon, pokemon2: Pokemon, ctx: BattleContext) -> None:
+        if not 0 <= seed < 2 ** 64:
+            raise ValueError("Replay seeds must fit in 64 bits")
+        parts = [_HEADER.pack(MAGIC, VERSION, seed)]
+        for pokemon in (pokemon1, pokemon2):
+            name = pokemon.name.encode()
+            parts.append(bytes([len(name)]) + name)
+            parts.append(_SIDE_STATS.pack(*(pokemon.max_stats[stat] for stat in STATS)))
+        self.file.write(b''.join(parts))
+        self._ctx = ctx
+        self._turns = 0
+
+    def turn(self, pokemon1: Pokemon, pokemon2: Pokemon) -> None:
+        # the checkpoint of turn n is taken before its moves run, i.e. after n turns were played
+        if self.checkpoint_every and self._turns and self._turns % self.checkpoint_every == 0:
+            self.file.write(bytes([CHECKPOINT]) + _CHECKPOINT.pack(
+                _rng_crc(self._ctx), pokemon1.battle_stats['hp'], pokemon2.battle_stats['hp']))
+        self.file.write(bytes([_move_index(pokemon1), _move_index(pokemon2)]))
+        self._turns += 1
+
+    def end(self, winner: int, turns: int, pokemon1: Pokemon, pokemon2: Pokemon) -> None:
+        self.file.write(bytes([END]) + _END.pack(
+            winner, turns, max(0, pokemon1.battle_stats['hp']), max(0, pokemon2.battle_stats['hp'])))
+        self._ctx = None
+
+class Replay:
+    """
+    A battle read back from a replay file.
+
+    Attributes:
+        seed (int): The seed of the battle.
+        names (Tuple[str, str]): The species of both sides.
+        stats (Tuple[Dict[str, int], Dict[str, int]]): The max stats of both sides.
+        moves (List[Tuple[int, int]]): The move index picked by each side, for every turn.
+        checkpoints (Dict[int, Tuple[int, int, int]]): Turns played -> (generator crc, hp 1, hp 2).
+        result (Optional[Tuple[int, int, int, int]]): (winner, turns, hp 1, hp 2), None if the replay was cut short.
+    """
+    def __init__(self, seed: int, names: Tuple[str, str], stats: Tuple[Dict[str, int], Dict[str, int]]):
+        self.seed = seed
+        self.names = names
+        self.stats = stats
+        self.moves: List[Tuple[int, int]] = []
+        self.checkpoints: Dict[int, Tuple[int, int, int]] = {}
+        self.result: Optional[Tuple[int, int, int, int]] = None
+
+def _read_exact(file: BinaryIO, size: int) -> Optional[bytes]:
+    data = file.read(size)
+    return data if len(data) == size else None
+
+def read_replays(file: BinaryIO) -> Iterator[Replay]:
+    """
+    Reads the replays of a file one at a time, so files with millions of battles can be scanned in constant memory.
+
+    Args:
+        file (BinaryIO): The file to read.
+
+    Returns:
+        Iterator[Replay]: The replays in file order. A replay cut short by a killed run comes last, with result None.
+
+    Raises:
+        ValueError: If the file is not a replay file or was written by a newer version.
+    """
+    while True:
+        header = _read_exact(file, _HEADER.size)
+        if header is None:
+            return
+        magic, version, seed = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Not a replay file")
+        if version > VERSION:
+            raise ValueError(f"Unsupported replay version: {version}")
+
+        names: List[str] = []
+        stats: List[Dict[str, int]] = []
+        for _ in range(2):
+            length = _read_exact(file, 1)
+            name = _read_exact(file, length[0]) if length is not None else None
+            values = _read_exact(file, _SIDE_STATS.size) if name is not None else None
+            if values is None:
+                return
+            names.append(name.decode())
+            stats.append(dict(zip(STATS, _SIDE_STATS.unpack(values))))
+        replay = Replay(seed, (names[0], names[1]), (stats[0], stats[1]))
+
+        while True:
+            tag = _read_exact(file, 1)
+            if tag is None:
+                yield replay
+                return
+            if tag[0] == END:
+                record = _read_exact(file, _END.size)
+                if record is None:
+                    yield replay
+                    return
+                replay.result = _END.unpack(record)
+                break
+            if tag[0] == CHECKPOINT:
+                record = _read_exact(file, _CHECKPOINT.size)
+                if record is None:
+                    yield replay
+                    return
+                replay.checkpoints[len(replay.moves)] = _CHECKPOINT.unpack(record)
+                continue
+            second = _read_exact(file, 1)
+            if second is None:
+                yield replay
+                return
+            replay.moves.append((tag[0], second[0]))
+        yield replay
+
+def _replay_pokemon(species: Pokemon, stats: Dict[str, int]) -> Pokemon:
+    pokemon = species.clone()
+    pokemon.override_stats(stats)
+    return pokemon
+
+def _pick(pokemon: Pokemon, index: int) -> None:
+    if index == NO_MOVE_INDEX:
+        pokemon.selected_move = None
+    elif index >= len(pokemon.moves):
+        raise ValueError(f"{pokemon.name} has no move {index}, the replay does not match the data")
+    else:
+        pokemon.selected_move = pokemon.moves[index]
+
+def play_replay(replay: Replay, roster: Dict[str, Pokemon], sink: EventSink | None = None) -> Tuple[int, int, int, int]:
+    """
+    Plays a replay again through execute_turn and checks it against the checkpoints and the recorded result.
+
+    Args:
+        replay (Replay): The replay to play.
+        roster (Dict[str, Pokemon]): Species by name, as loaded from the workbook the battle was recorded with.
+        sink (EventSink | None, optional): Receives the events of the battle, e.g. a TextSink to render it. Defaults to None.
+
+    Returns:
+        Tuple[int, int, int, int]: The winner (1 or 2, 0 for a draw), the turns played and the final HP of both sides.
+
+    Raises:
+        ValueError: If a species is missing from the roster or the battle does not play out as recorded.
+    """
+    for name in replay.names:
+        if name not in roster:
+            raise ValueError(f"Unknown species in replay: {name}")
+    pokemon1 = _replay_pokemon(roster[replay.names[0]], replay.stats[0])
+    pokemon2 = _replay_pokemon(roster[replay.names[1]], replay.stats[1])
+    ctx = BattleContext(replay.seed, sink)
+    turn_count = 0
+
+    for index1, index2 in replay.moves:
+        checkpoint = replay.checkpoints.get(turn_count)
+        if checkpoint is not None and checkpoint != (_rng_crc(ctx), pokemon1.battle_stats['hp'], pokemon2.battle_stats['hp']):
+            raise ValueError(f"Replay diverged before turn {turn_count + 1}")
+        _pick(pokemon1, index1)
+        _pick(pokemon2, index2)
+        _, turn_count = execute_turn(pokemon1, pokemon2, turn_count, ctx)
+
+    hp1 = max(0, pokemon1.battle_stats['hp'])
+    hp2 = max(0, pokemon2.battle_stats['hp'])
+    winner = 0
+    if hp1 > 0 and hp2 <= 0:
+        winner = 1
+    elif hp2 > 0 and hp1 <= 0:
+        winner = 2
+    result = (winner, turn_count, hp1, hp2)
+    if replay.result is not None and result != replay.result:
+        raise ValueError(f"Replay ended with {result}, recorded {replay.result}")
+    return result
+
+def render_replay(replay: Replay, roster: Dict[str, Pokemon]) -> str:
+    """
+    Renders a replay as the usual text log.
+
+    Args:
+        replay (Replay): The replay to render.
+        roster (Dict[str, Pokemon]): Species by name (see play_replay).
+
+    Returns:
+        str: The text log of the whole battle.
+    """
+    sink = TextSink()
+    play_replay(replay, roster, sink)
+    return sink.text()
+
+def record_matchup(species_a: Pokemon, species_b: Pokemon, n_battles: int, file: BinaryIO, seed: int,
+                   policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, max_turns: int = MAX_TURNS,
+                   checkpoint_every: int = 0) -> None:
+    """
+    Plays and records n battles of a matchup. Battle i uses the seed derive_seed(seed, i), the same battles
+    simulate_matchup plays with that seed.
+
+    Args:
+        species_a (Pokemon): The first Pokémon.
+        species_b (Pokemon): The second Pokémon.
+        n_battles (int): The number of battles to record.
+        file (BinaryIO): The file to append the replays to.
+        seed (int): Seed of the whole matchup.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker (see simulate_battle). Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        checkpoint_every (int, optional): Checkpoint interval in turns (see ReplayWriter). Defaults to 0.
+    """
+    writer = ReplayWriter(file, checkpoint_every)
+    for index in range(n_battles):
+        simulate_battle(species_a, species_b, policy, max_turns, derive_seed(seed, index), writer)
+
+def verify_replays(file: BinaryIO, roster: Dict[str, Pokemon]) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Plays every replay of a file again without rendering anything.
+
+    Args:
+        file (BinaryIO): The replay file.
+        roster (Dict[str, Pokemon]): Species by name (see play_replay).
+
+    Returns:
+        Tuple[int, List[Tuple[int, str]]]: The number of replays checked and the (index, reason) of those that failed.
+    """
+    checked = 0
+    failures: List[Tuple[int, str]] = []
+    for index, replay in enumerate(read_replays(file)):
+        checked += 1
+        if replay.result is None:
+            failures.append((index, "replay was cut short"))
+            continue
+        try:
+            play_replay(replay, roster)
+        except ValueError as e:
+            failures.append((index, str(e)))
+    return checked, failures
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or render recorded battles.")
+    parser.add_argument('command', choices=['verify', 'show'])
+    parser.add_argument('replays', help="the replay file")
+    parser.add_argument('index', nargs='?', type=int, default=0, help="replay to render with show (default: 0)")
+    parser.add_argument('--data', default='pokemon.xlsx', help="the workbook the battles were recorded with")
+    args = parser.parse_args(argv)
+
+    roster = {pokemon.name: pokemon for pokemon in load_pokemon_list(args.data)}
+    with open(args.replays, 'rb') as file:
+        if args.command == 'verify':
+            checked, failures = verify_replays(file, roster)
+            for index, reason in failures:
+                print(f"replay {index}: {reason}")
+            print(f"{checked - len(failures)}/{checked} replays verified")
+            return 1 if failures else 0
+
+        for index, replay in enumerate(read_replays(file)):
+            if index == args.index:
+                print(f"Battle between {replay.names[0]} and {replay.names[1]} (seed {replay.seed})\n")
+                print(render_replay(replay, roster))
+                return 0
+    print(f"No replay {args.index} in {args.replays}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+# result_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import battle_context
+import battle_engine
+import pokemon_models
+import type_chart
+from pokemon_models import Pokemon, Move
+from pokemon_loader import dataset_hash
+from battle_engine import MAX_TURNS, random_policy, simulate_matchup, summarize_counts
+
+# Keeps the battle counts of matchups in a SQLite file, so a matchup that was simulated before is not simulated
+# again: a run asking for more battles than are stored only plays the missing ones and adds them to the stored
+# counts. Results are tied to the workbook's hash and to a hash of the engine's sources, and rows of another
+# workbook or engine are dropped when the cache is opened. Keys also hold a hash of the sources of the policy's
+# module and the modules it uses, so changing an AI does not bring back the win rates of the old one. The least recently used rows are evicted when the
+# stored rows outgrow the size limit.
+
+DEFAULT_MAX_BYTES = 64 << 20
+_ROW_OVERHEAD = 64 # rough bytes per row besides its key, for the size limit
+
+# The modules that decide how a battle plays out, any change to their sources invalidates stored results
+ENGINE_MODULES: Tuple[ModuleType, ...] = (battle_engine, pokemon_models, battle_context, type_chart)
+
+# Bump whenever the table layout changes, older tables are then dropped
+_SCHEMA_VERSION = 2
+_COUNTS = ('battles', 'wins_a', 'wins_b', 'draws', 'turns')
+
+# reserved is the battle index the next top-up starts at: battles below it are stored or being played
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    battles INTEGER NOT NULL,
+    reserved INTEGER NOT NULL,
+    wins_a INTEGER NOT NULL,
+    wins_b INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+def engine_hash() -> str:
+    """
+    Hashes the sources of ENGINE_MODULES, so results of an engine that plays battles differently are never
+    mixed with these, without anyone having to remember to bump a version number.
+
+    Returns:
+        str: The SHA-256 of the sources, as hex.
+    """
+    digest = hashlib.sha256()
+    for module in ENGINE_MODULES:
+        with open(module.__file__, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def _repo_module(name: Optional[str]) -> Optional[ModuleType]:
+    # the module, when it is one of this repository's own (they all live next to this file)
+    module = sys.modules.get(name) if name else None
+    file = getattr(module, '__file__', None)
+    if file is None or os.path.dirname(os.path.abspath(file)) != os.path.dirname(os.path.abspath(__file__)):
+        return None
+    return module
+
+def policy_modules(policy: Callable[..., Any]) -> List[ModuleType]:
+    """
+    The repository modules a policy's results depend on besides ENGINE_MODULES: the module it is defined in and
+    every repository module that one uses, found through its globals (imported modules, functions and classes),
+    e.g. battle_ai and battle_state for ExpectiminimaxAI.
+
+    Args:
+        policy (Callable[..., Any]): The move picker, a function or a policy object.
+
+    Returns:
+        List[ModuleType]: The modules, by name.
+    """
+    name = policy.__module__ if hasattr(policy, '__qualname__') else type(policy).__module__
+    seen: List[ModuleType] = []
+    pending = [_repo_module(name)]
+    while pending:
+        module = pending.pop()
+        if module is None or module in seen:
+            continue
+        seen.append(module)
+        for value in vars(module).values():
+            pending.append(_repo_module(value.__name__ if isinstance(value, ModuleType) else getattr(value, '__module__', None)))
+    return sorted((module for module in seen if module not in ENGINE_MODULES), key=lambda module: module.__name__)
+
+@lru_cache(maxsize=None)
+def _sources_hash(files: Tuple[str, ...]) -> str:
+    digest = hashlib.sha256()
+    for path in files:
+        with open(path, 'rb') as file:
+            digest.update(os.path.basename(path).encode() + b'\0' + file.read())
+    return digest.hexdigest()
+
+def policy_hash(policy: Callable[..., Any]) -> str:
+    """
+    Hashes the sources of policy_modules, so results of a policy whose code changed are not reused. The
+    engine's own modules are left to engine_hash.
+
+    Args:
+        policy (Callable[..., Any]): The move picker, a function or a policy object.
+
+    Returns:
+        str: The SHA-256 of the sources, as hex.
+    """
+    return _sources_hash(tuple(module.__file__ for module in policy_modules(policy)))
+
+def side_key(pokemon: Pokemon) -> Dict[str, Any]:
+    # everything of a side that decides the outcome of its battles
+    return {'name': pokemon.name, 'level': pokemon.level, 'stats': [pokemon.max_stats[stat] for stat in sorted(pokemon.max_stats)],
+            'moves': sorted(move.name for move in pokemon.moves)}
+
+def policy_key(policy: Callable[..., Any]) -> str:
+    # module-level functions are told apart by name, policy objects by their class
+    name = getattr(policy, '__qualname__', None) or type(policy).__qualname__
+    return f"{policy.__module__}.{name}"
+
+class ResultCache:
+    """
+    A persistent cache of matchup results, in a SQLite file shared by any number of runs.
+
+    Args:
+        path (str): The database file, created when missing.
+        file_path (str): The pokemon.xlsx workbook the Pokémon are loaded from, its hash is part of every key.
+        max_bytes (int, optional): Size the stored rows may take before the least recently used ones are
+            evicted. Defaults to DEFAULT_MAX_BYTES.
+        engine_version (Optional[str], optional): Version of the engine the results come from, None hashes the
+            engine's sources (see engine_hash). Defaults to None.
+    """
+    def __init__(self, path: str, file_path: str, max_bytes: int = DEFAULT_MAX_BYTES, engine_version: Optional[str] = None):
+        if max_bytes < 0:
+            raise ValueError("Size limit cannot be negative")
+        self.path = path
+        self.dataset = dataset_hash(file_path)
+        self.engine_version = engine_version if engine_version is not None else engine_hash()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # transactions are opened explicitly, so a top-up can hold the write lock from its read to its reservation
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        with self._transaction():
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                self._db.execute("DROP TABLE IF EXISTS results")
+                self._db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            for statement in filter(str.strip, _SCHEMA.split(';')):
+                self._db.execute(statement)
+            # results of another workbook or engine can never be asked for again
+            self._db.execute("DELETE FROM results WHERE dataset != ? OR engine != ?", (self.dataset, self.engine_version))
+            # a smaller size limit than the last run's applies right away
+            self._evict()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the write lock right away, so nothing another run writes can slip in between what
+        # the transaction reads and what it writes
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> 'ResultCache':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def key(self, species_a: Pokemon, species_b: Pokemon, policy: Callable[[Pokemon, Pokemon, Any], Move] = random_policy,
+            max_turns: int = MAX_TURNS, seed: int | None = None, policy_name: Optional[str] = None) -> str:
+        """
+        Builds the key of a matchup: both sides (species, level, stats and moves), the policy and the hash of its
+        sources (see policy_hash), the turn cap and the seed, plus the workbook's hash and the engine version.
+
+        Args:
+            species_a (Pokemon): The first Pokémon.
+            species_b (Pokemon): The second Pokémon.
+            policy (Callable[[Pokemon, Pokemon, Any], Move], optional): The move picker. Defaults to random_policy.
+            max_turns (int, optional): The turn cap. Defaults to MAX_TURNS.
+            seed (int | None, optional): The seed of the matchup, unseeded results are stored apart. Defaults to None.
+            policy_name (Optional[str], optional): Names the policy instead of its module and name, for policies
+                whose settings change their moves. Defaults to None.
+
+        Returns:
+            str: The key, as JSON.
+        """
+        return json.dumps([self.dataset, self.engine_version, side_key(species_a), side_key(species_b),
+                           policy_name or policy_key(policy), policy_hash(policy), max_turns, seed], separators=(',', ':'))
+
+    def _read(self, key: str) -> Optional[Tuple[int, ...]]:
+        # called inside a transaction: the stored counts and reservation of a matchup, marked as recently used
+        row = self._db.execute("SELECT battles, wins_a, wins_b, draws, turns, reserved FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return row
+
+    def get(self, key: str) -> Optional[Dict[str, int]]:
+        """
+        Looks a matchup up and marks it as recently used.
+
+        Args:
+            key (str): The matchup's key (see key).
+
+        Returns:
+            Optional[Dict[str, int]]: The stored 'battles', 'wins_a', 'wins_b', 'draws' and 'turns' counts, None when the matchup is not stored.
+        """
+        with self._transaction():
+            row = self._read(key)
+        return dict(zip(_COUNTS, row)) if row is not None else None
+
+    def add(self, key: str, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Adds battle counts to a matchup's stored counts, storing it when it is new, then evicts rows over the
+        size limit.
+
+        Args:
+            key (str): The matchup's key (see key).
+            counts (Dict[str, int]): 'battles', 'wins_a', 'wins_b', 'draws' and 'turns' counts of new battles.
+
+        Returns:
+            Dict[str, int]: The stored counts after the addition.
+        """
+        values = tuple(counts[name] for name in _COUNTS)
+        with self._transaction():
+            self._db.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "battles = battles + excluded.battles, reserved = MAX(reserved, battles + excluded.battles), "
+                "wins_a = wins_a + excluded.wins_a, wins_b = wins_b + excluded.wins_b, draws = draws + excluded.draws, "
+                "turns = turns + excluded.turns, last_used = excluded.last_used",
+                (key, self.dataset, self.engine_version, values[0], values[0], *values[1:], len(key) + _ROW_OVERHEAD, time.time()))
+            row = self._db.execute("SELECT battles, wins_a, wins_b, draws, turns FROM results WHERE key = ?", (key,)).fetchone()
+            self._evict()
+        return dict(zip(_COUNTS, row))
+
+    def _evict(self) -> None:
+        # called inside a transaction: drops the least recently used rows until the rest fits the size limit
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM results WHERE key = ?", victims)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Stored 'entries' and their 'bytes', plus the 'hits' and 'misses' of this cache object.
+        """
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {'entries': entries, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self) -> None:
+        with self._transaction():
+            self._db.execute("DELETE FROM results")
+
+    def matchup(self, species_a: Pokemon, species_b: Pokemon, n_battles: int, workers: int | None = None,
+                policy: Callable[[Pokemon, Pokemon, Any], Move] = random_policy, max_turns: int = MAX_TURNS,
+                seed: int | None = None, policy_name: Optional[str] = None) -> Dict[str, float]:
+        """
+        simulate_matchup through the cache: only the battles the stored result is missing are simulated. With a
+        seed the stored battles are battles 0 to n-1 of simulate_matchup's numbering and the top-up plays the
+        next ones, so the result is the same as simulating all `n_battles` at once.
+
+        The missing battles are reserved in the same transaction that reads the stored result, so runs topping
+        up the same matchup at the same time each play their own range of battles and never count one twice.
+        Battles another run has reserved but not stored yet are not part of the returned summary. A run that is
+        killed while playing leaves its range reserved, and later top-ups go on after it.
+
+        Args:
+            species_a (Pokemon): The first Pokémon.
+            species_b (Pokemon): The second Pokémon.
+            n_battles (int): The number of battles wanted, a stored result with more is returned as is.
+            workers (int | None, optional): Number of worker processes for the missing battles. Defaults to None.
+            policy (Callable[[Pokemon, Pokemon, Any], Move], optional): Move picker, must be picklable. Defaults to random_policy.
+            max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+            seed (int | None, optional): Seed of the whole matchup. Defaults to None.
+            policy_name (Optional[str], optional): See key. Defaults to None.
+
+        Returns:
+            Dict[str, float]: The summary simulate_matchup returns, over every stored battle.
+        """
+        if n_battles < 0:
+            raise ValueError("Number of battles cannot be negative")
+        key = self.key(species_a, species_b, policy, max_turns, seed, policy_name)
+        # the read and the reservation of the missing battles are one transaction, so runs topping up the same
+        # matchup at once play different battles instead of the same ones twice
+        with self._transaction():
+            row = self._read(key)
+            first = row[5] if row is not None else 0
+            missing = n_battles - first
+            if missing > 0:
+                self._db.execute(
+                    "INSERT INTO results VALUES (?, ?, ?, 0, ?, 0, 0, 0, 0, ?, ?) ON CONFLICT (key) DO UPDATE SET reserved = excluded.reserved",
+                    (key, self.dataset, self.engine_version, n_battles, len(key) + _ROW_OVERHEAD, time.time()))
+        if missing <= 0:
+            return summarize_counts(dict(zip(_COUNTS, row)) if row is not None else dict.fromkeys(_COUNTS, 0))
+
+        try:
+            new = simulate_matchup(species_a, species_b, missing, workers, policy, max_turns, seed, first_index=first)
+        except BaseException:
+            # hand the reservation back, unless another run has reserved battles after it since
+            with self._transaction():
+                self._db.execute("UPDATE results SET reserved = ? WHERE key = ? AND reserved = ?", (first, key, n_battles))
+            raise
+        return summarize_counts(self.add(key, {name: int(new[name]) for name in _COUNTS}))
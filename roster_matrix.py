@@ -0,0 +1,160 @@
+# roster_matrix.py
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from pokemon_models import Pokemon
+from pokemon_loader import dataset_hash, load_pokemon_list
+from battle_engine import MAX_TURNS, simulate_matchup
+from battle_context import DEFAULT_RNG, derive_seed
+
+# Roster shared by the worker processes, set once per worker by _init_worker
+_roster: List[Pokemon] = []
+
+def _init_worker(roster: List[Pokemon]) -> None:
+    global _roster
+    _roster = roster
+
+def _run_cell(i: int, j: int, n_battles: int, max_turns: int, seed: int | None) -> Dict[str, int | str]:
+    cell_seed = derive_seed(seed, i * len(_roster) + j) if seed is not None else None
+    result = simulate_matchup(_roster[i], _roster[j], n_battles, workers=1, max_turns=max_turns, seed=cell_seed)
+    return {
+        'a': _roster[i].name, 'b': _roster[j].name, 'battles': int(result['battles']),
+        'wins_a': int(result['wins_a']), 'wins_b': int(result['wins_b']),
+        'draws': int(result['draws']), 'turns': int(result['turns']),
+    }
+
+def _read_checkpoint(checkpoint_path: str) -> Tuple[Optional[Dict], List[Dict], int]:
+    """
+    Reads a checkpoint file, ignoring a trailing line cut short by a killed run.
+
+    Args:
+        checkpoint_path (str): The checkpoint file to read.
+
+    Returns:
+        Tuple[Optional[Dict], List[Dict], int]: The header (None for a new file), the finished cells and the byte offset right after the last complete line.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None, [], 0
+
+    header: Optional[Dict] = None
+    cells: List[Dict] = []
+    valid_size = 0
+    with open(checkpoint_path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if header is None:
+                header = record
+            else:
+                cells.append(record)
+            valid_size += len(line)
+    return header, cells, valid_size
+
+def build_matrix(names: List[str], cells: List[Dict]) -> List[List[float]]:
+    """
+    Builds the win-probability matrix from finished cells.
+
+    Args:
+        names (List[str]): Species names, in matrix order.
+        cells (List[Dict]): Finished cells as stored in the checkpoint file.
+
+    Returns:
+        List[List[float]]: matrix[i][j] is the probability that names[i] beats names[j]. Mirror matches are not
+        simulated and stay at 0.5, cells that are not finished yet are 0.0.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    matrix = [[0.5 if i == j else 0.0 for j in range(len(names))] for i in range(len(names))]
+    for cell in cells:
+        i, j = index[cell['a']], index[cell['b']]
+        if cell['battles']:
+            matrix[i][j] = cell['wins_a'] / cell['battles']
+            matrix[j][i] = cell['wins_b'] / cell['battles']
+    return matrix
+
+def run_round_robin(file_path: str, checkpoint_path: str, n_battles: int, workers: int | None = None,
+                    max_turns: int = MAX_TURNS, seed: int | None = None) -> Tuple[List[str], List[List[float]]]:
+    """
+    Computes the win-probability matrix for every pair of species in the workbook.
+
+    Every finished cell is appended to `checkpoint_path` as a JSON line as soon as it completes, and cells
+    already in the file are skipped, so a killed run picks up where it stopped. The file starts with a header
+    holding the species, the workbook's hash, the seed and the run settings, and is only resumed by the same run.
+
+    Args:
+        file_path (str): The pokemon.xlsx workbook.
+        checkpoint_path (str): JSON lines file holding the run header and every finished cell.
+        n_battles (int): Battles simulated per pair of species.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seeds the species stats and every cell, so a resumed run computes the same
+            numbers as an uninterrupted one. None draws a seed for a new checkpoint and reuses the stored one
+            when resuming. Defaults to None.
+
+    Returns:
+        Tuple[List[str], List[List[float]]]: The species names and the matrix (see build_matrix).
+
+    Raises:
+        ValueError: If the checkpoint file belongs to a run with a different roster, workbook, seed, battle count
+            or turn cap.
+    """
+    saved_header, cells, valid_size = _read_checkpoint(checkpoint_path)
+    if seed is None:
+        # an unseeded run still gets a concrete seed, kept in the header, so a resumed run rolls the same stats
+        saved_seed = saved_header.get('seed') if saved_header is not None else None
+        seed = saved_seed if saved_seed is not None else DEFAULT_RNG.getrandbits(64)
+
+    roster = load_pokemon_list(file_path, seed)
+    names = [pokemon.name for pokemon in roster]
+    header = {'species': names, 'dataset': dataset_hash(file_path), 'n_battles': n_battles, 'max_turns': max_turns, 'seed': seed}
+    if saved_header is not None and saved_header != header:
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to a different run")
+
+    done = {(cell['a'], cell['b']) for cell in cells}
+    pending = [(i, j) for i in range(len(roster)) for j in range(i + 1, len(roster))
+               if (names[i], names[j]) not in done]
+
+    with open(checkpoint_path, 'ab') as file:
+        # drop a half written line left behind by a killed run
+        file.truncate(valid_size)
+        if saved_header is None:
+            file.write((json.dumps(header) + '\n').encode())
+
+        def save(cell: Dict) -> None:
+            file.write((json.dumps(cell) + '\n').encode())
+            file.flush()
+            os.fsync(file.fileno())
+            cells.append(cell)
+
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1:
+            _init_worker(roster)
+            for i, j in pending:
+                save(_run_cell(i, j, n_battles, max_turns, seed))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(roster,)) as executor:
+                futures = [executor.submit(_run_cell, i, j, n_battles, max_turns, seed) for i, j in pending]
+                for future in as_completed(futures):
+                    save(future.result())
+
+    return names, build_matrix(names, cells)
+
+def load_matrix(checkpoint_path: str) -> Tuple[List[str], List[List[float]]]:
+    """
+    Builds the matrix from a checkpoint file without running anything, e.g. to inspect a run in progress.
+
+    Args:
+        checkpoint_path (str): The checkpoint file written by run_round_robin.
+
+    Returns:
+        Tuple[List[str], List[List[float]]]: The species names and the matrix (see build_matrix).
+    """
+    header, cells, _ = _read_checkpoint(checkpoint_path)
+    if header is None:
+        raise ValueError(f"Checkpoint {checkpoint_path} is empty")
+    return header['species'], build_matrix(header['species'], cells)
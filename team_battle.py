@@ -0,0 +1,272 @@
+# team_battle.py
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+from pokemon_models import Pokemon, Move
+from battle_context import BattleContext, POLICY_STREAM, derive_seed
+from battle_engine import MAX_TURNS, apply_end_turn, execute_move, move_order, split_battles, summarize_counts
+from battle_events import TURN, SWITCH
+
+# Team battles on top of the 1v1 engine: each side has up to six Pokémon with one of them on the field. A turn
+# is played with the engine's own execute_move and apply_end_turn, so every move and status behaves exactly as it
+# does in execute_turn, except that a fainted Pokémon takes no end of turn damage and gets no heal. Members are
+# clones sharing their species with the roster from load_pokemon_list, so setting up a team battle only copies
+# twelve small battle states.
+
+TEAM_SIZE = 6
+
+# What a side does on its turn: use a move of its active Pokémon, or switch to the member at that index
+Action = Union[Move, int]
+
+class Team:
+    """
+    One side of a team battle: its Pokémon and which of them is on the field.
+
+    Args:
+        members (Sequence[Pokemon]): The Pokémon of the team, the first one leads. They are cloned, the originals
+            are left untouched.
+
+    Raises:
+        ValueError: If the team is empty or has more than TEAM_SIZE Pokémon.
+    """
+    __slots__ = ('members', 'active')
+
+    def __init__(self, members: Sequence[Pokemon]):
+        if not 1 <= len(members) <= TEAM_SIZE:
+            raise ValueError(f"A team has between 1 and {TEAM_SIZE} Pokémon")
+        self.members: List[Pokemon] = [pokemon.clone() for pokemon in members]
+        self.active = 0
+
+    @property
+    def pokemon(self) -> Pokemon:
+        # the Pokémon on the field
+        return self.members[self.active]
+
+    def alive(self) -> List[int]:
+        """
+        Returns:
+            List[int]: Indices of the members that have not fainted, the active one included.
+        """
+        return [index for index, pokemon in enumerate(self.members) if pokemon.battle_stats['hp'] > 0]
+
+    def defeated(self) -> bool:
+        return all(pokemon.battle_stats['hp'] <= 0 for pokemon in self.members)
+
+    def switch_options(self) -> List[int]:
+        """
+        The members the team can switch to this turn. A Pokémon that is trapped or has to recharge cannot leave
+        the field, unless it fainted.
+
+        Returns:
+            List[int]: Indices of the members that can come in.
+        """
+        active = self.pokemon
+        if active.battle_stats['hp'] > 0 and (active.has_status('trap') or active.has_status('recharge')):
+            return []
+        return [index for index in self.alive() if index != self.active]
+
+    def switch(self, index: int, opponent: 'Team', ctx: BattleContext) -> None:
+        """
+        Sends the member at `index` in, the Pokémon leaving the field loses its stat stages and volatile statuses
+        (see Pokemon.switch_out). The opposing Pokémon is freed from a trap, which only lasts while its user stays
+        on the field. A seed it carries stays and heals whichever Pokémon is on this side's field.
+
+        Args:
+            index (int): Index of the member coming in.
+            opponent (Team): The other side, whose active Pokémon the leaving one may have trapped.
+            ctx (BattleContext): The battle's context, the switch is emitted to its sink.
+
+        Raises:
+            ValueError: If that member cannot come in.
+        """
+        if index not in self.switch_options():
+            raise ValueError(f"Cannot switch to member {index}")
+        leaving = self.pokemon
+        leaving.switch_out()
+        opponent.pokemon.remove_status('trap')
+        self.active = index
+        ctx.sink.emit(SWITCH, leaving.name, self.pokemon.name)
+
+def random_team_policy(team: Team, opponent: Team, rng: random.Random) -> Action:
+    # a random move of the active Pokémon, like random_policy, never switching by choice
+    return rng.choice(team.pokemon.moves)
+
+def random_replacement(team: Team, opponent: Team, rng: random.Random) -> int:
+    return rng.choice(team.switch_options())
+
+class SwitchingPolicy:
+    """
+    Wraps a 1v1 policy for team battles: the active Pokémon's move comes from `policy`, except that with
+    probability `switch_rate` the team switches to a random member instead. Picklable when `policy` is.
+
+    Args:
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move]): Picks a move for a Pokémon given its opponent.
+        switch_rate (float, optional): Chance of switching on a turn where switching is possible. Defaults to 0.1.
+    """
+    def __init__(self, policy: Callable[[Pokemon, Pokemon, random.Random], Move], switch_rate: float = 0.1):
+        if not 0 <= switch_rate <= 1:
+            raise ValueError("Switch rate must be between 0 and 1")
+        self.policy = policy
+        self.switch_rate = switch_rate
+
+    def __call__(self, team: Team, opponent: Team, rng: random.Random) -> Action:
+        if self.switch_rate and rng.random() < self.switch_rate:
+            options = team.switch_options()
+            if options:
+                return rng.choice(options)
+        return self.policy(team.pokemon, opponent.pokemon, rng)
+
+def execute_team_turn(team1: Team, team2: Team, action1: Action, action2: Action, turn_count: int, ctx: BattleContext) -> int:
+    """
+    Plays a turn of a team battle. Switches happen first (side 1, then side 2), then the moves in the order
+    execute_turn would play them. A move used against a Pokémon that was just switched in cannot make it flinch.
+    End of turn statuses then apply as in execute_turn, to both active Pokémon even when the other one fainted,
+    except that a fainted Pokémon's own residuals are skipped and a seed does not heal it back. Fainted Pokémon
+    are not replaced here, see replace_fainted.
+
+    Args:
+        team1 (Team): The first side.
+        team2 (Team): The second side.
+        action1 (Action): The first side's move or the index of the member it switches to.
+        action2 (Action): The second side's move or the index of the member it switches to.
+        turn_count (int): The number of turns played so far.
+        ctx (BattleContext): The battle's context.
+
+    Returns:
+        int: The updated turn count.
+
+    Raises:
+        ValueError: If a switch is not allowed.
+    """
+    turn_count += 1
+    ctx.sink.emit(TURN, turn_count)
+
+    moves1 = isinstance(action1, Move)
+    moves2 = isinstance(action2, Move)
+    if not moves1:
+        team1.switch(action1, team2, ctx)
+    if not moves2:
+        team2.switch(action2, team1, ctx)
+
+    pokemon1, pokemon2 = team1.pokemon, team2.pokemon
+    if moves1 and moves2:
+        pokemon1.selected_move = action1
+        pokemon2.selected_move = action2
+        first, second = move_order(pokemon1, pokemon2, ctx)
+        execute_move(first, second, True, ctx)
+        if first.battle_stats['hp'] > 0 and second.battle_stats['hp'] > 0:
+            execute_move(second, first, False, ctx)
+    elif moves1:
+        pokemon1.selected_move = action1
+        execute_move(pokemon1, pokemon2, False, ctx)
+    elif moves2:
+        pokemon2.selected_move = action2
+        execute_move(pokemon2, pokemon1, False, ctx)
+
+    for pokemon, enemy in ((pokemon1, pokemon2), (pokemon2, pokemon1)):
+        if pokemon.battle_stats['hp'] > 0:
+            enemy_hp = enemy.battle_stats['hp']
+            apply_end_turn(pokemon, enemy, ctx)
+            if enemy_hp <= 0: # the seed's heal does not bring a fainted Pokémon back
+                enemy.battle_stats['hp'] = enemy_hp
+    return turn_count
+
+def replace_fainted(team: Team, opponent: Team, replacement: Callable[[Team, Team, random.Random], int],
+                    rng: random.Random, ctx: BattleContext) -> None:
+    # sends a member in for a fainted active Pokémon, this does not take a turn
+    if team.pokemon.battle_stats['hp'] <= 0 and not team.defeated():
+        team.switch(replacement(team, opponent, rng), opponent, ctx)
+
+def simulate_team_battle(team1: Sequence[Pokemon], team2: Sequence[Pokemon],
+                         policy: Callable[[Team, Team, random.Random], Action] = random_team_policy,
+                         replacement: Callable[[Team, Team, random.Random], int] = random_replacement,
+                         max_turns: int = MAX_TURNS, seed: int | None = None) -> Tuple[int, int]:
+    """
+    Runs a full team battle without prompting.
+
+    Args:
+        team1 (Sequence[Pokemon]): The first team, left untouched.
+        team2 (Sequence[Pokemon]): The second team, left untouched.
+        policy (Callable[[Team, Team, random.Random], Action], optional): Picks a side's action given both teams and a generator of its own. Defaults to random_team_policy.
+        replacement (Callable[[Team, Team, random.Random], int], optional): Picks the member sent in for a fainted one. Defaults to random_replacement.
+        max_turns (int, optional): Turn cap after which the battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the battle, the same seed replays the same battle. Defaults to None.
+
+    Returns:
+        Tuple[int, int]: The winner (1 or 2, 0 for a draw) and the number of turns played.
+    """
+    side1, side2 = Team(team1), Team(team2)
+    ctx = BattleContext(seed)
+    policy_rng = random.Random(derive_seed(seed, POLICY_STREAM)) if seed is not None else ctx.rng
+    turn_count = 0
+
+    while not side1.defeated() and not side2.defeated() and turn_count < max_turns:
+        action1 = policy(side1, side2, policy_rng)
+        action2 = policy(side2, side1, policy_rng)
+        turn_count = execute_team_turn(side1, side2, action1, action2, turn_count, ctx)
+        replace_fainted(side1, side2, replacement, policy_rng, ctx)
+        replace_fainted(side2, side1, replacement, policy_rng, ctx)
+
+    # both teams can run out on the same turn, reaching the turn cap is a draw too
+    defeated1, defeated2 = side1.defeated(), side2.defeated()
+    if defeated2 and not defeated1:
+        return 1, turn_count
+    if defeated1 and not defeated2:
+        return 2, turn_count
+    return 0, turn_count
+
+def _run_team_battles(team_a: Sequence[Pokemon], team_b: Sequence[Pokemon], n_battles: int,
+                      policy: Callable[[Team, Team, random.Random], Action], replacement: Callable[[Team, Team, random.Random], int],
+                      max_turns: int, seed: int | None = None, first_index: int = 0) -> Dict[str, int]:
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    for index in range(first_index, first_index + n_battles):
+        battle_seed = derive_seed(seed, index) if seed is not None else None
+        winner, turns = simulate_team_battle(team_a, team_b, policy, replacement, max_turns, battle_seed)
+        counts['battles'] += 1
+        counts['turns'] += turns
+        counts[('draws', 'wins_a', 'wins_b')[winner]] += 1
+    return counts
+
+def simulate_team_matchup(team_a: Sequence[Pokemon], team_b: Sequence[Pokemon], n_battles: int, workers: int | None = None,
+                          policy: Callable[[Team, Team, random.Random], Action] = random_team_policy,
+                          replacement: Callable[[Team, Team, random.Random], int] = random_replacement,
+                          max_turns: int = MAX_TURNS, seed: int | None = None) -> Dict[str, float]:
+    """
+    Simulates many battles between the same two teams, spreading them over a process pool like simulate_matchup.
+    With a seed, battle i is played with the seed derive_seed(seed, i), whatever the number of workers.
+
+    Args:
+        team_a (Sequence[Pokemon]): The first team, copied for every battle.
+        team_b (Sequence[Pokemon]): The second team, copied for every battle.
+        n_battles (int): The number of battles to run.
+        workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+        policy (Callable[[Team, Team, random.Random], Action], optional): Action picker, must be picklable. Defaults to random_team_policy.
+        replacement (Callable[[Team, Team, random.Random], int], optional): Replacement picker, must be picklable. Defaults to random_replacement.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed of the whole matchup. Defaults to None.
+
+    Returns:
+        Dict[str, float]: Battle, win, draw and turn counts plus win rates and the average turn count (see summarize_counts).
+    """
+    if n_battles < 0:
+        raise ValueError("Number of battles cannot be negative")
+    for team in (team_a, team_b):
+        if not 1 <= len(team) <= TEAM_SIZE: # fail here rather than in every worker
+            raise ValueError(f"A team has between 1 and {TEAM_SIZE} Pokémon")
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or n_battles <= 1:
+        return summarize_counts(_run_team_battles(team_a, team_b, n_battles, policy, replacement, max_turns, seed))
+
+    counts = {'battles': 0, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+    chunks = split_battles(n_battles, workers * 4)
+    first_indices = [sum(chunks[:i]) for i in range(len(chunks))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_team_battles, list(team_a), list(team_b), chunk, policy, replacement, max_turns, seed, first_index)
+                   for chunk, first_index in zip(chunks, first_indices)]
+        for future in futures:
+            for key, value in future.result().items():
+                counts[key] += value
+    return summarize_counts(counts)
@@ -0,0 +1,25 @@
+# tests/conftest.py
+
+import os
+import sys
+import pytest
+
+# the modules live at the root of the repository, next to pokemon.xlsx
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pokemon_loader import load_pokemon_list
+
+@pytest.fixture(scope='session')
+def roster():
+    return {pokemon.name: pokemon for pokemon in load_pokemon_list(os.path.join(ROOT, 'pokemon.xlsx'), seed=5)}
+
+@pytest.fixture
+def side(roster):
+    # a clone of a species knowing only the named moves
+    def make(name, *moves):
+        pokemon = roster[name].clone()
+        pokemon.moves = [move for move in pokemon.moves if move.name in moves]
+        assert len(pokemon.moves) == len(moves)
+        return pokemon
+    return make
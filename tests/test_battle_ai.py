@@ -0,0 +1,23 @@
+# tests/test_battle_ai.py
+
+import battle_ai
+from battle_ai import ExpectiminimaxAI, NODE_BUDGET
+from battle_state import BattleState
+
+def test_chance_nodes_weigh_every_outcome(side, monkeypatch):
+    pikachu, onix = side('Pikachu', 'Thunder', 'Thunder Wave'), side('Onix', 'Bind', 'Rock Slide')
+    ai = ExpectiminimaxAI(max_depth=2, time_budget=None)
+    ai._state = BattleState(pikachu, onix)
+    before = ai._state.key()
+    # with every position worth the same, the odds of a chance node's outcomes add up to exactly one
+    monkeypatch.setattr(battle_ai, 'evaluate', lambda pokemon, opponent: 1.0)
+    for depth in (1, 2):
+        for move in pikachu.moves:
+            for reply in onix.moves:
+                assert abs(ai._expected(pikachu, onix, move, reply, depth) - 1.0) < 1e-9
+    assert ai._state.key() == before
+
+def test_node_budget_is_reproducible(roster):
+    pikachu, onix = roster['Pikachu'].clone(), roster['Onix'].clone()
+    picks = [ExpectiminimaxAI(time_budget=None, max_nodes=NODE_BUDGET).choose(pikachu, onix).name for _ in range(2)]
+    assert picks[0] == picks[1]
@@ -0,0 +1,28 @@
+# tests/test_battle_profiler.py
+
+import battle_profiler
+from battle_engine import simulate_matchup
+from damage_calc import damage_distribution, expected_damage
+from vector_engine import simulate_matchup_vectorized
+
+def test_profiling_leaves_other_modules_results_unchanged(roster):
+    pikachu, onix = roster['Pikachu'], roster['Onix']
+    moves = pikachu.moves + onix.moves
+
+    def results():
+        return ([expected_damage(pikachu, onix, move) for move in pikachu.moves],
+                [damage_distribution(onix, pikachu, move) for move in onix.moves],
+                simulate_matchup_vectorized(pikachu, onix, 200, seed=3))
+
+    before = results()
+    with battle_profiler.profiling() as profile:
+        during = results()
+        simulated = simulate_matchup(pikachu, onix, 20, workers=1, seed=3)
+    assert during == before
+    assert any(value for value in before[0])
+    # the engine itself was profiled, handlers included
+    functions = profile.functions()
+    assert functions['execute_move']['calls'] > 0
+    assert any(name.startswith('handle_') for name in functions)
+    assert simulated == simulate_matchup(pikachu, onix, 20, workers=1, seed=3)
+    assert all(move.program is None or all(not hasattr(handler, '__wrapped__') for handler, _ in move.program) for move in moves)
@@ -0,0 +1,30 @@
+# tests/test_battle_solver.py
+
+import math
+import pytest
+from battle_engine import simulate_matchup
+from battle_solver import solve_matchup
+
+def test_solve_matchup_agrees_with_seeded_simulation(side):
+    pokemon_a = side('Magikarp', 'Tackle')
+    pokemon_b = side('Pikachu', 'Quick Attack', 'Thunderbolt')
+    exact = solve_matchup(pokemon_a, pokemon_b, max_turns=2)
+    sampled = simulate_matchup(pokemon_a, pokemon_b, 4000, workers=1, max_turns=2, seed=11)
+
+    assert exact['complete'] and exact['unresolved'] == 0
+    assert exact['win_rate_a'] + exact['win_rate_b'] + exact['draw_rate'] + exact['pruned'] == pytest.approx(1.0)
+    for rate in ('win_rate_a', 'win_rate_b', 'draw_rate'):
+        error = 4 * math.sqrt(max(exact[rate] * (1 - exact[rate]), 1e-4) / sampled['battles'])
+        assert sampled[rate] == pytest.approx(exact[rate], abs=error)
+    assert sampled['avg_turns'] == pytest.approx(exact['avg_turns'], abs=0.05)
+
+def test_solve_matchup_budget(side):
+    pokemon_a = side('Magikarp', 'Tackle')
+    pokemon_b = side('Pikachu', 'Quick Attack', 'Thunderbolt')
+    with pytest.raises(ValueError):
+        solve_matchup(pokemon_a, pokemon_b, max_turns=3, max_states=1000)
+
+    result = solve_matchup(pokemon_a, pokemon_b, max_turns=3, max_states=1000, partial=True)
+    assert not result['complete']
+    assert result['unresolved'] > 0
+    assert result['win_rate_a'] + result['win_rate_b'] + result['draw_rate'] + result['pruned'] + result['unresolved'] == pytest.approx(1.0)
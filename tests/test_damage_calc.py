@@ -0,0 +1,13 @@
+# tests/test_damage_calc.py
+
+from damage_calc import damage_distribution, ko_probability
+
+def test_hp_override_applies_to_hp_based_moves(side):
+    raticate, pinsir, onix = side('Raticate', 'Super Fang'), side('Pinsir', 'Guillotine'), side('Onix', 'Tackle')
+    super_fang, guillotine = raticate.moves[0], pinsir.moves[0]
+    assert damage_distribution(raticate, onix, super_fang, hp=40) == {20: 1.0}
+    # Super Fang never knocks out, whatever HP the defender is given
+    assert ko_probability(raticate, onix, super_fang, hp=1, accuracy=False) == 0.0
+    # a fainted defender asked about at some HP is still knocked out by a one-hit KO move
+    onix.battle_stats['hp'] = 0
+    assert ko_probability(pinsir, onix, guillotine, hp=30, accuracy=False) == 1.0
@@ -0,0 +1,50 @@
+# tests/test_genetic_optimizer.py
+
+import genetic_optimizer
+from genetic_optimizer import MovesetSpace, optimize
+
+class _ThunderSpace(MovesetSpace):
+    # a moveset wins every battle when it has Thunder and loses it otherwise, so scores are known in advance
+    def battle(self, candidate, opponent, seed):
+        return 1 if any(move.name == 'Thunder' for move in candidate.moves) else 2
+
+def test_repeated_genomes_are_not_simulated_again(roster, monkeypatch):
+    evaluated = []
+    evaluate = genetic_optimizer._evaluate
+
+    def counting_evaluate(genome, *args):
+        evaluated.append(genome)
+        return evaluate(genome, *args)
+
+    monkeypatch.setattr(genetic_optimizer, '_evaluate', counting_evaluate)
+    history = []
+    result = optimize(MovesetSpace(roster['Pikachu'], size=2), [roster['Onix']], population_size=6, generations=4,
+                      budget=8, stages=2, patience=10, workers=1, seed=3, on_generation=history.append)
+    assert len(evaluated) == len(set(evaluated)) == result['evaluations']
+    # the elite come back every generation, and every genome of a generation is either simulated or a cache hit
+    assert result['cache_hits'] >= 2 * (result['generations'] - 1)
+    assert result['evaluations'] + result['cache_hits'] == 6 * result['generations']
+    assert result['evaluations'] == history[-1]['evaluations']
+
+def test_seeded_runs_are_reproducible(roster):
+    runs = [optimize(MovesetSpace(roster['Pikachu'], size=2), [roster['Onix'], roster['Geodude']], population_size=6,
+                     generations=3, budget=8, stages=2, workers=1, seed=11) for _ in range(2)]
+    assert runs[0] == runs[1]
+
+def test_hopeless_genomes_are_pruned(roster):
+    result = optimize(_ThunderSpace(roster['Pikachu'], size=2), [roster['Onix']], population_size=8, generations=5,
+                      budget=40, stages=4, patience=10, workers=1, seed=2)
+    assert 'Thunder' in result['best'] and result['fitness'] == 1.0
+    # a genome without Thunder is dropped after the first stage once a full evaluation scored 1.0
+    assert result['pruned'] > 0
+    assert result['battles'] == 40 * (result['evaluations'] - result['pruned']) + 10 * result['pruned']
+
+def test_stopping_rules(roster, side):
+    # no genome ever beats the first leader, so the run stops `patience` generations later
+    losing = optimize(_ThunderSpace(side('Pikachu', 'Agility', 'Growl', 'Surf', 'Tail Whip'), size=2), [roster['Onix']],
+                      population_size=4, generations=20, budget=4, stages=1, patience=3, workers=1, seed=1)
+    assert losing['generations'] == 4 and losing['fitness'] == 0.0
+    # a space smaller than the population is searched in full by the first generation
+    small = optimize(MovesetSpace(side('Pikachu', 'Thunder', 'Growl', 'Surf'), size=2), [roster['Onix']],
+                     population_size=8, generations=20, budget=4, workers=1, seed=1)
+    assert small['generations'] == 1 and small['evaluations'] == 3
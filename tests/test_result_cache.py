@@ -0,0 +1,69 @@
+# tests/test_result_cache.py
+
+import os
+import result_cache
+from battle_ai import ExpectiminimaxAI
+from battle_engine import simulate_matchup
+from result_cache import ResultCache
+from conftest import ROOT
+
+DATA = os.path.join(ROOT, 'pokemon.xlsx')
+
+def test_top_up_matches_a_single_run(tmp_path, roster):
+    pikachu, onix = roster['Pikachu'], roster['Onix']
+    with ResultCache(str(tmp_path / 'results.db'), DATA) as cache:
+        cache.matchup(pikachu, onix, 30, workers=1, seed=7)
+        topped_up = cache.matchup(pikachu, onix, 80, workers=1, seed=7)
+        assert cache.matchup(pikachu, onix, 50, workers=1, seed=7) == topped_up
+    assert topped_up == simulate_matchup(pikachu, onix, 80, workers=1, seed=7)
+
+def test_concurrent_top_ups_play_different_battles(tmp_path, roster, monkeypatch):
+    pikachu, onix = roster['Pikachu'], roster['Onix']
+    path = str(tmp_path / 'results.db')
+    first, second = ResultCache(path, DATA), ResultCache(path, DATA)
+    simulate = result_cache.simulate_matchup
+
+    def slow_simulate(*args, **kwargs):
+        # while the first run plays its battles, a second run tops the same matchup up
+        monkeypatch.setattr(result_cache, 'simulate_matchup', simulate)
+        second.matchup(pikachu, onix, 60, workers=1, seed=7)
+        return simulate(*args, **kwargs)
+
+    monkeypatch.setattr(result_cache, 'simulate_matchup', slow_simulate)
+    summary = first.matchup(pikachu, onix, 40, workers=1, seed=7)
+    first.close()
+    second.close()
+    assert summary == simulate_matchup(pikachu, onix, 60, workers=1, seed=7)
+
+def test_least_recently_used_rows_are_evicted(tmp_path, roster):
+    path = str(tmp_path / 'results.db')
+    counts = {'battles': 1, 'wins_a': 1, 'wins_b': 0, 'draws': 0, 'turns': 3}
+    with ResultCache(path, DATA) as cache:
+        keys = [cache.key(roster['Pikachu'], roster['Onix'], seed=seed) for seed in range(4)]
+        for key in keys:
+            cache.add(key, counts)
+        row_size = cache.stats()['bytes'] // len(keys)
+        cache.get(keys[0])
+
+    # a smaller limit applies as soon as the cache is opened, the least recently used rows going first
+    with ResultCache(path, DATA, max_bytes=2 * row_size) as cache:
+        assert cache.stats()['entries'] == 2
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[3]) is not None
+
+def test_rows_of_another_engine_are_dropped(tmp_path, roster):
+    path = str(tmp_path / 'results.db')
+    with ResultCache(path, DATA, engine_version='older') as cache:
+        cache.add(cache.key(roster['Pikachu'], roster['Onix']), {'battles': 1, 'wins_a': 1, 'wins_b': 0, 'draws': 0, 'turns': 3})
+    with ResultCache(path, DATA) as cache:
+        assert cache.stats()['entries'] == 0
+
+def test_policy_sources_are_part_of_the_key(tmp_path, roster, monkeypatch):
+    ai = ExpectiminimaxAI()
+    assert {'battle_ai', 'battle_state'} <= {module.__name__ for module in result_cache.policy_modules(ai)}
+    with ResultCache(str(tmp_path / 'results.db'), DATA) as cache:
+        key = cache.key(roster['Pikachu'], roster['Onix'], ai, policy_name='ai')
+        # an edited battle_ai or battle_state hashes differently, so the old results are not found
+        monkeypatch.setattr(result_cache, 'policy_hash', lambda policy: 'edited')
+        assert cache.key(roster['Pikachu'], roster['Onix'], ai, policy_name='ai') != key
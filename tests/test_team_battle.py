@@ -0,0 +1,19 @@
+# tests/test_team_battle.py
+
+from battle_context import BattleContext
+from team_battle import Team, execute_team_turn
+
+def test_end_of_turn_still_applies_after_a_faint(roster):
+    team1, team2 = Team([roster['Pikachu'], roster['Onix']]), Team([roster['Gyarados'], roster['Geodude']])
+    poisoned, fainted = team1.pokemon, team2.pokemon
+    poisoned.apply_status('poison', 100)
+    poisoned.apply_status('seed', 100)
+    poisoned.battle_stats['spd'] = fainted.battle_stats['spd'] + 1
+    fainted.battle_stats['hp'] = 1
+    hp = poisoned.battle_stats['hp']
+    # Pikachu, the faster, knocks Gyarados out and then takes its poison and seed damage like after a faint in
+    # execute_turn, while the seed's heal does not bring Gyarados back
+    thunderbolt = next(move for move in poisoned.moves if move.name == 'Thunderbolt')
+    execute_team_turn(team1, team2, thunderbolt, fainted.moves[0], 0, BattleContext(1))
+    assert fainted.battle_stats['hp'] <= 0
+    assert poisoned.battle_stats['hp'] == hp - 2 * int(poisoned.max_stats['hp'] * 0.125)
@@ -0,0 +1,265 @@
+# tournament.py
+
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from pokemon_models import Pokemon, Move
+from battle_engine import MAX_TURNS, random_policy, simulate_battle
+from battle_context import derive_seed
+
+# Ranks thousands of entrants (a species with a subset of its moves) without a round robin: entrants are paired
+# with others of about the same standing, Swiss or Elo-ladder style, and every entrant plays a fixed number of
+# matches. There is no barrier between rounds: an entrant whose match finished is rated right away and paired
+# again with whoever else is free, while the other matches keep running on the pool.
+
+DEFAULT_RATING = 1500.0
+DEFAULT_K = 32.0
+MOVES_PER_ENTRANT = 4
+PAIRING_WINDOW = 8 # how far down the standings pairing looks for an opponent not met yet
+
+# Entrants shared by the worker processes, set once per worker by _init_worker
+_entrants: List['Entrant'] = []
+
+class Entrant:
+    """
+    A species with a fixed set of moves. The species stats are shared, only the move list is replaced.
+
+    Args:
+        pokemon (Pokemon): The species, e.g. from load_pokemon_list.
+        moves (Sequence[Move]): The moves it battles with, usually a subset of pokemon.moves.
+    """
+    __slots__ = ('pokemon', 'key')
+
+    def __init__(self, pokemon: Pokemon, moves: Sequence[Move]):
+        self.pokemon = Pokemon.from_species(pokemon.species.replace(moves=list(moves), moves_list=[move.name for move in moves]))
+        self.key = f"{pokemon.name} ({'/'.join(sorted(move.name for move in moves))})"
+
+    def __repr__(self) -> str:
+        return f"Entrant({self.key!r})"
+
+def generate_entrants(roster: List[Pokemon], n_entrants: int, moves_per_entrant: int = MOVES_PER_ENTRANT,
+                      seed: int | None = None) -> List[Entrant]:
+    """
+    Draws distinct entrants: a random species with a random subset of its moves.
+
+    Args:
+        roster (List[Pokemon]): The species to draw from, e.g. from load_pokemon_list.
+        n_entrants (int): How many entrants to draw.
+        moves_per_entrant (int, optional): Moves per entrant, species knowing fewer keep all of theirs. Defaults to MOVES_PER_ENTRANT.
+        seed (int | None, optional): Seed of the draw. Defaults to None.
+
+    Returns:
+        List[Entrant]: The entrants, fewer than asked for when the roster does not have that many distinct ones.
+    """
+    rng = random.Random(seed)
+    candidates = [pokemon for pokemon in roster if pokemon.moves]
+    if not candidates:
+        raise ValueError("No Pokémon with moves to draw entrants from")
+    entrants: Dict[str, Entrant] = {}
+    attempts = 0
+    while len(entrants) < n_entrants and attempts < n_entrants * 20:
+        attempts += 1
+        pokemon = rng.choice(candidates)
+        entrant = Entrant(pokemon, rng.sample(pokemon.moves, min(moves_per_entrant, len(pokemon.moves))))
+        entrants.setdefault(entrant.key, entrant)
+    return list(entrants.values())
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    # the Elo expectation of the first player, a draw counting half a win
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+def _init_worker(entrants: List[Entrant]) -> None:
+    global _entrants
+    _entrants = entrants
+
+def _play_matches(matches: List[Tuple[int, int, int]], n_battles: int, policy: Callable[[Pokemon, Pokemon, random.Random], Move],
+                  max_turns: int, seed: int | None) -> List[Tuple[int, int, int, int]]:
+    # matches are (match index, entrant, opponent), each result is (entrant, opponent, wins, losses) out of n_battles
+    results = []
+    for match_index, a, b in matches:
+        wins = losses = 0
+        for battle in range(n_battles):
+            battle_seed = derive_seed(seed, match_index * n_battles + battle) if seed is not None else None
+            winner, _ = simulate_battle(_entrants[a].pokemon, _entrants[b].pokemon, policy, max_turns, battle_seed)
+            wins += winner == 1
+            losses += winner == 2
+        results.append((a, b, wins, losses))
+    return results
+
+class Tournament:
+    """
+    A Swiss or Elo-ladder tournament over many entrants, rated as results come in.
+
+    Free entrants are paired among those with the fewest matches played, by match points (a won match is 1, a
+    drawn one 0.5) then rating in 'swiss' mode, by rating alone in 'elo' mode. An entrant meets any opponent at
+    most once when possible and plays `rounds` matches. Since pairing only waits for entrants to be free, not
+    for a whole round, ratings and standings can be read at any time, e.g. from `on_match`. With one worker a
+    seeded tournament always plays out the same way; with more the pairings depend on which matches finish first.
+
+    Args:
+        entrants (List[Entrant]): The entrants, e.g. from generate_entrants.
+        rounds (int): Matches per entrant.
+        mode (str, optional): 'swiss' or 'elo'. Defaults to 'swiss'.
+        n_battles (int, optional): Battles per match, the match score being the share of battles won (draws
+            count half). Defaults to 1.
+        k (float, optional): Elo K-factor. Defaults to DEFAULT_K.
+        policy (Callable[[Pokemon, Pokemon, random.Random], Move], optional): Move picker, must be picklable. Defaults to random_policy.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seeds the battles and the first pairings. Defaults to None.
+
+    Raises:
+        ValueError: If the mode is unknown, or there are fewer than two entrants, no rounds or no battles per match.
+    """
+    def __init__(self, entrants: List[Entrant], rounds: int, mode: str = 'swiss', n_battles: int = 1, k: float = DEFAULT_K,
+                 policy: Callable[[Pokemon, Pokemon, random.Random], Move] = random_policy, max_turns: int = MAX_TURNS,
+                 seed: int | None = None):
+        if mode not in ('swiss', 'elo'):
+            raise ValueError(f"Invalid mode: {mode}")
+        if len(entrants) < 2 or rounds < 1 or n_battles < 1:
+            raise ValueError("A tournament needs at least two entrants, one round and one battle per match")
+        self.entrants = entrants
+        self.rounds = rounds
+        self.mode = mode
+        self.n_battles = n_battles
+        self.k = k
+        self.policy = policy
+        self.max_turns = max_turns
+        self.seed = seed
+
+        n = len(entrants)
+        self.ratings: List[float] = [DEFAULT_RATING] * n
+        self.points: List[float] = [0.0] * n
+        self.matches: List[int] = [0] * n
+        self.battles: List[Tuple[int, int, int]] = [(0, 0, 0)] * n # wins, losses, draws
+        self.played: Set[Tuple[int, int]] = set()
+        self.matches_played = 0
+        self._next_match = 0
+        self._busy: Set[int] = set()
+        # a random starting order, so the first pairings are not decided by the order of the entrants
+        self._tiebreak = list(range(n))
+        random.Random(seed).shuffle(self._tiebreak)
+
+    def _free(self) -> List[int]:
+        # entrants waiting for a match: those with the fewest matches first, so nobody runs ahead of the rest,
+        # then best standing first
+        free = [i for i in range(len(self.entrants)) if i not in self._busy and self.matches[i] < self.rounds]
+        if self.mode == 'swiss':
+            free.sort(key=lambda i: (self.matches[i], -self.points[i], -self.ratings[i], self._tiebreak[i]))
+        else:
+            free.sort(key=lambda i: (self.matches[i], -self.ratings[i], self._tiebreak[i]))
+        return free
+
+    def pair(self, limit: int) -> List[Tuple[int, int, int]]:
+        """
+        Pairs free entrants, fewest matches played first, each with the nearest one below it in the standings it
+        has not met yet (a rematch only when all of the next PAIRING_WINDOW have been met), and marks them busy.
+
+        Args:
+            limit (int): The most matches to make.
+
+        Returns:
+            List[Tuple[int, int, int]]: The matches, as (match index, entrant, opponent).
+        """
+        free = self._free()
+        matches = []
+        while len(free) >= 2 and len(matches) < limit:
+            a = free.pop(0)
+            window = free[:PAIRING_WINDOW]
+            b = next((b for b in window if (min(a, b), max(a, b)) not in self.played), window[0])
+            free.remove(b)
+            self._busy.update((a, b))
+            self.played.add((min(a, b), max(a, b)))
+            matches.append((self._next_match, a, b))
+            self._next_match += 1
+        return matches
+
+    def record(self, a: int, b: int, wins: int, losses: int) -> None:
+        """
+        Rates a finished match between entrants a and b and frees them.
+
+        Args:
+            a (int): The first entrant.
+            b (int): The second entrant.
+            wins (int): Battles a won.
+            losses (int): Battles a lost, the others were draws.
+        """
+        draws = self.n_battles - wins - losses
+        score = (wins + draws / 2) / self.n_battles
+        change = self.k * (score - expected_score(self.ratings[a], self.ratings[b]))
+        self.ratings[a] += change
+        self.ratings[b] -= change
+        self.points[a] += 1 if score > 0.5 else 0.5 if score == 0.5 else 0
+        self.points[b] += 1 if score < 0.5 else 0.5 if score == 0.5 else 0
+        won, lost, drawn = self.battles[a]
+        self.battles[a] = (won + wins, lost + losses, drawn + draws)
+        won, lost, drawn = self.battles[b]
+        self.battles[b] = (won + losses, lost + wins, drawn + draws)
+        self.matches[a] += 1
+        self.matches[b] += 1
+        self.matches_played += 1
+        self._busy.difference_update((a, b))
+
+    def standings(self) -> List[Dict[str, float | int | str]]:
+        """
+        Returns:
+            List[Dict[str, float | int | str]]: Every entrant's key, rating, points, matches and battle wins,
+                losses and draws, best rating first.
+        """
+        order = sorted(range(len(self.entrants)), key=lambda i: -self.ratings[i])
+        return [{
+            'key': self.entrants[i].key, 'rating': self.ratings[i], 'points': self.points[i], 'matches': self.matches[i],
+            'wins': self.battles[i][0], 'losses': self.battles[i][1], 'draws': self.battles[i][2],
+        } for i in order]
+
+    def run(self, workers: int | None = None, batch_size: int = 16,
+            on_match: Optional[Callable[['Tournament', int, int], None]] = None) -> List[Dict[str, float | int | str]]:
+        """
+        Plays the tournament until every entrant has played its matches or no free entrants are left to pair
+        (the odd one out then ends a match short).
+
+        Args:
+            workers (int | None, optional): Number of worker processes, None uses every CPU and 1 runs in this process. Defaults to None.
+            batch_size (int, optional): Matches per task sent to a worker. Defaults to 16.
+            on_match (Optional[Callable[[Tournament, int, int], None]], optional): Called with the tournament and
+                both entrants after every match is rated. Defaults to None.
+
+        Returns:
+            List[Dict[str, float | int | str]]: The final standings.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        workers = workers or os.cpu_count() or 1
+        play = (self.n_battles, self.policy, self.max_turns, self.seed)
+
+        def record(results: List[Tuple[int, int, int, int]]) -> None:
+            for a, b, wins, losses in results:
+                self.record(a, b, wins, losses)
+                if on_match is not None:
+                    on_match(self, a, b)
+
+        if workers <= 1:
+            _init_worker(self.entrants)
+            while True:
+                matches = self.pair(batch_size)
+                if not matches:
+                    break
+                record(_play_matches(matches, *play))
+            return self.standings()
+
+        # a small batch per task keeps entrants coming back to the free pool often, while enough tasks stay
+        # in flight to keep every worker busy
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.entrants,)) as executor:
+            pending: Set[Future] = set()
+            while True:
+                while len(pending) < workers * 2:
+                    matches = self.pair(batch_size)
+                    if not matches:
+                        break
+                    pending.add(executor.submit(_play_matches, matches, *play))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future.result())
+        return self.standings()
@@ -0,0 +1,68 @@
+# type_chart.py
+
+from typing import Dict, List
+
+TYPES: List[str] = [
+    "Normal", "Fire", "Water", "Electric", "Grass", "Ice", "Fighting", "Poison", "Ground",
+    "Flying", "Psychic", "Bug", "Rock", "Ghost", "Dragon", "Dark", "Steel", "Fairy",
+]
+TYPE_IDS: Dict[str, int] = {name: i for i, name in enumerate(TYPES)}
+# The id of every type name that is not in TYPES: neutral against and neutral to every type, like
+# calculate_type_effectiveness treats unknown types. Unknown names all share it, so they count as one type for STAB
+NEUTRAL_TYPE_ID = len(TYPES)
+
+_TYPE_CHART: Dict[str, Dict[str, float]] = {
+    "Normal": {"Rock": 0.5, "Ghost": 0, "Steel": 0.5},
+    "Fire": {"Fire": 0.5, "Water": 0.5, "Grass": 2, "Ice": 2, "Bug": 2, "Rock": 0.5, "Dragon": 0.5, "Steel": 2},
+    "Water": {"Fire": 2, "Water": 0.5, "Grass": 0.5, "Ground": 2, "Rock": 2, "Dragon": 0.5},
+    "Electric": {"Water": 2, "Electric": 0.5, "Grass": 0.5, "Ground": 0, "Flying": 2, "Dragon": 0.5},
+    "Grass": {"Fire": 0.5, "Water": 2, "Grass": 0.5, "Poison": 0.5, "Ground": 2, "Flying": 0.5, "Bug": 0.5, "Rock": 2, "Dragon": 0.5, "Steel": 0.5},
+    "Ice": {"Fire": 0.5, "Water": 0.5, "Grass": 2, "Ice": 0.5, "Ground": 2, "Flying": 2, "Dragon": 2, "Steel": 0.5},
+    "Fighting": {"Normal": 2, "Ice": 2, "Poison": 0.5, "Flying": 0.5, "Psychic": 0.5, "Bug": 0.5, "Rock": 2, "Ghost": 0, "Dark": 2, "Steel": 2, "Fairy": 0.5},
+    "Poison": {"Grass": 2, "Poison": 0.5, "Ground": 0.5, "Rock": 0.5, "Ghost": 0.5, "Steel": 0, "Fairy": 2},
+    "Ground": {"Fire": 2, "Electric": 2, "Grass": 0.5, "Poison": 2, "Flying": 0, "Bug": 0.5, "Rock": 2, "Steel": 2},
+    "Flying": {"Grass": 2, "Electric": 0.5, "Fighting": 2, "Bug": 2, "Rock": 0.5, "Steel": 0.5},
+    "Psychic": {"Fighting": 2, "Poison": 2, "Psychic": 0.5, "Dark": 0, "Steel": 0.5},
+    "Bug": {"Fire": 0.5, "Grass": 2, "Fighting": 0.5, "Poison": 0.5, "Flying": 0.5, "Ghost": 0.5, "Steel": 0.5, "Fairy": 0.5},
+    "Rock": {"Fire": 2, "Ice": 2, "Fighting": 0.5, "Ground": 0.5, "Flying": 2, "Bug": 2, "Steel": 0.5},
+    "Ghost": {"Normal": 0, "Psychic": 2, "Ghost": 2, "Dark": 0.5},
+    "Dragon": {"Dragon": 2, "Steel": 0.5, "Fairy": 0},
+    "Dark": {"Fighting": 0.5, "Psychic": 2, "Ghost": 2, "Dark": 0.5, "Fairy": 0.5},
+    "Steel": {"Fire": 0.5, "Water": 0.5, "Electric": 0.5, "Ice": 2, "Rock": 2, "Steel": 0.5, "Fairy": 2},
+    "Fairy": {"Fire": 0.5, "Fighting": 2, "Poison": 0.5, "Dragon": 2, "Dark": 2, "Steel": 0.5}
+}
+
+# TYPE_EFFECTIVENESS[attack type id][defending type id], with a last row and column of 1.0 for NEUTRAL_TYPE_ID
+TYPE_EFFECTIVENESS: List[List[float]] = [
+    [float(_TYPE_CHART[attack].get(defend, 1.0)) for defend in TYPES] + [1.0] for attack in TYPES
+] + [[1.0] * (len(TYPES) + 1)]
+
+def type_id(type_name: str) -> int:
+    """
+    Interns a type name to its small integer id.
+
+    Args:
+        type_name (str): The type name, e.g. "Fire".
+
+    Returns:
+        int: The index of the type in TYPES, NEUTRAL_TYPE_ID for a type that is not in the chart.
+    """
+    return TYPE_IDS.get(type_name, NEUTRAL_TYPE_ID)
+
+def defensive_row(type_ids: List[int]) -> List[float]:
+    """
+    Precomputes how effective every attacking type is against a (possibly dual) typed defender.
+
+    Args:
+        type_ids (List[int]): The defender's type ids.
+
+    Returns:
+        List[float]: The combined effectiveness, indexed by attacking type id (NEUTRAL_TYPE_ID included).
+    """
+    row: List[float] = []
+    for attack in range(len(TYPE_EFFECTIVENESS)):
+        type_effectiveness = 1.0
+        for defend in type_ids:
+            type_effectiveness *= TYPE_EFFECTIVENESS[attack][defend]
+        row.append(type_effectiveness)
+    return row
@@ -0,0 +1,397 @@
+# vector_engine.py
+
+import numpy as np
+from typing import Callable, Dict, List
+from pokemon_models import Pokemon, Move, MULTIPLIER_STATS, NON_VOLATILE_MASK, STATUS_NAMES, STAT_STAGE_MULTIPLIERS
+import battle_engine
+from battle_engine import ACCURACY_STAGE_MULTIPLIERS, END_TURN_ACTIONS, MAX_TURNS, START_MOVE_ACTIONS, compile_move, summarize_counts
+
+# Lockstep version of battle_engine: every array below holds one entry per battle, and a move, effect or
+# status is applied at once to every battle selected by a boolean mask. Randomness is drawn in batch for
+# all battles, which keeps battles independent and gives the same distributions as the scalar engine.
+
+STAT_INDEX: Dict[str, int] = {'atk': 0, 'def': 1, 'sp_atk': 2, 'sp_def': 3, 'spd': 4, 'eva': 5, 'acc': 6}
+STAT_STAGE_MULTIPLIER = np.array(STAT_STAGE_MULTIPLIERS)
+ACCURACY_STAGE_MULTIPLIER = np.array(ACCURACY_STAGE_MULTIPLIERS)
+
+# Statuses apply_start_move and apply_end_turn handle
+START_MOVE_STATUSES: List[str] = [STATUS_NAMES[status_id] for status_id, _ in START_MOVE_ACTIONS]
+END_TURN_STATUSES: List[str] = [STATUS_NAMES[status_id] for status_id, _ in END_TURN_ACTIONS]
+NON_VOLATILE_STATUSES: List[str] = [name for status_id, name in enumerate(STATUS_NAMES) if NON_VOLATILE_MASK >> status_id & 1]
+
+class _Side:
+    """
+    The state of one side of K lockstep battles, all starting from the same Pokémon.
+    """
+    def __init__(self, pokemon: Pokemon, n_battles: int):
+        self.pokemon = pokemon
+        self.moves: List[Move] = pokemon.moves
+        self.max_hp: int = pokemon.max_stats['hp']
+        self.max_stats = np.array([pokemon.max_stats[stat] for stat in MULTIPLIER_STATS], dtype=np.float64)
+        self.priority = np.array([move.priority for move in self.moves], dtype=np.int64)
+        self.physical = np.array([move.category == 'Physical' for move in self.moves] + [False]) # last entry stands for no move
+        # the moves' compiled programs (see battle_engine.compile_move) with this module's handlers swapped in
+        self.programs = []
+        for move in self.moves:
+            program = move.program if move.program is not None else compile_move(move)
+            self.programs.append([(_LOCKSTEP_HANDLERS[handler], effect) for handler, effect in program])
+
+        self.hp = np.full(n_battles, pokemon.battle_stats['hp'], dtype=np.int64)
+        self.stages = np.tile(np.array([pokemon.stat_stages[stat] for stat in STAT_INDEX], dtype=np.int64), (n_battles, 1))
+        self.multipliers = np.tile(np.array([pokemon.stat_multipliers[stat] for stat in MULTIPLIER_STATS], dtype=np.float64), (n_battles, 1))
+        self.statuses: Dict[str, np.ndarray] = {
+            status: np.full(n_battles, pokemon.get_status_duration(status), dtype=np.int64)
+            for status in START_MOVE_STATUSES + END_TURN_STATUSES
+        }
+        # when each status was applied, on a clock shared by the side's battles: the order of Pokemon.status_order
+        order = [STATUS_NAMES[status_id] for status_id in pokemon.status_order]
+        self.applied: Dict[str, np.ndarray] = {
+            status: np.full(n_battles, order.index(status) if status in order else -1, dtype=np.int64) for status in self.statuses
+        }
+        self.clock = len(order)
+        self.last_damage = np.full(n_battles, pokemon.last_damage, dtype=np.int64)
+        last_move = self.moves.index(pokemon.last_move) if pokemon.last_move in self.moves else -1
+        self.last_move = np.full(n_battles, last_move, dtype=np.int64)
+        self.selected = np.zeros(n_battles, dtype=np.int64)
+        self.can_move = np.ones(n_battles, dtype=bool)
+
+    def battle_stat(self, stat: str) -> np.ndarray:
+        i = STAT_INDEX[stat]
+        return (self.max_stats[i] * STAT_STAGE_MULTIPLIER[self.stages[:, i] + 6] * self.multipliers[:, i]).astype(np.int64)
+
+    def set_status(self, status: str, duration: np.ndarray | int, mask: np.ndarray) -> None:
+        # like Pokemon.apply_status: a status the Pokémon did not have goes last in the order, one it already has
+        # keeps its place
+        new = mask & (self.statuses[status] <= 0)
+        self.applied[status] = np.where(new, self.clock, self.applied[status])
+        self.clock += 1
+        self.statuses[status] = np.where(mask, duration, self.statuses[status])
+
+    def has_non_volatile_status(self) -> np.ndarray:
+        return np.logical_or.reduce([self.statuses[status] > 0 for status in NON_VOLATILE_STATUSES])
+
+    def compact(self, keep: np.ndarray) -> None:
+        self.hp = self.hp[keep]
+        self.stages = self.stages[keep]
+        self.multipliers = self.multipliers[keep]
+        self.statuses = {status: duration[keep] for status, duration in self.statuses.items()}
+        self.applied = {status: applied[keep] for status, applied in self.applied.items()}
+        self.last_damage = self.last_damage[keep]
+        self.last_move = self.last_move[keep]
+        self.selected = self.selected[keep]
+        self.can_move = self.can_move[keep]
+
+def calculate_damage(attacker: _Side, defender: _Side, move: Move, rng: np.random.Generator, crit_ratio: float = 1/24) -> np.ndarray:
+    n = len(attacker.hp)
+    if move.category == "Physical":
+        a = attacker.battle_stat('atk')
+        d = defender.battle_stat('def')
+    else:
+        a = attacker.battle_stat('sp_atk')
+        d = defender.battle_stat('sp_def')
+
+    crit_multiplier = np.where(rng.random(n) <= crit_ratio, 1.5, 1.0)
+    random_factor = rng.integers(85, 101, n) / 100
+
+    stab = 1.5 if move.type_id in attacker.pokemon.type_ids else 1.0
+    burn = np.where((attacker.statuses['burn'] > 0) & (move.category == "Physical"), 0.5, 1.0)
+    type_effectiveness = defender.pokemon.defense_row[move.type_id]
+
+    power = move.power if move.power is not None else 0
+    base_damage = ((((2 * attacker.pokemon.level / 5 + 2) * power * (a / d)) / 50 + burn * 2)).astype(np.int64)
+    return (base_damage * crit_multiplier * random_factor * stab * type_effectiveness).astype(np.int64)
+
+def move_hit(attacker: _Side, defender: _Side, move: Move, rng: np.random.Generator) -> np.ndarray:
+    n = len(attacker.hp)
+    if move.accuracy is None:
+        return np.ones(n, dtype=bool)
+    combined_stage = np.clip(attacker.stages[:, STAT_INDEX['acc']] - defender.stages[:, STAT_INDEX['eva']], -6, 6)
+    return rng.integers(0, 101, n) <= float(move.accuracy) * ACCURACY_STAGE_MULTIPLIER[combined_stage + 6]
+
+# Effect handlers, each one mirrors the battle_engine handler of the same name for the battles in `mask`
+def _deal_damage(attacker: _Side, defender: _Side, damage: np.ndarray, mask: np.ndarray) -> None:
+    attacker.last_damage = np.where(mask, damage, attacker.last_damage)
+    defender.hp -= np.where(mask, damage, 0)
+
+def handle_damage(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    _deal_damage(attacker, defender, calculate_damage(attacker, defender, move, rng), mask)
+
+def handle_recoil(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    recoil_damage = (attacker.last_damage * effect['percentage']).astype(np.int64)
+    attacker.hp -= np.where(mask, recoil_damage, 0)
+
+def handle_counter(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    if defender.pokemon.defense_row[move.type_id] == 0:
+        return
+    countered = mask & defender.physical[defender.last_move]
+    _deal_damage(attacker, defender, defender.last_damage * 2, countered)
+
+def handle_multi_hit(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    n = len(attacker.hp)
+    hit_count = rng.choice([2, 3, 4, 5], n, p=[3/8, 3/8, 1/8, 1/8])
+    total_damage = np.zeros(n, dtype=np.int64)
+    for hit in range(5):
+        total_damage += np.where(hit < hit_count, calculate_damage(attacker, defender, move, rng), 0)
+    _deal_damage(attacker, defender, total_damage, mask)
+
+def handle_double_hit(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    total_damage = calculate_damage(attacker, defender, move, rng) + calculate_damage(attacker, defender, move, rng)
+    _deal_damage(attacker, defender, total_damage, mask)
+
+def handle_crit_ratio(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    damage = calculate_damage(attacker, defender, move, rng, effect['ratio'])
+    _deal_damage(attacker, defender, damage, mask)
+
+def handle_half_hp(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    if defender.pokemon.defense_row[move.type_id] != 0:
+        _deal_damage(attacker, defender, defender.hp // 2, mask)
+
+def handle_level_damage(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    if defender.pokemon.defense_row[move.type_id] != 0:
+        _deal_damage(attacker, defender, np.full(len(attacker.hp), attacker.pokemon.level, dtype=np.int64), mask)
+
+def handle_random_level_damage(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    low = effect['min']
+    high = effect['max']
+    damage = (attacker.pokemon.level * rng.uniform(low, high, len(attacker.hp))).astype(np.int64)
+    if defender.pokemon.defense_row[move.type_id] != 0:
+        _deal_damage(attacker, defender, damage, mask)
+
+def handle_faint(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    target = effect['target']
+    fainted = mask & (rng.random(len(attacker.hp)) <= effect['probability'])
+    if target == 'user':
+        attacker.hp[fainted] = 0
+    elif target == 'opp':
+        defender.hp[fainted] = 0
+
+def handle_heal(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    heal_amount = int(effect['max_hp'] * attacker.max_hp)
+    attacker.hp = np.where(mask, np.minimum(attacker.max_hp, attacker.hp + heal_amount), attacker.hp)
+
+def handle_absorb(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    absorb_amount = (attacker.last_damage * effect['percentage']).astype(np.int64)
+    attacker.hp += np.where(mask, absorb_amount, 0)
+
+def _apply_non_volatile(defender: _Side, status: str, duration: np.ndarray | int, effect: Dict[str, str | int | float], mask: np.ndarray,
+                        immune: bool, rng: np.random.Generator) -> np.ndarray:
+    # the probability is rolled even when the defender is immune, like the scalar handlers do
+    applied = mask & (rng.random(len(defender.hp)) <= effect['probability'])
+    if immune:
+        return applied & False
+    applied &= ~defender.has_non_volatile_status()
+    defender.set_status(status, duration, applied)
+    return applied
+
+def handle_paralyze(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    applied = _apply_non_volatile(defender, 'paralyze', 100, effect, mask, 'Electric' in defender.pokemon.type, rng)
+    defender.multipliers[applied, STAT_INDEX['spd']] *= 1/2
+
+def handle_sleep(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    duration = rng.integers(1, 4, len(defender.hp))
+    _apply_non_volatile(defender, 'sleep', duration, effect, mask, False, rng)
+
+def handle_freeze(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    applied = _apply_non_volatile(defender, 'freeze', 100, effect, mask, 'Ice' in defender.pokemon.type, rng)
+    # pokemon have the possibility of immediately thawing after frozen
+    thawed = mask & ~applied & (rng.random(len(defender.hp)) <= 0.25)
+    defender.statuses['freeze'][thawed] = 0
+
+def handle_badly_poison(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    _apply_non_volatile(defender, 'badly_poison', 1, effect, mask, False, rng)
+
+def handle_burn(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    _apply_non_volatile(defender, 'burn', 100, effect, mask, 'Fire' in defender.pokemon.type, rng)
+
+def handle_poison(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    immune = 'Steel' in defender.pokemon.type or 'Poison' in defender.pokemon.type
+    _apply_non_volatile(defender, 'poison', 100, effect, mask, immune, rng)
+
+def handle_recharge(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    attacker.set_status('recharge', 1, mask)
+
+def handle_flinch(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    flinched = mask & (rng.random(len(defender.hp)) <= effect['probability'])
+    if is_first_move:
+        defender.set_status('flinch', 1, flinched)
+
+def handle_confuse(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    confused = mask & (rng.random(len(defender.hp)) <= effect['probability'])
+    defender.set_status('confuse', rng.integers(1, 5, len(defender.hp)), confused)
+
+def handle_seed(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    defender.set_status('seed', 100, mask)
+
+def handle_trap(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    defender.set_status('trap', rng.integers(4, 6, len(defender.hp)), mask)
+
+def handle_stage(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    target = effect['target']
+    stat = STAT_INDEX[effect['stat']]
+    amount = effect['amount']
+    changed = mask & (rng.random(len(attacker.hp)) <= effect['probability'])
+    side = attacker if target == 'user' else defender if target == 'opp' else None
+    if side is not None:
+        side.stages[changed, stat] = np.clip(side.stages[changed, stat] + amount, -6, 6)
+
+def handle_stage_reset(attacker: _Side, defender: _Side, effect: Dict[str, str | int | float], move: Move, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    attacker.stages[mask] = 0
+    defender.stages[mask] = 0
+
+EFFECT_HANDLERS: Dict[str, Callable[..., None]] = {
+    'damage': handle_damage,
+    'heal': handle_heal,
+    'recoil': handle_recoil,
+    'flinch': handle_flinch,
+    'hits': handle_multi_hit,
+    'sleep': handle_sleep,
+    'stage': handle_stage,
+    'crit_ratio': handle_crit_ratio,
+    'stage_reset': handle_stage_reset,
+    'badly_poison': handle_badly_poison,
+    'random_level_damage': handle_random_level_damage,
+    'counter': handle_counter,
+    'faint': handle_faint,
+    'burn': handle_burn,
+    'absorb': handle_absorb,
+    'seed': handle_seed,
+    'recharge': handle_recharge,
+    'freeze': handle_freeze,
+    'double_hit': handle_double_hit,
+    'trap': handle_trap,
+    'poison': handle_poison,
+    'level_damage': handle_level_damage,
+    'multi_hit': handle_multi_hit,
+    'paralyze': handle_paralyze,
+    'confuse': handle_confuse,
+    'half_hp': handle_half_hp,
+}
+# The handler of this module standing in for every scalar handler a compiled program holds
+_LOCKSTEP_HANDLERS: Dict[Callable[..., None], Callable[..., None]] = {
+    battle_engine.EFFECT_HANDLERS[name]: handler for name, handler in EFFECT_HANDLERS.items()
+}
+
+def apply_start_move(side: _Side, mask: np.ndarray, rng: np.random.Generator) -> None:
+    n = len(side.hp)
+    side.can_move = np.where(mask, True, side.can_move)
+    thawed = np.zeros(n, dtype=bool)
+    # like the scalar engine, the status applied last decides whether the Pokémon can move
+    latest = np.full(n, -1, dtype=np.int64)
+    for status in START_MOVE_STATUSES:
+        active = mask & (side.statuses[status] > 0)
+        if not active.any():
+            continue
+        if status in ('flinch', 'sleep', 'recharge'):
+            side.statuses[status] -= active
+            can_move = np.zeros(n, dtype=bool)
+        elif status == 'confuse':
+            side.statuses[status] -= active
+            hurt = active & (rng.random(n) <= 0.33)
+            side.hp[hurt] -= 40
+            can_move = ~hurt
+        else:
+            can_move = rng.random(n) > 0.25
+            if status == 'freeze':
+                thawed = active & can_move
+        decides = active & (side.applied[status] > latest)
+        side.can_move[decides] = can_move[decides]
+        latest = np.where(decides, side.applied[status], latest)
+    side.statuses['freeze'][thawed] = 0
+
+def apply_end_turn(side: _Side, enemy: _Side, mask: np.ndarray) -> None:
+    for status in END_TURN_STATUSES:
+        active = mask & (side.statuses[status] > 0)
+        if not active.any():
+            continue
+        if status == 'badly_poison':
+            damage = (side.max_hp * 0.0625 * side.statuses[status]).astype(np.int64)
+            side.statuses[status] += active
+        else:
+            damage = np.full(len(side.hp), int(side.max_hp * 0.125), dtype=np.int64)
+        side.hp -= np.where(active, damage, 0)
+        if status == 'seed':
+            enemy.hp += np.where(active, damage, 0)
+        elif status == 'trap':
+            side.statuses[status] -= active
+
+def execute_move(attacker: _Side, defender: _Side, mask: np.ndarray, is_first_move: bool, rng: np.random.Generator) -> None:
+    apply_start_move(attacker, mask, rng)
+    acting = mask & attacker.can_move
+    attacker.last_move = np.where(mask, np.where(acting, attacker.selected, -1), attacker.last_move)
+
+    for index, move in enumerate(attacker.moves):
+        using = acting & (attacker.selected == index)
+        if not using.any():
+            continue
+        hit = move_hit(attacker, defender, move, rng)
+        for handler, effect in attacker.programs[index]:
+            handler(attacker, defender, effect, move, using & hit, is_first_move, rng)
+        if move.miss_recoil:
+            attacker.hp -= np.where(using & ~hit, int(attacker.max_hp * 0.5), 0)
+
+def simulate_matchup_vectorized(species_a: Pokemon, species_b: Pokemon, n_battles: int, max_turns: int = MAX_TURNS,
+                                seed: int | None = None) -> Dict[str, float]:
+    """
+    Simulates many battles of the same matchup in lockstep, with both sides picking moves uniformly at random.
+
+    Gives the same statistics as battle_engine.simulate_matchup with random_policy. Moves run their compiled
+    programs (battle_engine.compile_move) with the lockstep handlers of this module, and statuses held at once
+    are resolved in the order they were applied, as in the scalar engine.
+
+    Args:
+        species_a (Pokemon): The first Pokémon, every battle starts from its current state.
+        species_b (Pokemon): The second Pokémon, every battle starts from its current state.
+        n_battles (int): The number of battles to run.
+        max_turns (int, optional): Turn cap after which a battle is a draw. Defaults to MAX_TURNS.
+        seed (int | None, optional): Seed for the NumPy random generator. Defaults to None.
+
+    Returns:
+        Dict[str, float]: Battle, win, draw and turn counts plus win rates and the average turn count (see battle_engine.summarize_counts).
+    """
+    if n_battles < 0:
+        raise ValueError("Number of battles cannot be negative")
+    rng = np.random.default_rng(seed)
+    side_a = _Side(species_a, n_battles)
+    side_b = _Side(species_b, n_battles)
+    counts = {'battles': n_battles, 'wins_a': 0, 'wins_b': 0, 'draws': 0, 'turns': 0}
+
+    turn_count = 0
+    while len(side_a.hp) and turn_count < max_turns:
+        n = len(side_a.hp)
+        everyone = np.ones(n, dtype=bool)
+        side_a.selected = rng.integers(0, len(side_a.moves), n)
+        side_b.selected = rng.integers(0, len(side_b.moves), n)
+
+        # Turn order: priority, then speed, then a coin flip
+        priority_a = side_a.priority[side_a.selected]
+        priority_b = side_b.priority[side_b.selected]
+        speed_a = side_a.battle_stat('spd')
+        speed_b = side_b.battle_stat('spd')
+        a_first = np.where(priority_a != priority_b, priority_a > priority_b,
+                           np.where(speed_a != speed_b, speed_a > speed_b, rng.random(n) < 0.5))
+
+        execute_move(side_a, side_b, a_first, True, rng)
+        execute_move(side_b, side_a, ~a_first, True, rng)
+        both_alive = (side_a.hp > 0) & (side_b.hp > 0)
+        execute_move(side_b, side_a, a_first & both_alive, False, rng)
+        execute_move(side_a, side_b, ~a_first & both_alive, False, rng)
+
+        apply_end_turn(side_a, side_b, everyone)
+        apply_end_turn(side_b, side_a, everyone)
+        turn_count += 1
+
+        a_alive = side_a.hp > 0
+        b_alive = side_b.hp > 0
+        finished = ~(a_alive & b_alive)
+        if finished.any():
+            counts['wins_a'] += int((a_alive & ~b_alive).sum())
+            counts['wins_b'] += int((b_alive & ~a_alive).sum())
+            counts['draws'] += int((~a_alive & ~b_alive).sum())
+            counts['turns'] += turn_count * int(finished.sum())
+            side_a.compact(~finished)
+            side_b.compact(~finished)
+
+    # battles still running hit the turn cap
+    counts['draws'] += len(side_a.hp)
+    counts['turns'] += turn_count * len(side_a.hp)
+    return summarize_counts(counts)